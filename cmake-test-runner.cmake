@@ -16,12 +16,74 @@ file(REAL_PATH "${TEMP}" CURRENT_SCRIPT_DIR)
 
 set(PYTHON_SCRIPT_DIR_PATH "${TEMP}/python")
 set(PYTHON_TEST_GENERATOR_SCRIPT_PATH "${PYTHON_SCRIPT_DIR_PATH}/generate-test-file.py")
+set(PYTHON_TEST_GENERATOR_ZIPAPP_PATH "${PYTHON_SCRIPT_DIR_PATH}/generate-test-file.pyz")
+set(PYTHON_TEST_GENERATOR_CLIENT_SCRIPT_PATH "${PYTHON_SCRIPT_DIR_PATH}/generate-test-file-client.py")
 set(GENERATED_TEST_DIR_PATH "${PYTHON_SCRIPT_DIR_PATH}/tests")
 
 
 
 set(TEST_SUCCESS FALSE)
 
+#Exit code used by the generator client when no daemon answers on the socket.
+set(GENERATOR_DAEMON_UNAVAILABLE_EXIT_CODE 75)
+
+#
+# Runs the test file generator with the given arguments.
+#
+# If CMAKE_TEST_GENERATOR_SOCKET is set, either as a variable or in the
+# environment, and names the socket of a running
+# "generate-test-file.py --serve" daemon, the request is handed to that daemon
+# through the thin client. Otherwise, or if the daemon does not answer, the
+# generator is run directly.
+#
+# If CMAKE_TEST_GENERATOR_USE_ZIPAPP is true, either as a variable or in the
+# environment, the generator is run from the precompiled
+# "generate-test-file.pyz" that "build-zipapp.py" writes, which starts faster.
+# The archive is not rebuilt here, so it has to be rebuilt after every change
+# to the generator.
+#
+function(run_test_file_generator)
+    set(socket_path "${CMAKE_TEST_GENERATOR_SOCKET}")
+    if(NOT socket_path)
+        set(socket_path "$ENV{CMAKE_TEST_GENERATOR_SOCKET}")
+    endif()
+
+    if(socket_path AND EXISTS "${socket_path}")
+        execute_process(
+            COMMAND "${Python_EXECUTABLE}" "${PYTHON_TEST_GENERATOR_CLIENT_SCRIPT_PATH}" --socket "${socket_path}" ${ARGN}
+            WORKING_DIRECTORY "${CMAKE_CURRENT_LIST_DIR}"
+            RESULT_VARIABLE client_result
+        )
+
+        if(NOT client_result EQUAL GENERATOR_DAEMON_UNAVAILABLE_EXIT_CODE)
+            if(NOT client_result EQUAL 0)
+                message(FATAL_ERROR "Test file generation failed: ${client_result}")
+            endif()
+            return()
+        endif()
+        message(STATUS "Generator daemon is not answering. Running the generator directly.")
+    endif()
+
+    set(generator_path "${PYTHON_TEST_GENERATOR_SCRIPT_PATH}")
+    set(use_zipapp "${CMAKE_TEST_GENERATOR_USE_ZIPAPP}")
+    if(NOT use_zipapp)
+        set(use_zipapp "$ENV{CMAKE_TEST_GENERATOR_USE_ZIPAPP}")
+    endif()
+
+    if(use_zipapp)
+        if(NOT EXISTS "${PYTHON_TEST_GENERATOR_ZIPAPP_PATH}")
+            message(FATAL_ERROR "\"${PYTHON_TEST_GENERATOR_ZIPAPP_PATH}\" does not exist. Run \"build-zipapp.py\" to build it.")
+        endif()
+        set(generator_path "${PYTHON_TEST_GENERATOR_ZIPAPP_PATH}")
+    endif()
+
+    execute_process(
+        COMMAND "${Python_EXECUTABLE}" "${generator_path}" ${ARGN}
+        WORKING_DIRECTORY "${CMAKE_CURRENT_LIST_DIR}"
+        COMMAND_ERROR_IS_FATAL ANY
+    )
+endfunction()
+
 #
 # SKIP_GENERATE_FILE is ignored if the generated test file does not exist.
 #
@@ -54,8 +116,6 @@ function(run_test)
     
     if((NOT run_test_SKIP_GENERATE_FILE) OR (NOT EXISTS "${TEST_FILE}"))
         set(cmd_list "")
-        list(APPEND cmd_list "${Python_EXECUTABLE}")
-        list(APPEND cmd_list "${PYTHON_TEST_GENERATOR_SCRIPT_PATH}")
         list(APPEND cmd_list "-b" "${CMAKE_BINARY_DIR}")
         list(APPEND cmd_list "-c" "${CMAKE_SOURCE_DIR}")
 
@@ -70,11 +130,7 @@ function(run_test)
         endforeach()
 
         #generate test file
-        execute_process(
-		    COMMAND ${cmd_list}
-            WORKING_DIRECTORY "${CMAKE_CURRENT_LIST_DIR}"
-            COMMAND_ERROR_IS_FATAL ANY
-        )
+        run_test_file_generator(${cmd_list})
     endif()
 
     #run generated test file
@@ -88,3 +144,173 @@ function(run_test)
     #If we get to this point, the tests have passed.
     set(TEST_SUCCESS TRUE PARENT_SCOPE)
 endfunction()
+
+#
+# Generates the test files for every descriptor in TEST_SCRIPT_FILES with a
+# single invocation of the generator, then runs each generated file in turn.
+# JOBS sets how many worker processes the generator may use.
+#
+# SKIP_GENERATE_FILE is ignored for descriptors whose generated test file
+# does not exist.
+#
+# With BUNDLE, the descriptors are generated into a single file instead, and
+# all of them run in one CMake process. See "run_test_bundle".
+#
+function(run_tests)
+    set(options "SKIP_GENERATE_FILE" "BUNDLE")
+    set(oneValueArgs "PROJECT_SOURCE_DIR" "JOBS")
+    set(multiValueArgs "TEST_SCRIPT_FILES")
+    cmake_parse_arguments(run_tests "${options}" "${oneValueArgs}" "${multiValueArgs}" ${ARGN})
+
+    if(NOT run_tests_TEST_SCRIPT_FILES)
+        message(FATAL_ERROR "TEST_SCRIPT_FILES was not specified.")
+    endif()
+
+    if(run_tests_BUNDLE)
+        set(bundle_args "")
+        if(run_tests_SKIP_GENERATE_FILE)
+            list(APPEND bundle_args "SKIP_GENERATE_FILE")
+        endif()
+        if(run_tests_PROJECT_SOURCE_DIR)
+            list(APPEND bundle_args "PROJECT_SOURCE_DIR" "${run_tests_PROJECT_SOURCE_DIR}")
+        endif()
+        if(run_tests_JOBS)
+            list(APPEND bundle_args "JOBS" "${run_tests_JOBS}")
+        endif()
+        run_test_bundle(TEST_SCRIPT_FILES ${run_tests_TEST_SCRIPT_FILES} ${bundle_args})
+        set(TEST_SUCCESS TRUE PARENT_SCOPE)
+        return()
+    endif()
+
+    set(files_to_generate "")
+    set(test_files "")
+    foreach(test_script_file ${run_tests_TEST_SCRIPT_FILES})
+        get_filename_component(TEST_SCRIPT_FILENAME "${test_script_file}" NAME)
+        set(TEST_FILE "${GENERATED_TEST_DIR_PATH}/${TEST_SCRIPT_FILENAME}")
+        list(APPEND test_files "${TEST_FILE}")
+
+        if((NOT run_tests_SKIP_GENERATE_FILE) OR (NOT EXISTS "${TEST_FILE}"))
+            list(APPEND files_to_generate "${test_script_file}")
+        endif()
+    endforeach()
+
+    if(files_to_generate)
+        set(cmd_list "")
+        list(APPEND cmd_list "-b" "${CMAKE_BINARY_DIR}")
+        list(APPEND cmd_list "-c" "${CMAKE_SOURCE_DIR}")
+
+        if(run_tests_PROJECT_SOURCE_DIR)
+            list(APPEND cmd_list "-p" "${run_tests_PROJECT_SOURCE_DIR}")
+        endif()
+
+        if(run_tests_JOBS)
+            list(APPEND cmd_list "-j" "${run_tests_JOBS}")
+        endif()
+        list(APPEND cmd_list ${files_to_generate})
+
+        foreach(str  ${cmd_list})
+            message(STATUS ${str})
+        endforeach()
+
+        #generate all test files at once
+        run_test_file_generator(${cmd_list})
+    endif()
+
+    list(LENGTH test_files test_file_count)
+    math(EXPR last_index "${test_file_count} - 1")
+    foreach(index RANGE ${last_index})
+        list(GET run_tests_TEST_SCRIPT_FILES ${index} test_script_file)
+        list(GET test_files ${index} TEST_FILE)
+
+        #run generated test file
+        message(STATUS "Executing test file for \"${test_script_file}\".")
+        execute_process(
+            COMMAND "${CMAKE_COMMAND}" -P "${TEST_FILE}"
+            WORKING_DIRECTORY "${CMAKE_CURRENT_LIST_DIR}"
+            COMMAND_ERROR_IS_FATAL ANY
+        )
+    endforeach()
+
+    #If we get to this point, the tests have passed.
+    set(TEST_SUCCESS TRUE PARENT_SCOPE)
+endfunction()
+
+#
+# Generates every descriptor in TEST_SCRIPT_FILES into one bundle file and
+# runs it with a single "cmake -P", so that CMake starts once for the whole
+# suite. BUNDLE_NAME names the bundle file (default: "test-bundle.cmake").
+#
+# A "CMAKE-TEST BEGIN" and a "CMAKE-TEST PASS" line is printed around each
+# descriptor's tests. If the bundle fails, the descriptor that began last and
+# did not pass is reported.
+#
+# SKIP_GENERATE_FILE is ignored if the bundle file does not exist.
+#
+function(run_test_bundle)
+    set(options "SKIP_GENERATE_FILE")
+    set(oneValueArgs "PROJECT_SOURCE_DIR" "JOBS" "BUNDLE_NAME")
+    set(multiValueArgs "TEST_SCRIPT_FILES")
+    cmake_parse_arguments(run_test_bundle "${options}" "${oneValueArgs}" "${multiValueArgs}" ${ARGN})
+
+    if(NOT run_test_bundle_TEST_SCRIPT_FILES)
+        message(FATAL_ERROR "TEST_SCRIPT_FILES was not specified.")
+    endif()
+
+    if(NOT run_test_bundle_BUNDLE_NAME)
+        set(run_test_bundle_BUNDLE_NAME "test-bundle.cmake")
+    endif()
+    set(BUNDLE_FILE "${GENERATED_TEST_DIR_PATH}/${run_test_bundle_BUNDLE_NAME}")
+
+    if((NOT run_test_bundle_SKIP_GENERATE_FILE) OR (NOT EXISTS "${BUNDLE_FILE}"))
+        set(cmd_list "")
+        list(APPEND cmd_list "-b" "${CMAKE_BINARY_DIR}")
+        list(APPEND cmd_list "-c" "${CMAKE_SOURCE_DIR}")
+
+        if(run_test_bundle_PROJECT_SOURCE_DIR)
+            list(APPEND cmd_list "-p" "${run_test_bundle_PROJECT_SOURCE_DIR}")
+        endif()
+
+        if(run_test_bundle_JOBS)
+            list(APPEND cmd_list "-j" "${run_test_bundle_JOBS}")
+        endif()
+        list(APPEND cmd_list "--bundle" "${run_test_bundle_BUNDLE_NAME}")
+        list(APPEND cmd_list ${run_test_bundle_TEST_SCRIPT_FILES})
+
+        foreach(str  ${cmd_list})
+            message(STATUS ${str})
+        endforeach()
+
+        #generate the bundle
+        run_test_file_generator(${cmd_list})
+    endif()
+
+    #run the bundle
+    message(STATUS "Executing test bundle \"${BUNDLE_FILE}\".")
+    execute_process(
+        COMMAND "${CMAKE_COMMAND}" -P "${BUNDLE_FILE}"
+        WORKING_DIRECTORY "${CMAKE_CURRENT_LIST_DIR}"
+        RESULT_VARIABLE bundle_result
+        OUTPUT_VARIABLE bundle_output
+        ECHO_OUTPUT_VARIABLE
+    )
+
+    if(NOT bundle_result EQUAL 0)
+        set(failed_descriptor "")
+        string(REGEX MATCHALL "CMAKE-TEST (BEGIN|PASS): [^\n]*" markers "${bundle_output}")
+        list(LENGTH markers marker_count)
+        if(marker_count GREATER 0)
+            list(GET markers -1 last_marker)
+            if(last_marker MATCHES "^CMAKE-TEST BEGIN: (.*)$")
+                set(failed_descriptor "${CMAKE_MATCH_1}")
+            endif()
+        endif()
+
+        if(failed_descriptor)
+            message(FATAL_ERROR "Test bundle failed in \"${failed_descriptor}\": ${bundle_result}")
+        endif()
+        message(FATAL_ERROR "Test bundle failed: ${bundle_result}")
+    endif()
+
+    #If we get to this point, the tests have passed.
+    set(TEST_SUCCESS TRUE PARENT_SCOPE)
+endfunction()
@@ -0,0 +1,23 @@
+from . import complexity
+from . import pipeline
+from . import synthetic_descriptor
+from . import var_expansion
+from .pipeline import (
+    run_benchmark,
+    run_benchmarks
+)
+from .synthetic_descriptor import (
+    DescriptorShape,
+    write_descriptor
+)
+
+__all__ = [
+    "complexity",
+    "pipeline",
+    "synthetic_descriptor",
+    "var_expansion",
+    "run_benchmark",
+    "run_benchmarks",
+    "DescriptorShape",
+    "write_descriptor"
+]
@@ -0,0 +1,106 @@
+#Runs the generator benchmarks and prints, or writes, the results as JSON.
+#Run from the "python" directory:
+#
+#   python -m benchmarks --lines 1000 10000 -o results.json
+import argparse
+import json
+import pathlib
+import sys
+import tempfile
+
+from . import pipeline
+from . import synthetic_descriptor
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(
+        prog = 'python -m benchmarks',
+        description = 'Times the test file generator on synthetic test descriptors.'
+    )
+    parser.add_argument(
+        '--lines',
+        type=int,
+        nargs='+',
+        default=[1000, 10000],
+        metavar='COUNT',
+        help = 'Line count of each benchmarked descriptor (default: 1000 10000).'
+    )
+
+    parser.add_argument(
+        '--groups',
+        type=int,
+        default=4,
+        help = 'Number of test groups in each descriptor (default: 4).'
+    )
+
+    parser.add_argument(
+        '--depth',
+        type=int,
+        default=1,
+        help = 'Macro nesting depth of each test (default: 1, no nesting).'
+    )
+
+    parser.add_argument(
+        '--variable-density',
+        type=float,
+        default=0.1,
+        metavar='FRACTION',
+        help = 'Fraction of macro body lines that dereference a variable (default: 0.1).'
+    )
+
+    parser.add_argument(
+        '--seed',
+        type=int,
+        default=0,
+        help = 'Seed for the descriptor generator (default: 0).'
+    )
+
+    parser.add_argument(
+        '-r',
+        '--repeats',
+        type=int,
+        default=pipeline.DEFAULT_REPEATS,
+        help = 'Number of timed runs of every stage (default: {}).'.format(pipeline.DEFAULT_REPEATS)
+    )
+
+    parser.add_argument(
+        '-o',
+        '--output',
+        type=str,
+        help = 'Write the results to this file instead of printing them.'
+    )
+    return parser
+
+def main(args):
+    parser = build_arg_parser()
+    parse_results = parser.parse_args(args)
+    if parse_results.repeats < 1:
+        parser.error("\"-r/--repeats\" must be at least 1.")
+
+    try:
+        shapes = [
+            synthetic_descriptor.DescriptorShape(
+                line_count = line_count,
+                test_group_count = parse_results.groups,
+                nesting_depth = parse_results.depth,
+                variable_density = parse_results.variable_density,
+                seed = parse_results.seed
+            ) for line_count in parse_results.lines
+        ]
+    except ValueError as e:
+        parser.error(e.__str__())
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        results = pipeline.run_benchmarks(shapes, pathlib.Path(work_dir), parse_results.repeats)
+
+    output = json.dumps(results, indent = 4, sort_keys = True)
+    if parse_results.output is None:
+        print(output)
+        return 0
+    with open(parse_results.output, 'w') as file:
+        file.write(output)
+        file.write("\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
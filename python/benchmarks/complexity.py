@@ -0,0 +1,44 @@
+#Fits the growth of a benchmark's run time to a power law.
+#
+#For run times t measured at input sizes n, "fit_power_law" finds the k and c
+#of t = c * n^k that fit best in the least squares sense on a log-log scale.
+#k is about 1 for linear growth and about 2 for quadratic growth. Constant
+#overheads pull k below 1 at small sizes, so the sizes should be large enough
+#for the work itself to dominate.
+import math
+
+#Leaves room for timing noise and for the O(n log n) of a sort or a dictionary
+#that outgrows the caches, while still telling a quadratic step apart.
+MAX_LINEAR_EXPONENT = 1.3
+
+class PowerLawFit:
+    def __init__(self, exponent, coefficient):
+        self.exponent = exponent
+        self.coefficient = coefficient
+
+    def predict(self, size):
+        return self.coefficient * size ** self.exponent
+
+    def is_superlinear(self, max_exponent = MAX_LINEAR_EXPONENT):
+        return self.exponent > max_exponent
+
+    def to_dict(self):
+        return {
+            "exponent": self.exponent,
+            "coefficient": self.coefficient
+        }
+
+def fit_power_law(sizes, durations):
+    if len(sizes) != len(durations):
+        raise ValueError("Every size needs exactly one duration.")
+    if len(set(sizes)) < 2:
+        raise ValueError("A fit needs at least two different sizes.")
+    if any(size <= 0 for size in sizes) or any(duration <= 0 for duration in durations):
+        raise ValueError("Sizes and durations must be positive.")
+
+    xs = [math.log(size) for size in sizes]
+    ys = [math.log(duration) for duration in durations]
+    x_mean = sum(xs) / len(xs)
+    y_mean = sum(ys) / len(ys)
+    exponent = sum((x - x_mean) * (y - y_mean) for x, y in zip(xs, ys)) / sum((x - x_mean) ** 2 for x in xs)
+    return PowerLawFit(exponent, math.exp(y_mean - exponent * x_mean))
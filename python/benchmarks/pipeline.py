@@ -0,0 +1,138 @@
+#Times the stages of the generator on synthetic descriptors.
+#
+#Every stage runs "repeats" times and is reported by its fastest and median
+#run, the fastest being the least disturbed by whatever else the machine is
+#doing. Peak memory comes from one more run under tracemalloc, which is kept
+#apart from the timed runs because tracing slows them down. The variable
+#expansion cache is cleared before every run, so that each one does the same
+#work.
+#
+#The stages are:
+#   parse_file: scanning and rendering a descriptor.
+#   generate_file_contents: producing the test file from the parsed descriptor.
+#   command_definition_scan: one pass of the lexer and the block index that
+#       finds the macro() and function() definitions.
+#   scan_handlers: the time spent in each "scan_for_*" handler while scanning,
+#       as "--profile" measures it.
+import importlib
+import platform
+import statistics
+import time
+import tracemalloc
+
+import cmake_local.cmake_helper as cmake_helper
+from cmake_local import language_parsing
+from cmake_local.language_parsing import cmake_lexer
+import descriptor_reader
+import generation_profile
+
+from . import synthetic_descriptor
+
+gentestfile = importlib.import_module("generate-test-file")
+
+RESULT_VERSION = 1
+DEFAULT_REPEATS = 5
+
+def create_context(list_file, work_dir):
+    return cmake_helper.CMakeScriptContext(
+        list_file = list_file.__str__(),
+        build_dir = work_dir.__str__(),
+        source_dir = work_dir.__str__(),
+        project_source_dir = work_dir.__str__()
+    )
+
+#Returns the seconds taken by each of "repeats" calls of "func".
+def time_runs(func, repeats):
+    retval = []
+    start = None
+    for i in range(0, repeats):
+        language_parsing.clear_expansion_cache()
+        start = time.perf_counter()
+        func()
+        retval.append(time.perf_counter() - start)
+    return retval
+
+#Returns the largest number of bytes allocated at once during "func()".
+def measure_peak_memory(func):
+    language_parsing.clear_expansion_cache()
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def summarize_stage(durations, line_count, peak_memory):
+    fastest = min(durations)
+    return {
+        "min_seconds": fastest,
+        "median_seconds": statistics.median(durations),
+        "lines_per_second": line_count / fastest if fastest > 0 else None,
+        "peak_memory_bytes": peak_memory
+    }
+
+def run_stage(func, repeats, line_count):
+    return summarize_stage(time_runs(func, repeats), line_count, measure_peak_memory(func))
+
+def parse_descriptor(context):
+    return gentestfile.parse_file(gentestfile.ApplicationSingleton(context))
+
+#Lexes "list_file" and runs every invocation through a BlockIndex, the way
+#"scan_descriptor" does, without handling any of them.
+#Returns the number of command definitions found.
+def scan_command_definitions(list_file):
+    block_index = None
+    with open(list_file.__str__(), 'r') as file:
+        lines = descriptor_reader.DescriptorLineReader(file)
+        block_index = gentestfile.BlockIndex(cmake_lexer.iter_invocations(lines))
+        for invocation in block_index:
+            lines.release_before(invocation.end_line + 1)
+    return len(block_index.ranges)
+
+#Returns the calls and fastest total seconds of every "scan_for_*" handler
+#over "repeats" scans.
+def time_scan_handlers(context, repeats):
+    profile = None
+    handlers = {}
+    for i in range(0, repeats):
+        language_parsing.clear_expansion_cache()
+        profile = generation_profile.GenerationProfile()
+        with generation_profile.activated(profile):
+            gentestfile.parse_descriptor_template(gentestfile.ApplicationSingleton(context))
+        for name, (calls, seconds) in profile.handlers.items():
+            stats = handlers.setdefault(name, {"calls": calls, "min_seconds": seconds})
+            stats["min_seconds"] = min(stats["min_seconds"], seconds)
+
+    for stats in handlers.values():
+        stats["calls_per_second"] = stats["calls"] / stats["min_seconds"] if stats["min_seconds"] > 0 else None
+    return handlers
+
+#Writes a descriptor of "shape" into "work_dir" and times every stage on it.
+def run_benchmark(shape, work_dir, repeats = DEFAULT_REPEATS):
+    list_file = work_dir / "synthetic-{}.cmake".format(shape.line_count)
+    line_count = synthetic_descriptor.write_descriptor(shape, list_file)
+    context = create_context(list_file, work_dir)
+    parse_status = parse_descriptor(context)
+    if parse_status is None:
+        raise RuntimeError("Failed to parse the synthetic descriptor \"{}\".".format(list_file))
+
+    return {
+        "shape": shape.to_dict(),
+        "line_count": line_count,
+        "test_count": sum(len(tests) for tests in parse_status.test_groups.values()),
+        "command_definition_count": len(parse_status.command_definitions),
+        "stages": {
+            "parse_file": run_stage(lambda: parse_descriptor(context), repeats, line_count),
+            "generate_file_contents": run_stage(lambda: gentestfile.generate_file_contents(parse_status), repeats, line_count),
+            "command_definition_scan": run_stage(lambda: scan_command_definitions(list_file), repeats, line_count)
+        },
+        "scan_handlers": time_scan_handlers(context, repeats)
+    }
+
+def run_benchmarks(shapes, work_dir, repeats = DEFAULT_REPEATS):
+    return {
+        "version": RESULT_VERSION,
+        "python": platform.python_version(),
+        "repeats": repeats,
+        "benchmarks": [run_benchmark(shape, work_dir, repeats) for shape in shapes]
+    }
@@ -0,0 +1,117 @@
+#Writes test descriptors of a chosen shape for the benchmarks.
+#
+#A descriptor is made of test blocks. Each block defines one test macro,
+#with "nesting_depth - 1" macros defined inside it, registers it with
+#"add_test_macro()" in one of "test_group_count" groups and is followed by a
+#few top-level lines the scanner reads but does not keep. Blocks are written
+#until the descriptor has at least "line_count" lines.
+#
+#"variable_density" is the fraction of body lines that dereference a
+#variable. Only the variables "CMakeScriptContext" knows are used, so every
+#reference expands. The same shape and seed always give the same descriptor.
+import pathlib
+import random
+
+CMAKE_TEST_FILE_PATH = pathlib.Path(__file__).resolve().parent.parent.parent / "cmake-test.cmake"
+
+BODY_LINES_PER_MACRO = 4
+TOP_LEVEL_LINES_PER_BLOCK = 4
+VARIABLE_REFERENCES = (
+    "${CMAKE_CURRENT_LIST_DIR}",
+    "${CMAKE_CURRENT_LIST_FILE}",
+    "${CMAKE_SOURCE_DIR}",
+    "${CMAKE_BUILD_DIR}",
+    "${PROJECT_SOURCE_DIR}"
+)
+
+class DescriptorShape:
+    def __init__(self, line_count = 1000, test_group_count = 4, nesting_depth = 1, variable_density = 0.1, seed = 0):
+        if line_count < 1:
+            raise ValueError("A descriptor needs at least one line.")
+        if test_group_count < 1:
+            raise ValueError("A descriptor needs at least one test group.")
+        if nesting_depth < 1:
+            raise ValueError("The nesting depth must be at least 1.")
+        if not 0.0 <= variable_density <= 1.0:
+            raise ValueError("The variable density must be between 0 and 1.")
+
+        self.line_count = line_count
+        self.test_group_count = test_group_count
+        self.nesting_depth = nesting_depth
+        self.variable_density = variable_density
+        self.seed = seed
+
+    def to_dict(self):
+        return {
+            "line_count": self.line_count,
+            "test_group_count": self.test_group_count,
+            "nesting_depth": self.nesting_depth,
+            "variable_density": self.variable_density,
+            "seed": self.seed
+        }
+
+def get_test_name(index):
+    return "test_{}".format(index)
+
+def get_test_group_name(index):
+    return "group_{}".format(index)
+
+def get_body_line(rng, shape, text):
+    if rng.random() < shape.variable_density:
+        return "message(STATUS \"{}/{}\")\n".format(rng.choice(VARIABLE_REFERENCES), text)
+    return "message(STATUS \"{}\")\n".format(text)
+
+#Yields the lines of a macro named "name" with "depth - 1" macros nested in it.
+def iter_macro_lines(rng, shape, name, depth, indent = ""):
+    yield "{}macro({})\n".format(indent, name)
+    if depth > 1:
+        yield from iter_macro_lines(rng, shape, "{}_inner".format(name), depth - 1, indent + "    ")
+    for i in range(0, BODY_LINES_PER_MACRO):
+        yield indent + "    " + get_body_line(rng, shape, "{} step {}".format(name, i))
+    yield "{}endmacro()\n".format(indent)
+
+def iter_descriptor_lines(shape):
+    rng = random.Random(shape.seed)
+    line_count = 0
+    test_index = 0
+
+    header = [
+        "include(\"{}\")\n".format(CMAKE_TEST_FILE_PATH.as_posix()),
+        "\n",
+        "macro(setup)\n",
+        "    set(SYNTHETIC_SETUP_DONE TRUE)\n",
+        "endmacro()\n",
+        "add_setup_macro(MACRO_NAME setup)\n",
+        "\n",
+        "macro(teardown)\n",
+        "    unset(SYNTHETIC_SETUP_DONE)\n",
+        "endmacro()\n",
+        "add_teardown_macro(MACRO_NAME teardown)\n"
+    ]
+    for line in header:
+        line_count += 1
+        yield line
+
+    while line_count < shape.line_count:
+        block = ["\n", "#Synthetic test {}\n".format(test_index)]
+        block.extend(iter_macro_lines(rng, shape, get_test_name(test_index), shape.nesting_depth))
+        block.append("add_test_macro(MACRO_NAME {} TEST_GROUP {})\n".format(
+            get_test_name(test_index),
+            get_test_group_name(test_index % shape.test_group_count)
+        ))
+        for i in range(0, TOP_LEVEL_LINES_PER_BLOCK):
+            block.append("set(SYNTHETIC_VALUE_{}_{} {})\n".format(test_index, i, i))
+
+        for line in block:
+            line_count += 1
+            yield line
+        test_index += 1
+
+#Returns the number of lines written.
+def write_descriptor(shape, filepath):
+    line_count = 0
+    with open(filepath, 'w') as file:
+        for line in iter_descriptor_lines(shape):
+            file.write(line)
+            line_count += 1
+    return line_count
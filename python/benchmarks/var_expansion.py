@@ -0,0 +1,250 @@
+#Scaling benchmarks for "language_parsing.resolve_vars".
+#
+#Each case builds an input of a given size along one of the dimensions that
+#stress the expansion engine, expands it without the expansion cache at every
+#size, checks the result and fits the run times to a power law (see
+#"complexity"). A case whose run time grows faster than linearly fails.
+#
+#The cases are:
+#   long_literal: one reference followed by "size" plain characters.
+#   stray_special_characters: "size" literal braces, "ENV"s and lone "$"s
+#       around one reference.
+#   sibling_references: "size" references one after another.
+#   nested_references: "${N_${N_...}}" nested "size" deep, with text after it.
+#   mixed_env_references: "size" pairs of "${}" and "$ENV{}" references.
+#
+#Run from the "python" directory:
+#
+#   python -m benchmarks.var_expansion [-o results.json]
+#
+#Run times depend on the machine and on its load. "run_step_count_case" fits
+#the number of Python lines an expansion executes instead. That is the same on
+#every run and still catches a superlinear loop written in Python, so it is
+#what the unit tests check.
+import argparse
+import json
+import platform
+import sys
+import time
+
+from cmake_local import language_parsing
+
+from . import complexity
+
+RESULT_VERSION = 1
+DEFAULT_REPEATS = 3
+DEFAULT_SIZES = (500, 1000, 2000, 4000)
+#Counting steps is slow, and needs no large inputs to rise above the noise.
+DEFAULT_STEP_COUNT_SIZES = (50, 100, 200, 400)
+
+#Resolves variables from dictionaries instead of the build tree and the
+#process environment, so the benchmarks do not depend on either.
+class BenchmarkContext:
+    def __init__(self, variables, environment):
+        self.variables = variables
+        self.environment = environment
+
+    def resolve_if_builtin_var(self, varname):
+        return self.variables.get(varname)
+
+    def resolve_env_var(self, varname):
+        return self.environment.get(varname)
+
+def create_context():
+    return BenchmarkContext(
+        variables = {"VALUE": "value", "N_": ""},
+        environment = {"ENV_VALUE": "env", "N_": ""}
+    )
+
+class ScalingCase:
+    #"get_input(size)" and "get_expected(size)" return the input of a size and
+    #what it expands to. "scale" multiplies the sizes, for cases whose unit of
+    #work is too small to time at the default sizes.
+    def __init__(self, name, get_input, get_expected, scale = 1):
+        self.name = name
+        self.get_input = get_input
+        self.get_expected = get_expected
+        self.scale = scale
+
+STRAY_SPECIAL_CHARACTERS = "{x} ENV $y "
+
+SCALING_CASES = (
+    ScalingCase(
+        "long_literal",
+        lambda size: "${VALUE}" + "a" * size,
+        lambda size: "value" + "a" * size,
+        scale = 100
+    ),
+    ScalingCase(
+        "stray_special_characters",
+        lambda size: STRAY_SPECIAL_CHARACTERS * size + "${VALUE}",
+        lambda size: STRAY_SPECIAL_CHARACTERS * size + "value"
+    ),
+    ScalingCase(
+        "sibling_references",
+        lambda size: "${VALUE}/" * size,
+        lambda size: "value/" * size
+    ),
+    ScalingCase(
+        "nested_references",
+        lambda size: "${N_" * size + "}" * size + "/tail",
+        lambda size: "/tail"
+    ),
+    ScalingCase(
+        "mixed_env_references",
+        lambda size: "${VALUE}:$ENV{ENV_VALUE};" * size,
+        lambda size: "value:env;" * size
+    )
+)
+
+#Returns the fastest of "repeats" expansions of "input", in seconds.
+def time_expansion(input, expected, context, repeats):
+    retval = None
+    start = None
+    duration = None
+    output = None
+    for i in range(0, repeats):
+        start = time.perf_counter()
+        output = language_parsing.resolve_vars(input, context)
+        duration = time.perf_counter() - start
+        retval = duration if retval is None else min(retval, duration)
+    if output != expected:
+        raise AssertionError("Expanding {!r}... gave {!r}..., expected {!r}....".format(
+            input[:40], output[:40], expected[:40]
+        ))
+    return retval
+
+#Returns the number of Python lines executed while expanding "input".
+def count_expansion_steps(input, expected, context):
+    steps = 0
+    output = None
+    previous_trace = sys.gettrace()
+
+    def trace(frame, event, arg):
+        nonlocal steps
+        if event == "line":
+            steps += 1
+        return trace
+
+    sys.settrace(trace)
+    try:
+        output = language_parsing.resolve_vars(input, context)
+    finally:
+        sys.settrace(previous_trace)
+    if output != expected:
+        raise AssertionError("Expanding {!r}... gave {!r}..., expected {!r}....".format(
+            input[:40], output[:40], expected[:40]
+        ))
+    return steps
+
+#Like "run_scaling_case", but fits step counts instead of run times. The sizes
+#are not scaled.
+def run_step_count_case(case, sizes = DEFAULT_STEP_COUNT_SIZES, max_exponent = complexity.MAX_LINEAR_EXPONENT):
+    context = create_context()
+    #Loads the parser, whose module code would otherwise count as steps.
+    language_parsing.resolve_vars(case.get_input(sizes[0]), context)
+    steps = [count_expansion_steps(case.get_input(size), case.get_expected(size), context) for size in sizes]
+    fit = complexity.fit_power_law(sizes, steps)
+    return {
+        "sizes": list(sizes),
+        "steps": steps,
+        "fit": fit.to_dict(),
+        "superlinear": fit.is_superlinear(max_exponent)
+    }
+
+def run_scaling_case(case, sizes = DEFAULT_SIZES, repeats = DEFAULT_REPEATS, max_exponent = complexity.MAX_LINEAR_EXPONENT):
+    context = create_context()
+    scaled_sizes = [size * case.scale for size in sizes]
+    durations = [
+        time_expansion(case.get_input(size), case.get_expected(size), context, repeats)
+        for size in scaled_sizes
+    ]
+    fit = complexity.fit_power_law(scaled_sizes, durations)
+    return {
+        "sizes": scaled_sizes,
+        "min_seconds": durations,
+        "fit": fit.to_dict(),
+        "superlinear": fit.is_superlinear(max_exponent)
+    }
+
+def run_var_expansion_benchmarks(cases = SCALING_CASES, sizes = DEFAULT_SIZES, repeats = DEFAULT_REPEATS, max_exponent = complexity.MAX_LINEAR_EXPONENT):
+    return {
+        "version": RESULT_VERSION,
+        "python": platform.python_version(),
+        "repeats": repeats,
+        "max_exponent": max_exponent,
+        "benchmarks": {
+            case.name: run_scaling_case(case, sizes, repeats, max_exponent) for case in cases
+        }
+    }
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(
+        prog = 'python -m benchmarks.var_expansion',
+        description = 'Checks that variable expansion time grows linearly with the size of its input.'
+    )
+    parser.add_argument(
+        '--sizes',
+        type=int,
+        nargs='+',
+        default=list(DEFAULT_SIZES),
+        metavar='SIZE',
+        help = 'Input sizes to time every case at (default: {}).'.format(" ".join(str(size) for size in DEFAULT_SIZES))
+    )
+
+    parser.add_argument(
+        '-r',
+        '--repeats',
+        type=int,
+        default=DEFAULT_REPEATS,
+        help = 'Number of timed expansions at every size (default: {}).'.format(DEFAULT_REPEATS)
+    )
+
+    parser.add_argument(
+        '--max-exponent',
+        type=float,
+        default=complexity.MAX_LINEAR_EXPONENT,
+        help = 'Largest growth exponent that still counts as linear (default: {}).'.format(complexity.MAX_LINEAR_EXPONENT)
+    )
+
+    parser.add_argument(
+        '-o',
+        '--output',
+        type=str,
+        help = 'Write the results to this file instead of printing them.'
+    )
+    return parser
+
+#Returns 1 if any case grows faster than linearly.
+def main(args):
+    parser = build_arg_parser()
+    parse_results = parser.parse_args(args)
+    if parse_results.repeats < 1:
+        parser.error("\"-r/--repeats\" must be at least 1.")
+    if len(set(parse_results.sizes)) < 2 or min(parse_results.sizes) < 1:
+        parser.error("\"--sizes\" needs at least two different positive sizes.")
+
+    results = run_var_expansion_benchmarks(
+        sizes = parse_results.sizes,
+        repeats = parse_results.repeats,
+        max_exponent = parse_results.max_exponent
+    )
+    output = json.dumps(results, indent = 4, sort_keys = True)
+    if parse_results.output is None:
+        print(output)
+    else:
+        with open(parse_results.output, 'w') as file:
+            file.write(output)
+            file.write("\n")
+
+    superlinear = sorted(name for name, result in results["benchmarks"].items() if result["superlinear"])
+    for name in superlinear:
+        print("{} grows faster than linearly (exponent {:.2f}).".format(
+            name,
+            results["benchmarks"][name]["fit"]["exponent"]
+        ), file=sys.stderr)
+    return 1 if len(superlinear) > 0 else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+
+#Packs the test file generator into "generate-test-file.pyz", a zip
+#application holding the generator and every module it may import, each
+#compiled ahead of time.
+#
+#Python caches the bytecode of imported modules in "__pycache__", but never
+#that of the script it runs, so "python generate-test-file.py" compiles the
+#whole generator on every run. The archive holds unchecked hash-based ".pyc"
+#files, which are loaded as they are; the sources are packed as well, for
+#tracebacks and for interpreters of another version, which cannot load the
+#bytecode and fall back to them.
+#
+#The archive has to stay in this directory, next to "tests/", and has to be
+#rebuilt after every change to the generator:
+#
+#   python3 python/build-zipapp.py
+#   python3 python/generate-test-file.pyz -b <build> -c <src> a.cmake
+#
+#Building the same sources with the same interpreter gives the same archive,
+#byte for byte, so an unchanged rebuild does not change its mtime.
+import argparse
+import io
+import os
+import pathlib
+import py_compile
+import sys
+import tempfile
+import zipfile
+
+SCRIPT_DIR = pathlib.Path(__file__).resolve().parent
+ZIPAPP_PATH = SCRIPT_DIR / "generate-test-file.pyz"
+#Packages the generator imports, besides the modules next to it.
+PACKAGES = ("cmake_local", "development")
+#Scripts that are not part of the generator.
+EXCLUDED_MODULES = ("build-zipapp.py", "run-suite.py", "generate-test-file-client.py")
+#Zip entries carry a timestamp; a fixed one keeps the archive reproducible.
+ENTRY_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+
+MAIN_SOURCE = """import importlib
+import sys
+
+sys.exit(importlib.import_module("generate-test-file").main(sys.argv[1:]))
+"""
+
+#Returns the sources to pack as (archive name, path) tuples, sorted by name.
+def collect_sources(script_dir = SCRIPT_DIR):
+    script_dir = pathlib.Path(script_dir)
+    retval = [
+        (path.name, path) for path in script_dir.glob("*.py")
+        if path.name not in EXCLUDED_MODULES
+    ]
+    for package in PACKAGES:
+        for path in (script_dir / package).rglob("*.py"):
+            retval.append((path.relative_to(script_dir).as_posix(), path))
+    return sorted(retval)
+
+def compile_source(source_path, name, temp_dir):
+    pyc_path = pathlib.Path(temp_dir) / "compiled.pyc"
+    py_compile.compile(
+        source_path.__str__(),
+        cfile = pyc_path.__str__(),
+        dfile = name,
+        doraise = True,
+        invalidation_mode = py_compile.PycInvalidationMode.UNCHECKED_HASH
+    )
+    return pyc_path.read_bytes()
+
+def write_entry(archive, name, data):
+    info = zipfile.ZipInfo(name, date_time = ENTRY_DATE_TIME)
+    info.compress_type = zipfile.ZIP_DEFLATED
+    info.external_attr = 0o644 << 16
+    archive.writestr(info, data)
+
+#Returns the archive's contents.
+def build_archive(sources, interpreter = "/usr/bin/env python3"):
+    buffer = io.BytesIO()
+    buffer.write("#!{}\n".format(interpreter).encode())
+    with tempfile.TemporaryDirectory() as temp_dir:
+        main_path = pathlib.Path(temp_dir) / "__main__.py"
+        main_path.write_text(MAIN_SOURCE)
+        with zipfile.ZipFile(buffer, 'w') as archive:
+            for name, path in sources + [("__main__.py", main_path)]:
+                write_entry(archive, name, path.read_bytes())
+                write_entry(archive, name + "c", compile_source(path, name, temp_dir))
+    return buffer.getvalue()
+
+#Returns True if "path" was written, False if it already had these contents.
+def write_zipapp(path = ZIPAPP_PATH, script_dir = SCRIPT_DIR):
+    path = pathlib.Path(path)
+    data = build_archive(collect_sources(script_dir))
+    if path.is_file() and path.read_bytes() == data:
+        return False
+
+    temp_path = path.with_name("{}.{}.tmp".format(path.name, os.getpid()))
+    try:
+        temp_path.write_bytes(data)
+        temp_path.chmod(0o755)
+        os.replace(temp_path, path)
+    except BaseException:
+        temp_path.unlink(missing_ok = True)
+        raise
+    return True
+
+def main(args):
+    parser = argparse.ArgumentParser(
+        prog = 'build-zipapp.py',
+        description = 'Packs the test file generator into a precompiled zip application, "{}".'.format(ZIPAPP_PATH.name)
+    )
+    parser.parse_args(args)
+
+    try:
+        written = write_zipapp()
+    except (OSError, py_compile.PyCompileError) as e:
+        print("Unable to build \"{}\": {}".format(ZIPAPP_PATH, e), file=sys.stderr)
+        return 1
+    if written:
+        print("Wrote \"{}\" for Python {}.".format(ZIPAPP_PATH, sys.version.split()[0]))
+    else:
+        print("\"{}\" is up to date.".format(ZIPAPP_PATH))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
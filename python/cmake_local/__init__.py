@@ -1,17 +1,17 @@
 from . import cmake_helper
 # Re-export commonly used classes and functions
 from .cmake_helper import CMakeScriptContext
-from .language_parsing import (
-    VarParseError
-)
-
-from .language_parsing import (
-    resolve_vars
-)
 
 __all__ = [
     'CMakeScriptContext',
     'VarParseError',
     'cmake_helper',
     'resolve_vars'
-]
\ No newline at end of file
+]
+
+#Loaded on first use; see "language_parsing".
+def __getattr__(name):
+    if name in ('VarParseError', 'resolve_vars'):
+        from . import language_parsing
+        return getattr(language_parsing, name)
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
@@ -4,8 +4,6 @@ import os
 import pathlib
 import re
 
-from . import language_parsing
-
 class VarEnvironExpansionError(Exception):
     def __init__(self, varname):
         super().__init__(f"Environment variable \"{varname}\" does not exist.")
@@ -47,6 +45,8 @@ class CMakeScriptContext:
             "CMAKE_CURRENT_LIST_DIR": CMakeScriptContext.resolve_cmake_current_list_dir,
             "PROJECT_SOURCE_DIR": CMakeScriptContext.resolve_project_source_dir
         }
+        #Environment variables read while expanding, and the values they had.
+        self.dereferenced_env_vars = {}
         self.re_cmake_var_dereference = re.compile(R"^\$(?:ENV)?{.*}.?")
         self.re_cmake_env_var_dereference = re.compile(R"^\$?ENV{")
 
@@ -56,13 +56,33 @@ class CMakeScriptContext:
             return None
         return retval_func(self)
 
+    def resolve_env_var(self, varname):
+        retval = os.environ.get(varname)
+        self.dereferenced_env_vars[varname] = retval
+        return retval
+
     class CMakeVarRefLangSyntaxError(Exception):
         def __init__(self, message):
             super().__init__(f"CMake variable dereference language syntax error: {message}")
 
 
+    #Identifies everything besides the environment that an expansion in this
+    #context depends on. Used to key the expansion cache.
+    def get_fingerprint(self):
+        return (
+            type(self).__qualname__,
+            self.list_file.__str__(),
+            self.build_dir.__str__(),
+            self.source_dir.__str__(),
+            self.project_source_dir.__str__()
+        )
+
+    #Most lines reference no variable, so the parser is only loaded once one does.
     def resolve_vars(self, string, no_fail = False):
-        return language_parsing.resolve_vars(string, self, no_fail)
+        if string and "$" not in string:
+            return string
+        from .language_parsing import cmake_var_expander
+        return cmake_var_expander.resolve_vars_cached(string, self, no_fail)
     
     def __str__(self):
         #Hello:
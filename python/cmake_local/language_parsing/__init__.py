@@ -1,4 +1,30 @@
-from .var_expansion_parsing import VarParseError
-from .cmake_var_expander import resolve_vars
+import importlib
 
-__all__ = ["VarParseError", "resolve_vars"]
\ No newline at end of file
+#The names below are imported from their modules on first use, so that using
+#only the lexer does not load the variable expansion parser.
+_EXPORTS = {
+    "VarParseError": "var_expansion_parsing",
+    "VarExpansionCache": "var_expansion_cache",
+    "CMakeLexError": "cmake_lexer",
+    "CMakeLexer": "cmake_lexer",
+    "CMakeArgumentType": "cmake_lexer",
+    "CMakeCommandInvocation": "cmake_lexer",
+    "iter_invocations": "cmake_lexer",
+    "resolve_vars": "cmake_var_expander",
+    "resolve_vars_cached": "cmake_var_expander",
+    "get_expansion_cache_stats": "cmake_var_expander",
+    "clear_expansion_cache": "cmake_var_expander"
+}
+
+__all__ = list(_EXPORTS.keys())
+
+def __getattr__(name):
+    module_name = _EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+    value = getattr(importlib.import_module("." + module_name, __name__), name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals().keys()) | set(__all__))
@@ -0,0 +1,292 @@
+import enum
+import re
+
+#
+# Splits CMake source into command invocations.
+#
+# The lexer follows the CMake language grammar closely enough to find every
+# command invocation with its arguments, whatever the formatting:
+#
+#   add_test_macro(
+#       MACRO_NAME my_test   # The macro to run
+#       TEST_GROUP "my group"
+#   )
+#
+# It is fed one line at a time and keeps its state between lines, so
+# invocations, quoted arguments, bracket arguments and bracket comments can
+# span several lines. Each line is looked at once.
+#
+# Argument values are kept as written: quoted and bracket arguments lose their
+# delimiters, but escape sequences and variable references are left for the
+# caller to deal with.
+#
+
+class CMakeLexError(Exception):
+    def __init__(self, message: str, line: int):
+        super().__init__(f"CMake lex error on line {line}: {message}")
+        self.line = line
+
+
+class CMakeArgumentType(enum.Enum):
+    UNQUOTED = enum.auto()
+    QUOTED = enum.auto()
+    BRACKET = enum.auto()
+    #"(" and ")" nested inside an argument list, as in "if((A) OR B)".
+    PARENTHESIS = enum.auto()
+
+
+class CMakeArgument:
+    def __init__(self, argument_type: CMakeArgumentType, value: str, line: int):
+        self.argument_type = argument_type
+        self.value = value
+        self.line = line
+
+    def __repr__(self):
+        return f"CMakeArgument({self.argument_type.name}, {self.value!r}, line={self.line})"
+
+
+class CMakeCommandInvocation:
+    def __init__(self, name: str, start_line: int):
+        self.name = name
+        self.arguments = []
+        #Indices of the first and last line the invocation spans:
+        self.start_line = start_line
+        self.end_line = start_line
+
+    #The arguments as strings, without nested parentheses.
+    def get_argument_values(self):
+        return [
+            argument.value for argument in self.arguments
+            if argument.argument_type != CMakeArgumentType.PARENTHESIS
+        ]
+
+    def __repr__(self):
+        return f"CMakeCommandInvocation({self.name!r}, {self.arguments!r}, lines={self.start_line}-{self.end_line})"
+
+
+class LexState(enum.Enum):
+    TOP_LEVEL = enum.auto()
+    ARGUMENTS = enum.auto()
+    QUOTED_ARGUMENT = enum.auto()
+    BRACKET_ARGUMENT = enum.auto()
+    BRACKET_COMMENT = enum.auto()
+
+
+RE_SPACE = re.compile(R"[ \t\r\n]+")
+RE_COMMAND_START = re.compile(R"([A-Za-z_][A-Za-z0-9_]*)[ \t]*\(")
+RE_BRACKET_OPEN = re.compile(R"\[(=*)\[")
+RE_LINE_COMMENT = re.compile(R"#[^\n]*")
+RE_UNQUOTED_ARGUMENT = re.compile(R'(?:[^\s()#"\\]|\\[\s\S])+')
+#Everything up to the closing quote, or to the end of the line if there is none:
+RE_QUOTED_BODY = re.compile(R'(?:[^"\\]|\\[\s\S])*')
+#Whole lines that need no state: blank lines, line comments, and invocations
+#on one line whose arguments are plain words or quoted strings without escape
+#sequences. Most lines of a descriptor are one of these.
+RE_BLANK_OR_COMMENT_LINE = re.compile(R"[ \t]*(?:#(?!\[=*\[)[^\n]*)?\r?\n?")
+RE_SIMPLE_INVOCATION_LINE = re.compile(
+    R'[ \t]*([A-Za-z_][A-Za-z0-9_]*)[ \t]*\(((?:[^()#"\\\[\]\n]|"[^"\\\n]*")*)\)[ \t]*(?:#(?!\[=*\[)[^\n]*)?\r?\n?'
+)
+RE_SIMPLE_ARGUMENT = re.compile(R'"([^"]*)"|([^\s"]+)')
+
+
+class CMakeLexer:
+    def __init__(self):
+        self.state = LexState.TOP_LEVEL
+        self.invocation = None
+        self.paren_depth = 0
+        #Text of a quoted or bracket argument spanning several lines:
+        self.pending_value = []
+        self.pending_line = None
+        self.bracket_close = None
+        self.state_after_bracket = None
+
+    def feed(self, line: str, line_index: int):
+        """Lexes one line.
+
+        Args:
+            line: The line, including its line ending.
+            line_index: The index of the line in the file.
+
+        Returns:
+            The list of the command invocations that end on this line.
+
+        Raises:
+            CMakeLexError if the line is not valid CMake.
+        """
+        retval = []
+        pos = 0
+        length = len(line)
+
+        if self.state == LexState.TOP_LEVEL:
+            if RE_BLANK_OR_COMMENT_LINE.fullmatch(line) is not None:
+                return retval
+            match = RE_SIMPLE_INVOCATION_LINE.fullmatch(line)
+            if match is not None:
+                invocation = CMakeCommandInvocation(match.group(1), line_index)
+                invocation.arguments = [
+                    CMakeArgument(CMakeArgumentType.QUOTED, quoted, line_index) if unquoted == '' else
+                    CMakeArgument(CMakeArgumentType.UNQUOTED, unquoted, line_index)
+                    for quoted, unquoted in RE_SIMPLE_ARGUMENT.findall(match.group(2))
+                ]
+                retval.append(invocation)
+                return retval
+
+        while pos < length:
+            match self.state:
+                case LexState.TOP_LEVEL:
+                    pos = self.lex_top_level(line, pos, line_index)
+                case LexState.ARGUMENTS:
+                    pos = self.lex_arguments(line, pos, line_index, retval)
+                case LexState.QUOTED_ARGUMENT:
+                    pos = self.lex_quoted_argument(line, pos)
+                case LexState.BRACKET_ARGUMENT | LexState.BRACKET_COMMENT:
+                    pos = self.lex_bracket(line, pos)
+        return retval
+
+    def finish(self, line_index: int):
+        """Checks that the input did not end in the middle of something.
+
+        Args:
+            line_index: The index one past the last line fed.
+        """
+        match self.state:
+            case LexState.TOP_LEVEL:
+                return
+            case LexState.QUOTED_ARGUMENT:
+                raise CMakeLexError("Unterminated quoted argument.", self.pending_line)
+            case LexState.BRACKET_ARGUMENT | LexState.BRACKET_COMMENT:
+                raise CMakeLexError("Unterminated bracket.", self.pending_line)
+            case LexState.ARGUMENTS:
+                raise CMakeLexError(
+                    f"\"{self.invocation.name}(\" is never closed.",
+                    self.invocation.start_line
+                )
+
+    def open_bracket(self, match, line_index, next_state):
+        self.bracket_close = "]" + match.group(1) + "]"
+        self.pending_value = []
+        self.pending_line = line_index
+        self.state_after_bracket = self.state
+        self.state = next_state
+        return match.end()
+
+    def lex_top_level(self, line, pos, line_index):
+        match = RE_SPACE.match(line, pos)
+        if match is not None:
+            return match.end()
+
+        if line[pos] == '#':
+            match = RE_BRACKET_OPEN.match(line, pos + 1)
+            if match is not None:
+                return self.open_bracket(match, line_index, LexState.BRACKET_COMMENT)
+            return RE_LINE_COMMENT.match(line, pos).end()
+
+        match = RE_COMMAND_START.match(line, pos)
+        if match is None:
+            raise CMakeLexError(f"Expected a command invocation, got \"{line[pos:].rstrip()}\".", line_index)
+
+        self.invocation = CMakeCommandInvocation(match.group(1), line_index)
+        self.paren_depth = 1
+        self.state = LexState.ARGUMENTS
+        return match.end()
+
+    def lex_arguments(self, line, pos, line_index, completed):
+        char = line[pos]
+        match = RE_SPACE.match(line, pos)
+        if match is not None:
+            return match.end()
+
+        if char == '#':
+            match = RE_BRACKET_OPEN.match(line, pos + 1)
+            if match is not None:
+                return self.open_bracket(match, line_index, LexState.BRACKET_COMMENT)
+            return RE_LINE_COMMENT.match(line, pos).end()
+
+        if char == '(':
+            self.paren_depth += 1
+            self.invocation.arguments.append(CMakeArgument(CMakeArgumentType.PARENTHESIS, char, line_index))
+            return pos + 1
+
+        if char == ')':
+            self.paren_depth -= 1
+            if self.paren_depth > 0:
+                self.invocation.arguments.append(CMakeArgument(CMakeArgumentType.PARENTHESIS, char, line_index))
+                return pos + 1
+            self.invocation.end_line = line_index
+            completed.append(self.invocation)
+            self.invocation = None
+            self.state = LexState.TOP_LEVEL
+            return pos + 1
+
+        if char == '"':
+            self.pending_value = []
+            self.pending_line = line_index
+            self.state = LexState.QUOTED_ARGUMENT
+            return pos + 1
+
+        match = RE_BRACKET_OPEN.match(line, pos)
+        if match is not None:
+            pos = self.open_bracket(match, line_index, LexState.BRACKET_ARGUMENT)
+            #A newline right after the opening bracket is not part of the argument.
+            if line.startswith("\n", pos):
+                pos += 1
+            elif line.startswith("\r\n", pos):
+                pos += 2
+            return pos
+
+        match = RE_UNQUOTED_ARGUMENT.match(line, pos)
+        if match is None:
+            raise CMakeLexError(f"Unexpected character \"{char}\".", line_index)
+        self.invocation.arguments.append(CMakeArgument(CMakeArgumentType.UNQUOTED, match.group(0), line_index))
+        return match.end()
+
+    def lex_quoted_argument(self, line, pos):
+        match = RE_QUOTED_BODY.match(line, pos)
+        end = match.end()
+        self.pending_value.append(match.group(0))
+        if end >= len(line):
+            #The argument continues on the next line.
+            return end
+
+        self.invocation.arguments.append(
+            CMakeArgument(CMakeArgumentType.QUOTED, "".join(self.pending_value), self.pending_line)
+        )
+        self.pending_value = []
+        self.state = LexState.ARGUMENTS
+        return end + 1
+
+    def lex_bracket(self, line, pos):
+        end = line.find(self.bracket_close, pos)
+        if end < 0:
+            if self.state == LexState.BRACKET_ARGUMENT:
+                self.pending_value.append(line[pos:])
+            return len(line)
+
+        if self.state == LexState.BRACKET_ARGUMENT:
+            self.pending_value.append(line[pos:end])
+            self.invocation.arguments.append(
+                CMakeArgument(CMakeArgumentType.BRACKET, "".join(self.pending_value), self.pending_line)
+            )
+        self.pending_value = []
+        self.state = self.state_after_bracket
+        return end + len(self.bracket_close)
+
+
+#Escapes "value" so that, written between double quotes, it is read back as
+#a quoted argument with exactly this value.
+def escape_quoted_argument(value):
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("$", "\\$")
+
+
+#Yields the command invocations of "lines" as soon as each one is complete.
+#"lines" only needs "has_line(index)" and "lines[index]", so it can be a
+#list or a DescriptorLineReader.
+def iter_invocations(lines):
+    lexer = CMakeLexer()
+    line_index = 0
+    has_line = lines.has_line if hasattr(lines, "has_line") else lambda index: index < len(lines)
+    while has_line(line_index):
+        for invocation in lexer.feed(lines[line_index], line_index):
+            yield invocation
+        line_index += 1
+    lexer.finish(line_index)
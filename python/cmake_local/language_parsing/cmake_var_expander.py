@@ -5,6 +5,12 @@ from .. import cmake_helper
 from . import var_expansion_parsing
 from . import var_expansion_tokens
 from . import var_expansion_ast
+from . import var_expansion_cache
+
+#Shared by every context. The fingerprint includes the descriptor's path and
+#the build and source directories, so entries are only reused for repeated
+#expansions of one descriptor in one configuration, never across descriptors.
+expansion_cache = var_expansion_cache.VarExpansionCache()
 
 def pretty_print_ast(ast: var_expansion_ast.CMakeVarExpansionAST):
     tree_str, longest_line_length = ast.pretty_stringify()
@@ -18,13 +24,16 @@ def pretty_print_ast(ast: var_expansion_ast.CMakeVarExpansionAST):
     print()
 
 
-def resolve_var(context, varname, is_env_var = False):
+#"env_reads", if given, collects the environment variables read and their values.
+def resolve_var(context, varname, is_env_var = False, env_reads = None):
 
     retval = None
     if not is_env_var:
         retval = context.resolve_if_builtin_var(varname)
     else:
-        retval = os.environ.get(varname)
+        retval = context.resolve_env_var(varname)
+        if env_reads is not None:
+            env_reads[varname] = retval
 
     if retval is None:
         raise ValueError("\"{}\" is not a variable we are capable of resolving.".format(varname))
@@ -36,52 +45,56 @@ def resolve_var(context, varname, is_env_var = False):
 #2. The root node has no parent.
 #3. The root node has no siblings.
 
+#Replaces stack[start:end] with the single string they make up. The stack is
+#built right to left, so its elements are joined in reverse.
 def merge_stack_string_elements(
-        stack: list[tuple[var_expansion_tokens.VarParseTokenType, str]],
+        stack: list[str],
         start: int,
         end: int    
-    ) -> str:
-    merged_stack = []
-    for i in range(start, end):
-        merged_stack.append(stack[i])
-    
-    #Pop unneeded elements from the stack.
-    for i in range(start + 1, end):
-        stack.pop(start)
+    ) -> None:
+    merged_stack = stack[start:end]
     merged_stack.reverse()
-    stack[-1] = "".join(merged_stack)
+    stack[start:end] = ["".join(merged_stack)]
 
-def execute_ast(ast: var_expansion_ast.CMakeVarExpansionAST, context) -> str:
+def execute_ast(ast: var_expansion_ast.CMakeVarExpansionAST, context, env_reads = None) -> str:
     """
     Expands variables in the AST using the given context.
     The parser has already validated the syntax, so we can trust the token sequences.
     """
     is_env_var = False
     param_stack = []
+    #Length of "param_stack" at every "}" whose expansion has not been
+    #reached yet, innermost last. What was pushed since makes up the name.
+    name_starts = []
+    name_start = 0
     nesting_level = 0
-    back_check = 0
-    token_stack = [node for node in ast.get_bottom_right_to_upper_left_iterator()]
+    token_types = ast.token_types
+    #Node ids from the bottom right of the tree to its upper left:
+    node_ids = ast.get_pre_order_node_ids()
+    node_ids.reverse()
 
-    if len(token_stack) == 0:
+    if len(node_ids) == 0:
         raise development.exceptions.DevelopmentError("AST is empty")
     
-    for i in range(0, len(token_stack)):
-        token = token_stack[i]
-        match token[0]:
+    for i in range(0, len(node_ids)):
+        match token_types[node_ids[i]]:
             case var_expansion_tokens.VarParseTokenType.VAR_EXPANSION:
-                if len(param_stack) == 0:
-                    development.exceptions.DevelopmentError("No parameter found for var expansion")
-                back_check = i - (3 if not is_env_var else 4)
-                if len(param_stack) > 1 and token_stack[back_check][0] != var_expansion_tokens.VarParseTokenType.VAR_CLOSE_BRACE:
-                    merge_stack_string_elements(param_stack, 0, len(param_stack))
-                param_stack.append(resolve_var(context, param_stack.pop(), is_env_var))
+                if len(name_starts) == 0:
+                    raise var_expansion_parsing.VarParseError("Unterminated variable expansion.")
+                name_start = name_starts.pop()
+                if len(param_stack) == name_start:
+                    param_stack.append("")
+                elif len(param_stack) - name_start > 1:
+                    merge_stack_string_elements(param_stack, name_start, len(param_stack))
+                param_stack.append(resolve_var(context, param_stack.pop(), is_env_var, env_reads))
                 nesting_level -= 1
                 is_env_var = False
             case var_expansion_tokens.VarParseTokenType.VAR_ENV:
                 is_env_var = True
             case var_expansion_tokens.VarParseTokenType.VAR_CHAR_STRING:
-                param_stack.append(token[1])
+                param_stack.append(ast.get_token_value(node_ids[i]))
             case var_expansion_tokens.VarParseTokenType.VAR_CLOSE_BRACE:
+                name_starts.append(len(param_stack))
                 nesting_level += 1
 
     param_stack.reverse()
@@ -89,7 +102,7 @@ def execute_ast(ast: var_expansion_ast.CMakeVarExpansionAST, context) -> str:
    
 
 
-def resolve_vars(input: str, context, no_fail = False) -> str:
+def resolve_vars(input: str, context, no_fail = False, env_reads = None) -> str:
     """
     Resolves variables in the input string using the given variable resolver.
 
@@ -100,15 +113,22 @@ def resolve_vars(input: str, context, no_fail = False) -> str:
                  As an aside, I'd rather not have this parameter,
                  but for now, it is necessary if we don't want to
                  add CMake "set" syntax to the language.
+        env_reads: If given, a dict that collects the environment
+                   variables read during expansion and their values.
 
     Returns:
         The input string with variables resolved.
     """
     retval = None
+    #Without a "$" there is nothing to expand and the parser would
+    #only hand the input back.
+    if input and "$" not in input:
+        return input
+
     try:
         parser = var_expansion_parsing.VarExpansionParser(input)
         ast = parser.parse(input)
-        retval = execute_ast(ast, context)
+        retval = execute_ast(ast, context, env_reads)
     except ValueError as e:
         if not no_fail:
             raise e
@@ -119,4 +139,45 @@ def resolve_vars(input: str, context, no_fail = False) -> str:
             raise e
         else:
             return input
-    return retval
\ No newline at end of file
+    return retval
+
+
+def resolve_vars_cached(input: str, context, no_fail = False, cache = None) -> str:
+    """
+    Same as "resolve_vars", but answers repeated expansions from an LRU cache.
+
+    Args:
+        input: The input string to resolve variables in.
+        context: The context to resolve variables in. It must provide
+                 "get_fingerprint()".
+        no_fail: See "resolve_vars".
+        cache: The VarExpansionCache to use. Defaults to the shared
+               "expansion_cache".
+
+    Returns:
+        The input string with variables resolved.
+    """
+    found = False
+    retval = None
+    env_reads = {}
+    if input and "$" not in input:
+        return input
+
+    if cache is None:
+        cache = expansion_cache
+
+    key = cache.make_key(input, context, no_fail)
+    found, retval = cache.lookup(key, context)
+    if found:
+        return retval
+
+    #Failed expansions raise, and are deliberately not cached.
+    retval = resolve_vars(input, context, no_fail, env_reads)
+    cache.store(key, retval, env_reads)
+    return retval
+
+def get_expansion_cache_stats():
+    return expansion_cache.get_stats()
+
+def clear_expansion_cache():
+    expansion_cache.clear()
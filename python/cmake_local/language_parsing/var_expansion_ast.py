@@ -3,335 +3,286 @@ from . import var_expansion_tokens
 
 #Because internal structure can shift, I choose to expose as little as possible.
 
-class CMakeVarExpansionAST:
-    class IteratorMetadataStruct:
-        def __init__(
-            self,
-            node: 'CMakeVarExpansionAST.CMakeVarExpansionASTNode',
-            child_index = 0
-        ):
-            self.node = node
-            self.child_index = child_index
-            self.skip = False
-
-        def __str__(self):
-            token_str = self.node.token[0] if self.node.token is not None else "ROOT"
-            return f"IteratorMetadataStruct(node={token_str}, child_index={self.child_index}, skip={self.skip})"
+#
+# The tree is stored as a struct of arrays: node "n" is described by the n-th
+# element of each of the parallel lists below, and node ids index the lists
+# directly. Children are linked through "first_children"/"next_siblings", so
+# adding a node appends one element to each list and no per-node objects are
+# allocated. Token values live in "value_pool" and nodes refer to them by
+# offset; the fixed tokens ("$", "ENV", "{", "}") all share one pool entry
+# per token type.
+#
+# A string node the parser keeps appending to holds its pieces in
+# "string_pieces" until its value is read, when they are joined once.
+#
+# Node 0 is the root. It has no token.
+#
+
+NO_NODE = -1
+ROOT_NODE_ID = 0
 
+class CMakeVarExpansionAST:
+    #Both iterators walk a precomputed list of node ids and yield
+    #tokens, [token_type, value], excluding the root.
     class TreeIterator:
-        def __init__(self, start_node: 'CMakeVarExpansionAST.CMakeVarExpansionASTNode'):
-            self.current_node = CMakeVarExpansionAST.IteratorMetadataStruct(start_node)
-            self.metadata_stack = []
-
+        def __init__(self, ast: 'CMakeVarExpansionAST', node_ids: list):
+            self.ast = ast
+            self.node_ids = node_ids
+            self.index = 0
 
-        def queue_nodes(self, node: 'CMakeVarExpansionAST.CMakeVarExpansionASTNode'):
-            if node.has_children():
-                for child in node.children:
-                    self.metadata_stack.append(CMakeVarExpansionAST.IteratorMetadataStruct(child))
-
-            
-        #Handling children in ascending order of index implements
-        #left-to-right ordering due to how the AST is constructed.
-        def __next__(self):
-            retval = None
-            if self.current_node.node.has_children():
-                if self.current_node.child_index < self.current_node.node.get_child_count():
-                    if self.current_node.child_index == 0:
-                        self.metadata_stack.append(self.current_node)
-                    else:
-                        self.current_node.child_index += 1
-
-                    self.current_node = CMakeVarExpansionAST.IteratorMetadataStruct(
-                        self.current_node.node.children[self.current_node.child_index]
-                    )
-                    retval = self.current_node.node
-                else:
-                    self.current_node = self.metadata_stack.pop()
-            else:
-                if len(self.metadata_stack) > 0:
-                    self.current_node = self.metadata_stack.pop()
-                    retval = self.current_node.node
-                else:
-                    raise StopIteration
-            if self.current_node.node.is_root:
-                return self.__next__()  #Cheat to get the next node
-            return retval
-        
-    
-    class BottomRightToUpperLeftTreeIterator:
-        def __init__(self, start_node: 'CMakeVarExpansionAST._CMakeVarExpansionASTNode'):
-            self.start_id = start_node.node_id
-            self.current_node = None
-            self.metadata_stack = [
-                CMakeVarExpansionAST.IteratorMetadataStruct(start_node, start_node.get_child_count() - 1)
-            ]
-    
         def __next__(self):
-            if not self.metadata_stack:
+            if self.index >= len(self.node_ids):
                 raise StopIteration
-            self.current_node = self.metadata_stack.pop()
-
-            node = self.current_node.node
-            if node.node_id == self.start_id:
-                if node.has_children():
-                    if self.current_node.child_index < 0:
-                        raise StopIteration
-                else:
-                    if node.is_root:
-                        raise StopIteration
-                    return node.token
-
-            if node.has_children() and self.current_node.child_index >= 0:
-                node = node.children[self.current_node.child_index]
-                while node.has_children():
-                    self.metadata_stack.append(
-                        CMakeVarExpansionAST.IteratorMetadataStruct(
-                            node,
-                            node.get_child_count() - 1
-                        )
-                    )
-                    node = node.children[node.get_child_count() - 1]
-
-                #self.current_node = self.metadata_stack[-1]
-                #self.current_node = self.metadata_stack.pop()
-            #else:
-            #   self.current_node = self.metadata_stack.pop()
-            #self.current_node = self.metadata_stack.pop()
-
-            if self.metadata_stack:
-                self.metadata_stack[-1].child_index -= 1
-            return node.token
-        
+            node_id = self.node_ids[self.index]
+            self.index += 1
+            return self.ast.get_token(node_id)
+
         def __iter__(self):
             return self
 
-    #
-    # Abstract base class for all AST nodes.
-    #
+    #Visits the children right to left and every subtree before its parent,
+    #which is the pre-order reversed.
+    class BottomRightToUpperLeftTreeIterator(TreeIterator):
+        def __init__(self, ast: 'CMakeVarExpansionAST', node_ids: list):
+            super().__init__(ast, node_ids)
+            self.index = len(node_ids) - 1
 
-    class _CMakeVarExpansionASTNode:
-        def __init__(self, token, id: int):
-            self.token = token
-            self.parent = None
-            self.depth = 0
-            self.children = []
-            self.is_root = False
-            self.node_id = id
-
-        def has_children(self):
-            return len(self.children) > 0
-        
-        def get_child_count(self):
-            return len(self.children)
-        
-    class RootASTNode(_CMakeVarExpansionASTNode):
-        def __init__(self):
-            super().__init__(None, -1)
-            self.is_root = True
-
-    class CMakeVarExpansionASTNode(_CMakeVarExpansionASTNode):
-        def __init__(self, token: list, id: int):
-            var_expansion_tokens.validate_token(token)
-            super().__init__(token, id)
+        def __next__(self):
+            if self.index < 0:
+                raise StopIteration
+            node_id = self.node_ids[self.index]
+            self.index -= 1
+            return self.ast.get_token(node_id)
 
     def __init__(self):
-        self.root = CMakeVarExpansionAST.RootASTNode()
+        self.value_pool = []
+        self.shared_value_offsets = {}
+        for token_type in var_expansion_tokens.VarParseTokenType:
+            if token_type in (
+                var_expansion_tokens.VarParseTokenType.VAR_CHAR_STRING,
+                var_expansion_tokens.VarParseTokenType.VAR_STATEMENT_END
+            ):
+                continue
+            self.shared_value_offsets[token_type] = len(self.value_pool)
+            self.value_pool.append(str(token_type))
+        self.shared_value_count = len(self.value_pool)
+
+        self.token_types = [None]
+        self.value_offsets = [NO_NODE]
+        self.parents = [NO_NODE]
+        self.first_children = [NO_NODE]
+        self.next_siblings = [NO_NODE]
+        self.last_children = [NO_NODE]
+        self.child_counts = [0]
+        self.depths = [0]
+        #node id -> list of the pieces of its value that have not been joined yet:
+        self.string_pieces = {}
+
+        self.root = ROOT_NODE_ID
         self.size = 0
-        self.current_node = self.root
-        self.ref_stack = []
-        self.node_id_counter = -1
+        self.current_node = ROOT_NODE_ID
 
     def __iter__(self):
-        if self.root is None:
-            raise StopIteration
-        return CMakeVarExpansionAST.TreeIterator(self.root)
-    
+        return CMakeVarExpansionAST.TreeIterator(self, self.get_pre_order_node_ids())
+
     def __len__(self):
         return self.size
 
     def get_bottom_right_to_upper_left_iterator(self):
-        if self.root is None:
-            raise StopIteration
-        return CMakeVarExpansionAST.BottomRightToUpperLeftTreeIterator(self.root)
+        return CMakeVarExpansionAST.BottomRightToUpperLeftTreeIterator(self, self.get_pre_order_node_ids())
+
+    #Node ids below "start_id", excluding "start_id" itself, parents before
+    #children and siblings left to right. Walks the sibling links and parent
+    #indices instead of keeping a stack.
+    def get_pre_order_node_ids(self, start_id = ROOT_NODE_ID):
+        retval = []
+        first_children = self.first_children
+        next_siblings = self.next_siblings
+        parents = self.parents
+        node_id = first_children[start_id]
+
+        while node_id != NO_NODE:
+            retval.append(node_id)
+            if first_children[node_id] != NO_NODE:
+                node_id = first_children[node_id]
+                continue
+            while node_id != start_id and next_siblings[node_id] == NO_NODE:
+                node_id = parents[node_id]
+            if node_id == start_id:
+                break
+            node_id = next_siblings[node_id]
+        return retval
+
+    #
+    # Node accessors:
+    #
+    def is_valid_node_id(self, node_id):
+        return isinstance(node_id, int) and 0 <= node_id < len(self.token_types)
+
+    def get_token_type(self, node_id):
+        return self.token_types[node_id]
+
+    def get_token_value(self, node_id):
+        if node_id in self.string_pieces:
+            self.value_pool[self.value_offsets[node_id]] = "".join(self.string_pieces.pop(node_id))
+        return self.value_pool[self.value_offsets[node_id]]
+
+    def get_token(self, node_id):
+        if node_id == ROOT_NODE_ID:
+            return None
+        return [self.token_types[node_id], self.get_token_value(node_id)]
+
+    def get_parent(self, node_id):
+        return self.parents[node_id]
+
+    def get_child_count(self, node_id):
+        return self.child_counts[node_id]
+
+    def get_child_by_index(self, node_id, child_index: int):
+        if child_index < 0:
+            raise development.exceptions.DevelopmentError("Child index cannot be negative")
+        if child_index >= self.child_counts[node_id]:
+            raise development.exceptions.DevelopmentError("Child index is out of bounds")
+
+        #The parser almost always wants the child it has just added.
+        if child_index == self.child_counts[node_id] - 1:
+            return self.last_children[node_id]
+
+        child_id = self.first_children[node_id]
+        for i in range(child_index):
+            child_id = self.next_siblings[child_id]
+        return child_id
+
+    def get_child_ids(self, node_id):
+        retval = []
+        child_id = self.first_children[node_id]
+        while child_id != NO_NODE:
+            retval.append(child_id)
+            child_id = self.next_siblings[child_id]
+        return retval
 
     #
     # Backtracking methods:
     #
     def get_depth_of_node_by_token_ref(self, token):
-        node = self.get_node_by_token_ref(token)
-        return node.depth
-    
+        return self.depths[self.get_node_by_token_ref(token)]
+
     def get_node_by_depth_backtrack(self, backtrack_depth):
-        node = None
-        if self.current_node is None:
-            raise development.exceptions.DevelopmentError("Cannot back trace when current node is None")
+        node_id = None
         if backtrack_depth < 0:
             raise development.exceptions.DevelopmentError("Backtrack depth cannot be negative")
-        node = self.current_node
+        if backtrack_depth > self.depths[self.current_node]:
+            raise development.exceptions.DevelopmentError(
+                "Cannot back trace when depth is greater than the number of nodes in the tree"
+            )
+        node_id = self.current_node
         for i in range(backtrack_depth):
-            if node.parent is not None:
-                node = node.parent
-            else:
-                raise development.exceptions.DevelopmentError(
-                    "Cannot back trace when depth is greater than the number of nodes in the tree"
-                )
-        return node
-    
+            node_id = self.parents[node_id]
+        return node_id
+
     def get_node_by_token_ref(self, id):
-        if len(self.ref_stack) == 0:
+        if self.size == 0:
             raise development.exceptions.DevelopmentError("Cannot back trace when reference stack is empty")
-        for node in self.ref_stack:
-            if node.node_id == id:
-                return node
-        raise development.exceptions.DevelopmentError("Cannot back trace when token reference is not found")
-    
+        if not self.is_valid_node_id(id) or id == ROOT_NODE_ID:
+            raise development.exceptions.DevelopmentError("Cannot back trace when token reference is not found")
+        return id
+
     def backtrack_by_depth(self, depth):
-        node = None
-        if self.current_node is None:
-            raise development.exceptions.DevelopmentError("Cannot back trace when current node is None")
+        node_id = None
         if depth < 0:
             raise development.exceptions.DevelopmentError("Depth cannot be negative")
-        if self.root is None:
-            raise development.exceptions.DevelopmentError("Cannot back trace when root is None")
-        node = self.root
+        node_id = self.root
         for i in range(depth):
-            if node.parent is not None:
-                node = node.parent
+            if self.parents[node_id] != NO_NODE:
+                node_id = self.parents[node_id]
             else:
                 raise development.exceptions.DevelopmentError(
                     "Cannot back trace when depth is greater than the number of nodes in the tree"
                 )
-        self.current_node = node
-        return node
+        self.current_node = node_id
+        return node_id
 
     #
     # Add child methods:
     #
+    def add_node(self, parent_id, token):
+        """Appends a node for "token" as the last child of "parent_id".
+
+        Returns:
+            tuple: (index of the new node among its parent's children, id of the new node)
+        """
+        var_expansion_tokens.validate_token(token)
+        node_id = len(self.token_types)
+        offset = self.shared_value_offsets.get(token[0])
+        if offset is None or self.value_pool[offset] != token[1]:
+            offset = len(self.value_pool)
+            self.value_pool.append(token[1])
+
+        self.token_types.append(token[0])
+        self.value_offsets.append(offset)
+        self.parents.append(parent_id)
+        self.first_children.append(NO_NODE)
+        self.next_siblings.append(NO_NODE)
+        self.last_children.append(NO_NODE)
+        self.child_counts.append(0)
+        self.depths.append(self.depths[parent_id] + 1)
+
+        if self.last_children[parent_id] == NO_NODE:
+            self.first_children[parent_id] = node_id
+        else:
+            self.next_siblings[self.last_children[parent_id]] = node_id
+        self.last_children[parent_id] = node_id
+        self.child_counts[parent_id] += 1
+        self.size += 1
+        return self.child_counts[parent_id] - 1, node_id
+
     def add_child_to_current_node(self, token):
         """Adds a child node to the current node.
-        
+
         Args:
             token: The token to create the new node from
-            
+
         Returns:
             The index of the newly added child in its parent's children array
         """
-        child_index = None
-        id = None
-        node = None
-        if self.root is None:
-            raise development.exceptions.DevelopmentError("Root is None. This should never happen.")
-        
-        if self.current_node is None:
-            raise development.exceptions.DevelopmentError("Current node is None. This should never happen.")
-
-        self.node_id_counter += 1
-        node_id = self.node_id_counter
-        node = CMakeVarExpansionAST.CMakeVarExpansionASTNode(token, node_id)
-        self.current_node.children.append(node)
-        node.parent = self.current_node
-        node.depth = self.current_node.depth + 1
-        self.size += 1
-        child_index = len(self.current_node.children) - 1
-        self.ref_stack.append(node)
-        return child_index, node_id
+        return self.add_node(self.current_node, token)
 
     def add_child_to_node_with_token_ref(self, token_id: int, new_node_token):
         """Adds a child node to the node with the specified token reference.
-        
+
         Args:
             token: The token to create the new node from
 
         Returns:
             The index of the newly added child in its parent's children array
-            
+
         Raises:
             DevelopmentError if node with token reference is not found
         """
-        child_index = None
-        token_id = None
-        node = None
-        if self.root is None:
-            raise development.exceptions.DevelopmentError(
-                "Cannot insert at node with token reference when root is None"
-            )
-        
-        node = self.get_node_by_token_ref(token_id)
-        
-        #Add the child to the node:
-        self.node_id_counter += 1
-        node_id = self.node_id_counter
-        child = CMakeVarExpansionAST.CMakeVarExpansionASTNode(new_node_token, node_id)
-        node.children.append(child)
-        child.parent = node
-        child.depth = node.depth + 1
-        self.size += 1
-        child_index = len(node.children) - 1
-        self.ref_stack.append(child)
-        return child_index, node_id
-    
+        return self.add_node(self.get_node_by_token_ref(token_id), new_node_token)
+
     def add_sibling_by_token_ref(self, token_id: int, new_node_token):
-        node = None
-        new_node = None
-        parent_node = None
-        child_index = None
-        node_id = None
-        if self.current_node is None:
-            raise development.exceptions.DevelopmentError(
-                "Cannot add sibling when current node is None"
-            )
-        if self.current_node.parent is None:
+        if self.parents[self.current_node] == NO_NODE:
             raise development.exceptions.DevelopmentError(
                 "Cannot add sibling when parent is None"
             )
-        node = self.get_node_by_token_ref(token_id)
-        parent_node = node.parent
-        self.node_id_counter += 1
-        node_id = self.node_id_counter
-        new_node = CMakeVarExpansionAST.CMakeVarExpansionASTNode(new_node_token, node_id)
-        parent_node.children.append(new_node)
-        new_node.parent = parent_node
-        new_node.depth = parent_node.depth + 1
-        self.size += 1
-        child_index = len(parent_node.children) - 1
-        self.ref_stack.append(new_node)
-        return child_index, node_id
+        return self.add_node(self.parents[self.get_node_by_token_ref(token_id)], new_node_token)
 
     #
     # Shift methods:
     #
     def shift_to_child_by_index(self, child_index: int):
-        if self.current_node is None:
-            raise development.exceptions.DevelopmentError(
-                "Cannot shift to child when current node is None"
-            )
-        if child_index < 0:
-            raise development.exceptions.DevelopmentError("Child index cannot be negative")
-        if child_index >= len(self.current_node.children):
-            raise development.exceptions.DevelopmentError("Child index is out of bounds")
-
-        self.current_node = self.current_node.children[child_index]
+        self.current_node = self.get_child_by_index(self.current_node, child_index)
 
     def shift_to_child_by_index_at_token_ref(self, token, child_index: int):
-        if child_index < 0:
-            raise development.exceptions.DevelopmentError("Child index cannot be negative") 
-        elif child_index >= len(self.current_node.children):
-            raise development.exceptions.DevelopmentError("Child index is out of bounds")
-
-        if self.root is None:
-            raise development.exceptions.DevelopmentError(
-                "Cannot shift to child when root is None"
-            )
-        node = self.get_node_by_token_ref(token)
-
-        self.current_node = node.children[child_index]
+        self.current_node = self.get_child_by_index(self.get_node_by_token_ref(token), child_index)
 
     #
     # Query methods:
     #
     def list_children_of_current_node(self):
-        """Returns a copy of the list of children of the current node."""
-        return self.current_node.children[:]
+        """Returns a list of the ids of the children of the current node."""
+        return self.get_child_ids(self.current_node)
 
     #I prefer to reveal as little about the internal structure of the AST as possible.
     def shift_to_node_by_token_ref(self, token):
@@ -339,81 +290,89 @@ class CMakeVarExpansionAST:
 
     def merge_adjacent_tokens(self, merge_func, new_token):
         """Merges adjacent tokens of the given type using the provided merge function.
-        
+
         Args:
             token_type: The type of token to merge
             merge_func: A function that takes two tokens and returns a merged token
             new_token: The token to merge with the current node's token
         """
-        if self.current_node is None:
-            raise development.exceptions.DevelopmentError("Current node is None. This should never happen.")
-        
-        if self.current_node.is_root:
+        node_id = self.current_node
+        if node_id == ROOT_NODE_ID:
             return False #Cannot merge adjacent tokens when current node is root
-        
-        if self.current_node.token is None:
-            raise development.exceptions.DevelopmentError(
-                "Current node's token is None. This should never happen except at the root node."
-            )
-        
-        if self.current_node.token[0] == new_token[0]:
+
+        if self.token_types[node_id] == new_token[0]:
             # Merge the tokens using the provided function
-            self.current_node.token = merge_func(
-                self.current_node.token,
-                new_token
-            )
+            merged_token = merge_func(self.get_token(node_id), new_token)
+            self.token_types[node_id] = merged_token[0]
+            if self.value_offsets[node_id] < self.shared_value_count:
+                #Never overwrite a shared value.
+                self.value_offsets[node_id] = len(self.value_pool)
+                self.value_pool.append(merged_token[1])
+            else:
+                self.value_pool[self.value_offsets[node_id]] = merged_token[1]
             return True
         return False
 
+    def append_to_current_string(self, new_token):
+        """Appends the value of "new_token" to the current node if both are strings.
+
+        Unlike "merge_adjacent_tokens", which builds the merged value on every
+        call, this only collects the pieces, so a run of appends takes time
+        linear in the length of the result.
+
+        Returns:
+            True if the value was appended, False if the current node is not a string.
+        """
+        node_id = self.current_node
+        if node_id == ROOT_NODE_ID or \
+            self.token_types[node_id] != var_expansion_tokens.VarParseTokenType.VAR_CHAR_STRING or \
+            new_token[0] != var_expansion_tokens.VarParseTokenType.VAR_CHAR_STRING:
+            return False
+
+        pieces = self.string_pieces.get(node_id)
+        if pieces is None:
+            pieces = [self.value_pool[self.value_offsets[node_id]]]
+            self.string_pieces[node_id] = pieces
+        pieces.append(new_token[1])
+        return True
+
     def pretty_stringify(self, node=None, is_last=True):
         retval_arr = []
         longest_line_length = 0
-        if node is None:
-            if self.root is None:
-                retval_arr.append("(empty tree)")
-                return
+        if node is None or node == self.root:
             node = self.root
-            is_last = True if (node.children is None or len(node.children) == 0) else False
-        elif node == self.root:
-            is_last = True if (node.children is None or len(node.children) == 0) else False
+            is_last = self.child_counts[node] == 0
 
-        # Stack elements are tuples of (node, prefix, is_last)
+        # Stack elements are tuples of (node id, prefix, is_last)
         stack = [(node, "", is_last)]
 
         while stack:
             current_node, current_prefix, current_is_last = stack.pop()
-            
+
             # Print the current node
-            if not current_node.children:
+            if current_node == ROOT_NODE_ID:
+                label = "ROOT"
+            else:
+                label = f"{self.token_types[current_node]}: {self.get_token_value(current_node)}"
+
+            if self.child_counts[current_node] == 0:
                 branch = "└── " if current_is_last else "├── "
-                if current_node.is_root:
-                    retval_arr.append(f"{current_prefix}{branch}ROOT")
-                    longest_line_length = max(longest_line_length, len(retval_arr[-1]))
-                else:
-                    retval_arr.append(f"{current_prefix}{branch}{current_node.token[0]}: {current_node.token[1]}")
-                    longest_line_length = max(longest_line_length, len(retval_arr[-1]))
+                retval_arr.append(f"{current_prefix}{branch}{label}")
             else:
-                if current_node.is_root:
-                    retval_arr.append(f"{current_prefix}ROOT")
-                    longest_line_length = max(longest_line_length, len(retval_arr[-1]))
-                else:
-                    retval_arr.append(f"{current_prefix}{current_node.token[0]}: {current_node.token[1]}")
-                    longest_line_length = max(longest_line_length, len(retval_arr[-1]))
+                retval_arr.append(f"{current_prefix}{label}")
+            longest_line_length = max(longest_line_length, len(retval_arr[-1]))
 
             # Update prefix for children
             new_prefix = current_prefix + ("    " if current_is_last else "│   ")
 
             # Push children onto stack in reverse order to maintain left-to-right printing
-            for i in range(len(current_node.children) - 1, -1, -1):
-                child = current_node.children[i]
-                is_last_child = (i == len(current_node.children) - 1)
-                stack.append((child, new_prefix, is_last_child))
+            children = self.get_child_ids(current_node)
+            for i in range(len(children) - 1, -1, -1):
+                stack.append((children[i], new_prefix, i == len(children) - 1))
 
         return "\n".join(retval_arr), longest_line_length
-    
+
     def pretty_print(self):
         retval_arr, longest_line_length = self.pretty_stringify()
         print(retval_arr)
         print("-" * longest_line_length)
-
-    
\ No newline at end of file
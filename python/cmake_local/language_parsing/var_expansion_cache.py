@@ -0,0 +1,73 @@
+import collections
+import threading
+
+#Bounded LRU cache of variable expansion results.
+#
+#Entries are keyed on the input string, the "no_fail" flag and a fingerprint
+#of the context. The environment variables an expansion read are stored with
+#its result; if any of them has changed since, the entry is dropped and the
+#lookup counts as a miss. The fingerprint includes the context's list file, so
+#different descriptors never share entries.
+#
+#Descriptors are generated from a thread pool (e.g. for "--bundle -j"), so
+#every access to the entries and counters holds a lock.
+
+DEFAULT_MAX_SIZE = 4096
+
+class VarExpansionCache:
+    def __init__(self, max_size = DEFAULT_MAX_SIZE):
+        self.max_size = max_size
+        self.entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def make_key(input, context, no_fail):
+        return (input, no_fail, context.get_fingerprint())
+
+    #Returns tuple: (found, result).
+    def lookup(self, key, context):
+        with self.lock:
+            return self.lookup_locked(key, context)
+
+    def lookup_locked(self, key, context):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return False, None
+
+        result, env_reads = entry
+        for varname, value in env_reads:
+            #Going through the context keeps its record of dereferenced
+            #environment variables complete on a hit.
+            if context.resolve_env_var(varname) != value:
+                del self.entries[key]
+                self.misses += 1
+                return False, None
+
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return True, result
+
+    def store(self, key, result, env_reads):
+        with self.lock:
+            self.entries[key] = (result, tuple(env_reads.items()))
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last = False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self.entries),
+                "max_size": self.max_size
+            }
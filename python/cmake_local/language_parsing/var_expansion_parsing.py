@@ -62,21 +62,20 @@ class VarExpansionParser:
         self.parse_state_token_stack.append(token)
         self.token_list.consume_token()
 
+    #Returns the first token of "token_type" from the current one on, or None.
     def peek_until(self, token_type: VarParseTokenType):
         retval = None
+        index = None
         if self.token_list.is_token_list_fully_iterated():
             raise development.exceptions.DevelopmentError(
                 "Token list is fully iterated. Why are we still trying to parse?"
             )
 
-        for token in self.token_list.iterate_from_current_node():
-            if token[0]== token_type:
-                retval = token
-                break
-    
-        if retval is None:
+        index = self.token_list.find_next_token_index(token_type)
+        if index < 0:
             return None
-        
+
+        retval = self.token_list.get_token(index)
         validate_token(retval)
         return retval
 
@@ -91,10 +90,7 @@ class VarExpansionParser:
         validate_token(token, token_type=VarParseTokenType.VAR_CHAR_STRING)
         
         # Try to merge with current node if it's a string
-        if not self.ast.merge_adjacent_tokens(
-            lambda existing_token, new_token: [existing_token[0], existing_token[1] + new_token[1]],
-            token
-        ):
+        if not self.ast.append_to_current_string(token):
             # Add as new child if merge failed
             self.ast.shift_to_child_by_index(
                 self.ast.add_child_to_current_node(token)[0]
@@ -122,10 +118,6 @@ class VarExpansionParser:
             )
         
         # Check if this is part of a valid variable expansion
-        upcoming_token = self.peek_until(VarParseTokenType.VAR_CLOSE_BRACE)
-        if upcoming_token is None:
-            raise VarParseError("Unterminated variable expansion.")
-        
         is_valid_expansion = False
         if len(self.parse_state_token_stack) > 0:
             prev_token = self.parse_state_token_stack[-1]
@@ -142,6 +134,11 @@ class VarExpansionParser:
             token[0] = VarParseTokenType.VAR_CHAR_STRING
             self.parse_string()
             return
+
+        #Only an expansion has to be closed; a literal "{" does not.
+        upcoming_token = self.peek_until(VarParseTokenType.VAR_CLOSE_BRACE)
+        if upcoming_token is None:
+            raise VarParseError("Unterminated variable expansion.")
         
         child_index, node_id = self.ast.add_child_to_current_node(token)
         self.var_expansion_nest_stack.append(node_id)
@@ -165,6 +162,7 @@ class VarExpansionParser:
             self.parse_string()
             return
         
+        self.var_expansion_nest_stack.pop()
         self.consume_token()
         self.ast.shift_to_child_by_index(
             self.ast.add_child_to_current_node(token)[0]
@@ -175,7 +173,6 @@ class VarExpansionParser:
         self.check_recursion_depth("parse_env")
         token = None
         prev_token = None
-        next_token = None
 
         if self.token_list.is_token_list_fully_iterated():
             raise development.exceptions.DevelopmentError(
@@ -184,17 +181,14 @@ class VarExpansionParser:
 
         token = self.token_list.get_current_token()
         validate_token(token, token_type=VarParseTokenType.VAR_ENV)
-       
-        next_token = self.token_list.peek_token(1) 
-        validate_token(next_token)
 
         # Validate that ENV is followed by an open brace
-        if next_token[0] != VarParseTokenType.VAR_OPEN_BRACE:
+        if self.token_list.peek_token_type(1) != VarParseTokenType.VAR_OPEN_BRACE:
             token[0] = VarParseTokenType.VAR_CHAR_STRING
             self.parse_string()
             return
         
-        if not self.parse_state_token_stack:
+        if self.parse_state_token_stack is None:
             raise development.exceptions.DevelopmentError(
                 "Parse state token stack was not initialized."
                 "It should have been initialized by the parser"
@@ -202,10 +196,11 @@ class VarExpansionParser:
             )
 
         # Validate that ENV is preceded by $
-        prev_token = self.parse_state_token_stack[-1]
-        validate_token(prev_token)
+        if len(self.parse_state_token_stack) > 0:
+            prev_token = self.parse_state_token_stack[-1]
+            validate_token(prev_token)
 
-        if prev_token[0] != VarParseTokenType.VAR_EXPANSION:
+        if prev_token is None or prev_token[0] != VarParseTokenType.VAR_EXPANSION:
             token[0] = VarParseTokenType.VAR_CHAR_STRING
             self.parse_string()
             return
@@ -217,7 +212,7 @@ class VarExpansionParser:
     def parse_var_expansion(self):
         self.check_recursion_depth("parse_var_expansion")
         token = None
-        next_token = None
+        next_token_type = None
 
         if self.token_list.is_token_list_fully_iterated():
             raise development.exceptions.DevelopmentError(
@@ -226,12 +221,13 @@ class VarExpansionParser:
 
         token = self.token_list.get_current_token()
         validate_token(token, token_type=VarParseTokenType.VAR_EXPANSION)
-         
-        next_token = self.token_list.peek_token(1)
-        validate_token(next_token)
-        
-        if next_token[0] != VarParseTokenType.VAR_OPEN_BRACE and \
-           next_token[0] != VarParseTokenType.VAR_ENV:
+
+        #Only "${" and "$ENV{" start an expansion. Like CMake, any other "$",
+        #such as the one in "$ENVFOO" or one at the end of the line, is text.
+        next_token_type = self.token_list.peek_token_type(1)
+        if next_token_type == VarParseTokenType.VAR_ENV:
+            next_token_type = self.token_list.peek_token_type(2)
+        if next_token_type != VarParseTokenType.VAR_OPEN_BRACE:
             token[0] = VarParseTokenType.VAR_CHAR_STRING
             self.parse_string()
             return
@@ -246,7 +242,12 @@ class VarExpansionParser:
     #Dispatch has access to previous state.
     def build_ast(self):
         self.check_recursion_depth(func_name="build_ast")
+        depth = self.recursion_depth
         while not self.token_list.is_token_list_fully_iterated():
+            #Every token starts again from the depth of this loop, so the
+            #depth measures how deeply the parse_* calls for one token nest,
+            #not how many tokens there are.
+            self.recursion_depth = depth
             token = self.token_list.get_current_token()
             if token[0] == VarParseTokenType.VAR_ENV:
                 self.parse_env()
@@ -261,6 +262,10 @@ class VarExpansionParser:
             else:
                 raise development.exceptions.DevelopmentError(f"Unimplemented token type: {token[0]}")
 
+        #A "}" further on only closed an inner expansion:
+        if len(self.var_expansion_nest_stack) > 0:
+            raise VarParseError("Unterminated variable expansion.")
+
     def parse(self, string):
         retval = None
         if string is None or len(string) == 0:
@@ -1,28 +1,51 @@
 
+import re
+
 import development.exceptions
 from . import var_expansion_tokens
 class VarExpansionTokenList:
+    #Tokens are stored in compact form, as (token_type, start, end) tuples that
+    #point back into the source string. The [token_type, value] list the parser
+    #works with is only built, and the value only sliced, the first time a token
+    #is retrieved. Retrieved tokens are kept, so changes the parser makes to
+    #them (such as demoting a stray brace to a VAR_CHAR_STRING) stick.
     class TokenListIterator:
         def __init__(self, token_list, index = 0):
             self.token_list = token_list
             self.index = index
 
         def __next__(self):
-            if self.index >= len(self.token_list):
+            if self.index >= len(self.token_list.token_list):
                 raise StopIteration
-            token = self.token_list[self.index]
+            token = self.token_list.materialize_token(self.index)
             self.index += 1
             return token
 
         def __iter__(self):
             return self
+
+    #Every match is a token of its own. Whatever lies between
+    #two matches is a VAR_CHAR_STRING.
+    RE_SPECIAL_TOKEN = re.compile(R"[${}]|ENV")
+    SPECIAL_TOKEN_TYPES = {
+        '$': var_expansion_tokens.VarParseTokenType.VAR_EXPANSION,
+        '{': var_expansion_tokens.VarParseTokenType.VAR_OPEN_BRACE,
+        '}': var_expansion_tokens.VarParseTokenType.VAR_CLOSE_BRACE,
+        'ENV': var_expansion_tokens.VarParseTokenType.VAR_ENV
+    }
         
     def __init__(self, string):
         self.token_list_ind = 0
         self.token_list_end = False
         self.var_expansion_nest_stack = []
-        self.token_list = self.get_token_list(string)
+        self.string = string
+        self.compact_tokens = self.get_token_list(string)
+        self.token_list = [None] * len(self.compact_tokens)
+        #token type -> index of the last token of that type "find_next_token_index"
+        #found, or the length of the list if there was none:
+        self.next_token_indices = {}
 
+    #Returns a list of compact (token_type, start, end) tokens.
     def get_token_list(self,string):
         if not isinstance(string, str):
             raise development.exceptions.DevelopmentError("Input string must be a string")
@@ -31,59 +54,55 @@ class VarExpansionTokenList:
             raise development.exceptions.DevelopmentError("Input string cannot be None")
         
         retval_tokens = []
-        temp_arr=[]
-        counter = 0
-        token_list_ind = 0
-        while counter < len(string):
-            match(string[counter]):
-                case '$':
-                    if len(temp_arr) > 0:
-                        retval_tokens.append([var_expansion_tokens.VarParseTokenType.VAR_CHAR_STRING, "".join(temp_arr)])
-                        temp_arr.clear()
-                        token_list_ind += 1
-                    retval_tokens.append([var_expansion_tokens.VarParseTokenType.VAR_EXPANSION, '$'])
-                    token_list_ind += 1
-                
-                case '{':
-                    if len(temp_arr) > 0:
-                        retval_tokens.append([var_expansion_tokens.VarParseTokenType.VAR_CHAR_STRING, "".join(temp_arr)])
-                        temp_arr.clear()
-                        token_list_ind += 1
-                    retval_tokens.append([var_expansion_tokens.VarParseTokenType.VAR_OPEN_BRACE, '{'])
-                    token_list_ind += 1
-                
-                case '}':                   
-                    if len(temp_arr) > 0:
-                        retval_tokens.append([var_expansion_tokens.VarParseTokenType.VAR_CHAR_STRING, "".join(temp_arr)])
-                        temp_arr.clear()
-                        token_list_ind += 1
-                    retval_tokens.append([var_expansion_tokens.VarParseTokenType.VAR_CLOSE_BRACE,'}'])
-                    token_list_ind += 1
-                case 'E':
-                    if(string[counter : counter + 3] == 'ENV'):
-                        if len(temp_arr) > 0:
-                            retval_tokens.append([var_expansion_tokens.VarParseTokenType.VAR_CHAR_STRING, "".join(temp_arr)])
-                            temp_arr.clear()
-                            token_list_ind += 1
-                        retval_tokens.append([var_expansion_tokens.VarParseTokenType.VAR_ENV, 'ENV'])
-                        counter += 2
-                        token_list_ind += 1
-                    else: 
-                        temp_arr.append('E')
-                case _:
-                    temp_arr.append(string[counter])
-            counter += 1
-
-        if len(temp_arr) > 0:
-            retval_tokens.append([var_expansion_tokens.VarParseTokenType.VAR_CHAR_STRING, "".join(temp_arr)])
-            temp_arr.clear() 
+        position = 0
+        for match in self.RE_SPECIAL_TOKEN.finditer(string):
+            match_start = match.start()
+            if match_start > position:
+                retval_tokens.append(
+                    (var_expansion_tokens.VarParseTokenType.VAR_CHAR_STRING, position, match_start)
+                )
+            position = match.end()
+            retval_tokens.append((self.SPECIAL_TOKEN_TYPES[match.group()], match_start, position))
+
+        if position < len(string):
+            retval_tokens.append(
+                (var_expansion_tokens.VarParseTokenType.VAR_CHAR_STRING, position, len(string))
+            )
         return retval_tokens
 
+    def materialize_token(self, index):
+        token = self.token_list[index]
+        if token is None:
+            token_type, start, end = self.compact_tokens[index]
+            token = [token_type, self.string[start:end]]
+            self.token_list[index] = token
+        return token
+
+    def get_token_span(self, index):
+        _, start, end = self.compact_tokens[index]
+        return start, end
+
     def __iter__(self):
-        return self.TokenListIterator(self.token_list)    
+        return self.TokenListIterator(self)    
 
     def iterate_from_current_node(self):
-        return self.TokenListIterator(self.token_list, self.token_list_ind)
+        return self.TokenListIterator(self, self.token_list_ind)
+
+    #Returns the index of the first token of "token_type" at or after the
+    #current one, or -1 if there is none. The current index only moves
+    #forward, so each search resumes where the last one for the same type
+    #stopped and all of them together visit every token at most once.
+    #The parser only changes the type of the token it is on, so the types
+    #ahead of it are still those the tokenizer gave them.
+    def find_next_token_index(self, token_type):
+        compact_tokens = self.compact_tokens
+        index = self.next_token_indices.get(token_type, -1)
+        if index < self.token_list_ind:
+            index = self.token_list_ind
+            while index < len(compact_tokens) and compact_tokens[index][0] != token_type:
+                index += 1
+            self.next_token_indices[token_type] = index
+        return index if index < len(compact_tokens) else -1
 
     def get_current_token(self):
         retval = None
@@ -97,7 +116,7 @@ class VarExpansionTokenList:
                 "Tried to retrieve token past the end of the token list"
             )
         
-        retval = self.token_list[self.token_list_ind]
+        retval = self.materialize_token(self.token_list_ind)
         var_expansion_tokens.validate_token(retval)
         return retval
     
@@ -133,6 +152,18 @@ class VarExpansionTokenList:
         return token
         
     
+    #Returns the type of the token "lookahead_count" tokens after the current
+    #one, or None past the end of the list.
+    def peek_token_type(self, lookahead_count):
+        index = self.token_list_ind + lookahead_count
+        if lookahead_count < 0:
+            raise development.exceptions.DevelopmentError(
+                "Lookahead count cannot be negative"
+            )
+        if index >= len(self.token_list):
+            return None
+        return self.materialize_token(index)[0]
+
     def get_token(self, index):
         if self.is_token_list_fully_iterated():
             raise development.exceptions.DevelopmentError(
@@ -149,7 +180,7 @@ class VarExpansionTokenList:
                 "Index is greater than the length of the token list"
             )
     
-        token = self.token_list[index]
+        token = self.materialize_token(index)
         var_expansion_tokens.validate_token(token)
         return token
          
@@ -157,7 +188,7 @@ class VarExpansionTokenList:
         #Throw an error if the token reference is not a valid token:
         var_expansion_tokens.validate_token(token_ref)
         
-        for index, token in enumerate(self.token_list):
+        for index, token in enumerate(self):
             if token == token_ref:
                 return index
         return -1
@@ -0,0 +1,55 @@
+#Writes Make-style dependency files ("depfiles"), for "--depfile".
+#
+#A depfile holds a single rule naming the generated files and every file they
+#were generated from:
+#
+#   tests/a.cmake: a.cmake include/helper.cmake cmake-test.cmake
+#
+#Ninja and Make read it back to decide whether generation has to run again,
+#as "add_custom_command(... DEPFILE ...)" does. Spaces and "#" in paths are
+#escaped with a backslash and "$" is doubled, which both tools understand.
+#
+#Generation leaves a test file alone when it would not change, so a test file
+#can stay older than a dependency that was touched, or whose edit made no
+#difference to it. The generated files are never touched to hide that, since
+#their mtimes have to say when their contents last changed. Ninja handles
+#this by itself, as CMake declares its custom commands "restat". For Make, a
+#stamp file can be given: it becomes the rule's first target and is touched
+#every time, so that it can be the custom command's OUTPUT.
+import os
+import pathlib
+
+import output_writer
+
+def escape_path(path):
+    return os.fspath(path).replace("$", "$$").replace("#", "\\#").replace(" ", "\\ ")
+
+#Returns the depfile contents. Every target depends on every dependency, in
+#the order given, with duplicates left out.
+def format_depfile(targets, dependencies):
+    unique_dependencies = list(dict.fromkeys(os.fspath(path) for path in dependencies))
+    lines = ["{}:".format(" ".join(escape_path(target) for target in targets))]
+    for dependency in unique_dependencies:
+        lines[-1] += " \\"
+        lines.append("  {}".format(escape_path(dependency)))
+    return "\n".join(lines) + "\n"
+
+#Creates the file at "path" if needed and sets its mtime to now.
+def touch_stamp(path):
+    path = pathlib.Path(path)
+    if not path.parent.is_dir():
+        path.parent.mkdir(parents = True, exist_ok = True)
+    path.touch()
+    os.utime(path)
+
+#"stamp_path", if given, is listed before "targets" and touched afterwards.
+def write_depfile(path, targets, dependencies, stamp_path = None):
+    targets = list(targets)
+    if stamp_path is not None:
+        targets.insert(0, os.path.abspath(stamp_path))
+    path = pathlib.Path(path)
+    if not path.parent.is_dir():
+        path.parent.mkdir(parents = True, exist_ok = True)
+    output_writer.write_if_changed(path, [format_depfile(targets, dependencies)])
+    if stamp_path is not None:
+        touch_stamp(stamp_path)
@@ -0,0 +1,117 @@
+#Puts several test descriptors into one generated file, so that a whole suite
+#runs in a single "cmake -P" instead of paying for CMake's start-up once per
+#descriptor.
+#
+#CMake commands are global, so two descriptors that both define "setup" would
+#clobber each other. Every macro and function a descriptor defines is renamed
+#with a prefix unique to the descriptor, together with every call to it from
+#the copied definitions and from the generated test calls. The descriptor's
+#includes are emitted in its own section, right before its definitions, so
+#commands an included file defines are in place while that descriptor's tests
+#run and no earlier.
+#
+#Each section prints a BEGIN marker before its tests and a PASS marker after
+#them. A descriptor whose tests stop CMake has a BEGIN marker without a PASS
+#marker; see "parse_bundle_output".
+import enum
+import re
+
+from cmake_local.language_parsing import cmake_lexer
+
+BEGIN_MARKER = "CMAKE-TEST BEGIN: "
+PASS_MARKER = "CMAKE-TEST PASS: "
+
+DEFINITION_COMMANDS = frozenset(("macro", "function"))
+
+#The kinds of argument a renamed macro or function name can be written as.
+RENAMED_ARGUMENT_TYPES = frozenset((cmake_lexer.CMakeArgumentType.UNQUOTED, cmake_lexer.CMakeArgumentType.QUOTED))
+
+#Commands start their line, after any indentation.
+RE_LEADING_COMMAND_NAME = re.compile(R"^([ \t]*)([A-Za-z_][A-Za-z0-9_]*)")
+
+class DescriptorResult(enum.Enum):
+    PASS = "PASS"
+    FAIL = "FAIL"
+    NOT_RUN = "NOT RUN"
+
+def get_command_prefix(index):
+    return "bundle_{}_".format(index)
+
+def get_marker_command(marker, descriptor):
+    return "message(STATUS \"{}{}\")\n".format(marker, cmake_lexer.escape_quoted_argument(descriptor.__str__()))
+
+class CommandNamespace:
+    def __init__(self, prefix, command_names):
+        self.prefix = prefix
+        #CMake command names are case-insensitive.
+        self.command_names = frozenset(name.lower() for name in command_names)
+
+    #"definitions" is a list of line lists, one per macro or function
+    #definition. Nested definitions are renamed as well.
+    @classmethod
+    def from_definitions(cls, prefix, definitions):
+        command_names = []
+        for lines in definitions:
+            for invocation in cmake_lexer.iter_invocations(lines):
+                if invocation.name.lower() not in DEFINITION_COMMANDS or len(invocation.arguments) == 0:
+                    continue
+                if invocation.arguments[0].argument_type in RENAMED_ARGUMENT_TYPES:
+                    command_names.append(invocation.arguments[0].value)
+        return cls(prefix, command_names)
+
+    def get_name(self, name):
+        if name.lower() in self.command_names:
+            return self.prefix + name
+        return name
+
+    #Returns a copy of "lines" with the definitions of, and the calls to, the
+    #renamed commands rewritten. References that are not calls, such as
+    #"if(COMMAND name)", are left alone.
+    def rename_lines(self, lines):
+        retval = list(lines)
+        for invocation in cmake_lexer.iter_invocations(lines):
+            if invocation.name.lower() in self.command_names:
+                retval[invocation.start_line] = RE_LEADING_COMMAND_NAME.sub(
+                    lambda match: match.group(1) + self.prefix + match.group(2),
+                    retval[invocation.start_line],
+                    count = 1
+                )
+            elif invocation.name.lower() in DEFINITION_COMMANDS:
+                self.rename_definition(retval, invocation)
+        return retval
+
+    def rename_definition(self, lines, invocation):
+        if len(invocation.arguments) == 0:
+            return
+        argument = invocation.arguments[0]
+        if argument.argument_type not in RENAMED_ARGUMENT_TYPES:
+            return
+        if argument.value.lower() not in self.command_names:
+            return
+
+        line = lines[argument.line]
+        start = 0
+        if argument.line == invocation.start_line:
+            start = line.index("(") + 1
+        if argument.argument_type == cmake_lexer.CMakeArgumentType.QUOTED:
+            match = re.compile("\"" + re.escape(argument.value) + "\"").search(line, start)
+            offset = 1
+        else:
+            match = re.compile(R"(?<![\w$])" + re.escape(argument.value) + R"(?!\w)").search(line, start)
+            offset = 0
+        if match is not None:
+            position = match.start() + offset
+            lines[argument.line] = line[:position] + self.prefix + line[position:]
+
+#Returns {descriptor: DescriptorResult} for every descriptor in "descriptors",
+#from the output of a bundle run. A descriptor that began but did not pass
+#failed: CMake stops at the first fatal error. Errors that do not stop CMake,
+#such as "message(SEND_ERROR)", only show in its exit code.
+def parse_bundle_output(output, descriptors):
+    retval = {descriptor.__str__(): DescriptorResult.NOT_RUN for descriptor in descriptors}
+    for line in output.splitlines():
+        for marker, result in ((BEGIN_MARKER, DescriptorResult.FAIL), (PASS_MARKER, DescriptorResult.PASS)):
+            index = line.find(marker)
+            if index >= 0:
+                retval[line[index + len(marker):]] = result
+    return retval
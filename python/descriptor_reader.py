@@ -0,0 +1,87 @@
+#Reads a test descriptor one line at a time.
+#
+#The scanner only ever looks at the line it is on and, while it looks for the
+#end of a macro or function definition, the lines up to that end. Lines are
+#read from the file on first access and kept in a window until the scanner
+#releases them. Ranges the generated file needs, such as command definition
+#bodies, are retained separately, so memory use does not grow with the size of
+#the descriptor but only with the size of what gets copied into the output.
+import development.exceptions
+
+class DescriptorLineReader:
+    #"transform", if given, is applied to every line as it is read.
+    def __init__(self, file, transform = None):
+        self.file = file
+        self.transform = transform
+        self.window = []
+        self.window_start = 0
+        self.retained = {}
+        self.at_eof = file is None
+        #Largest number of lines held in the window at once.
+        self.peak_window_size = 0
+
+    def read_until(self, index):
+        line = None
+        while not self.at_eof and self.window_start + len(self.window) <= index:
+            line = self.file.readline()
+            if line == '':
+                self.at_eof = True
+                break
+            if self.transform is not None:
+                line = self.transform(line)
+            self.window.append(line)
+        if len(self.window) > self.peak_window_size:
+            self.peak_window_size = len(self.window)
+
+    def has_line(self, index):
+        if index in self.retained:
+            return True
+        self.read_until(index)
+        return index < self.window_start + len(self.window)
+
+    def __getitem__(self, index):
+        line = self.retained.get(index)
+        if line is not None:
+            return line
+
+        if index < self.window_start:
+            raise development.exceptions.DevelopmentError(
+                "Descriptor line {} was read after it had been released.".format(index)
+            )
+        self.read_until(index)
+        if index >= self.window_start + len(self.window):
+            raise IndexError("Descriptor line {} is past the end of the file.".format(index))
+        return self.window[index - self.window_start]
+
+    def __iter__(self):
+        window_end = self.window_start + len(self.window)
+        retained_indices = sorted(self.retained.keys())
+        for index in retained_indices:
+            if index < self.window_start:
+                yield self.retained[index]
+        for line in self.window:
+            yield line
+        for index in retained_indices:
+            if index >= window_end:
+                yield self.retained[index]
+
+    #Keeps lines "start" to "end", inclusive, after they are released.
+    def retain(self, start, end):
+        for index in range(start, end + 1):
+            self.retained[index] = self[index]
+
+    #Drops every line before "index" that is not retained.
+    def release_before(self, index):
+        count = index - self.window_start
+        if count <= 0:
+            return
+        del self.window[:count]
+        self.window_start = index
+
+    #Returns a reader over just the retained lines, with "transform" applied
+    #to each. It does not read from any file.
+    def copy_retained(self, transform = None):
+        retval = DescriptorLineReader(None)
+        for index, line in self.retained.items():
+            retval.retained[index] = line if transform is None else transform(line)
+        return retval
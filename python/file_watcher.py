@@ -0,0 +1,105 @@
+#Polls a set of files for changes, for "run-suite.py --watch".
+#
+#A snapshot maps every watched path to its (mtime in ns, size), or to None
+#while the file does not exist. Snapshots are taken with "os.scandir", one
+#scan per directory holding watched files, so watching many files in a few
+#directories takes few system calls and no dependency beyond the standard
+#library. An editor that saves by renaming a new file over the old one shows
+#up as a change like any other write.
+import os
+import time
+
+DEFAULT_POLL_INTERVAL = 0.5
+#How long the files must stay unchanged before a batch of changes is handed
+#out. Saving several files at once, or an editor writing a file in steps,
+#then causes a single rerun.
+DEFAULT_SETTLE_TIME = 0.3
+
+def normalize_path(path):
+    return os.path.abspath(os.fspath(path))
+
+def take_snapshot(paths):
+    retval = {}
+    names_by_directory = {}
+    for path in paths:
+        path = normalize_path(path)
+        names_by_directory.setdefault(os.path.dirname(path), set()).add(os.path.basename(path))
+
+    for directory, names in names_by_directory.items():
+        found = {}
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.name not in names:
+                        continue
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    found[entry.name] = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            pass
+
+        for name in names:
+            retval[os.path.join(directory, name)] = found.get(name)
+    return retval
+
+def get_changed_paths(old_snapshot, new_snapshot):
+    return set(
+        path for path in set(old_snapshot.keys()) | set(new_snapshot.keys())
+        if old_snapshot.get(path) != new_snapshot.get(path)
+    )
+
+class FileWatcher:
+    #"sleep" and "clock" can be replaced for testing.
+    def __init__(
+        self,
+        paths,
+        poll_interval = DEFAULT_POLL_INTERVAL,
+        settle_time = DEFAULT_SETTLE_TIME,
+        sleep = time.sleep,
+        clock = time.monotonic
+    ):
+        self.poll_interval = poll_interval
+        self.settle_time = settle_time
+        self.sleep = sleep
+        self.clock = clock
+        self.snapshot = take_snapshot(paths)
+
+    def get_paths(self):
+        return set(self.snapshot.keys())
+
+    #Changes the set of watched paths. Paths that were already watched keep
+    #their last snapshot, so a change made while the caller was busy is
+    #still reported by the next poll.
+    def set_paths(self, paths):
+        paths = set(normalize_path(path) for path in paths)
+        snapshot = {path: value for path, value in self.snapshot.items() if path in paths}
+        snapshot.update(take_snapshot(path for path in paths if path not in snapshot))
+        self.snapshot = snapshot
+
+    #Returns the paths that changed since the last poll.
+    def poll(self):
+        snapshot = take_snapshot(self.snapshot.keys())
+        retval = get_changed_paths(self.snapshot, snapshot)
+        self.snapshot = snapshot
+        return retval
+
+    #Blocks until a watched file changes and then until none has changed for
+    #"settle_time". Returns every path that changed in between.
+    def wait_for_changes(self):
+        retval = set()
+        changed = None
+        quiet_since = None
+        while len(retval) == 0:
+            self.sleep(self.poll_interval)
+            retval = self.poll()
+
+        quiet_since = self.clock()
+        while self.clock() - quiet_since < self.settle_time:
+            self.sleep(min(self.poll_interval, self.settle_time))
+            changed = self.poll()
+            if len(changed) > 0:
+                retval |= changed
+                quiet_since = self.clock()
+        return retval
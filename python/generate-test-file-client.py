@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+
+#Thin client for a running "generate-test-file.py --serve" daemon.
+#It forwards its arguments to the daemon and exits with the generator's
+#return code. If no daemon answers, it exits with
+#DAEMON_UNAVAILABLE_EXIT_CODE so that the caller can run the generator
+#directly instead.
+#
+#Usage: generate-test-file-client.py [-s|--socket <path>] <generator arguments>
+#Without "--socket", the CMAKE_TEST_GENERATOR_SOCKET environment variable is used.
+import os
+import sys
+
+import generator_daemon
+
+def main(args):
+    socket_path = os.environ.get("CMAKE_TEST_GENERATOR_SOCKET")
+    if len(args) >= 2 and args[0] in ("-s", "--socket"):
+        socket_path = args[1]
+        args = args[2:]
+
+    if socket_path is None or socket_path == '':
+        print("No generator daemon socket was specified.", file=sys.stderr)
+        return generator_daemon.DAEMON_UNAVAILABLE_EXIT_CODE
+
+    try:
+        response = generator_daemon.request_generation(socket_path, args)
+    except generator_daemon.GeneratorDaemonError as e:
+        print(e, file=sys.stderr)
+        return 1
+    except OSError as e:
+        print("Generator daemon is unavailable: {}".format(e), file=sys.stderr)
+        return generator_daemon.DAEMON_UNAVAILABLE_EXIT_CODE
+
+    sys.stdout.write(response["stdout"])
+    sys.stderr.write(response["stderr"])
+    return response["returncode"]
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
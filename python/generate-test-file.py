@@ -2,17 +2,40 @@
 
 #Given a test description file, itself valid CMake, generates
 #another CMake file that is capable of running the tests.
+#
+#The generator runs once per descriptor, often hundreds of times per build, so
+#its start-up time adds up. Only what every run needs is imported here; the
+#modules behind an option ("--bundle", "--serve", "--instrument",
+#"--depfile", "--lint-only", "-j") are imported by the functions that use them,
+#and the variable expansion parser is only loaded for a line with a "$" in
+#it (see "cmake_local.language_parsing"). "build-zipapp.py" packs all of it
+#into a precompiled archive.
 import argparse
 import enum
 import os
 import pathlib
 import re
-import subprocess
 import sys
 
 import cmake_local.cmake_helper as cmake_helper
+from cmake_local.language_parsing import cmake_lexer
+import descriptor_reader
 import filepath_helper
 import development.exceptions
+import generation_manifest
+import generation_profile
+import lint_cache
+import output_writer
+
+#The script, or the zip application it was loaded from; see "build-zipapp.py".
+SCRIPT_PATH = pathlib.Path(__file__).resolve()
+if not SCRIPT_PATH.is_file():
+    SCRIPT_PATH = SCRIPT_PATH.parent
+CMAKE_TEST_FILE_PATH = SCRIPT_PATH.parent.parent / "cmake-test.cmake"
+#Packages the generator imports, besides the modules next to it.
+GENERATOR_PACKAGES = ("cmake_local", "development")
+#See "get_generator_digest".
+GENERATOR_DIGEST = None
 
 # Because internal structure can shift, I choose to expose as little as possible.
 # This encapsulation allows for future implementation changes without breaking
@@ -27,14 +50,8 @@ class TestDescriptorFileParseError(RuntimeError):
 class ApplicationSingleton:
     def __init__(self, context):
         self.context = context
-        self.re_add_setup_macro = re.compile(R"^\s?add_setup_macro\s?\(")
-        self.re_add_teardown_macro = re.compile(R"^\s?add_teardown_macro\s?\(")
-        self.re_add_test_macro = re.compile(R"^\s?add_test_macro\s?\(")
-        self.re_macro_definition = re.compile(R"^\s?macro\s?\(")
-        self.re_macro_end = re.compile(R"^\s?endmacro\s?\(\)\s?(.*?)(#.*)?$")
-        self.re_function_definition = re.compile(R"^\s?function\s?\(")
-        self.re_function_end = re.compile(R"^\s?endfunction\s?\(\)\s?(.*?)(#.*)?$")
-        self.re_include = re.compile(R"^\s?include\s?\(")
+        #Pulls out the identifier of the command a line starts with:
+        self.re_command_invocation = re.compile(R"^\s?([A-Za-z_][A-Za-z0-9_]*)\s?\(")
 
 class TestMacro:
     def __init__(self, name, args):
@@ -45,12 +62,24 @@ class ParseStatus:
     def __init__(self):
         self.input_filepath = None
         self.current_index = 0
+        #A DescriptorLineReader. Only the command definitions are kept once
+        #the scanner has moved past them.
         self.lines = []
         self.includes = []
+        #Resolved, unescaped paths of the included files:
+        self.include_paths = []
+        #(index, argument) of every "include()", before its path is resolved:
+        self.include_args = []
+        #A template is scanned from the unexpanded lines. Its includes are only
+        #resolved when it is rendered for a context.
+        self.is_template = False
         self.test_groups = {}
         self.setup_macro = None
         self.teardown_macro = None
         self.command_definitions = []
+        self.block_index = None
+        #The CMakeCommandInvocation the scan_for_* functions are looking at:
+        self.current_invocation = None
 
     def __str__(self):
         str_arr = []
@@ -76,9 +105,16 @@ class ParseStatus:
         return "".join(str_arr)
 
 
-class CommandDefinitionTypes(enum.Enum):
-    MACRO = enum.auto()
-    FUNCTION = enum.auto()
+#The commands the descriptor scanner acts on, by CMake command name.
+class DescriptorCommand(enum.Enum):
+    INCLUDE = "include"
+    MACRO = "macro"
+    FUNCTION = "function"
+    ADD_SETUP_MACRO = "add_setup_macro"
+    ADD_TEARDOWN_MACRO = "add_teardown_macro"
+    ADD_TEST_MACRO = "add_test_macro"
+
+DESCRIPTOR_COMMANDS_BY_NAME = {command.value: command for command in DescriptorCommand}
 
 def print_err(string: str):
     if string is None:
@@ -133,163 +169,180 @@ def remove_cmake_escape_sequences(input):
 #    relative_path = filepath_helper.resolve_abs_path(relative_path)
 #    return relative_path
 
+#Returns the first argument of the invocation being scanned.
+def get_first_argument(parse_status):
+    invocation = parse_status.current_invocation
+    argument_values = invocation.get_argument_values()
+    if len(argument_values) == 0:
+        raise TestDescriptorFileParseError(
+            "{}() needs an argument.".format(invocation.name),
+            line = invocation.start_line
+        )
+    return argument_values[0]
+
+#Returns a dict of the values given to "keywords" in the invocation being
+#scanned, as in "add_test_macro(MACRO_NAME <name> TEST_GROUP <group>)".
+def get_keyword_arguments(parse_status, keywords, required_keywords = ()):
+    retval = {}
+    invocation = parse_status.current_invocation
+    argument_values = invocation.get_argument_values()
+    index = 0
+    while index < len(argument_values):
+        if argument_values[index] in keywords and index + 1 < len(argument_values):
+            retval[argument_values[index]] = argument_values[index + 1]
+            index += 2
+            continue
+        index += 1
+
+    for keyword in required_keywords:
+        if not keyword in retval:
+            raise TestDescriptorFileParseError(
+                "{}() needs \"{} <value>\".".format(invocation.name, keyword),
+                line = invocation.start_line
+            )
+    return retval
+
 def scan_for_include(parse_status, app_singleton):
+    include_arg = get_first_argument(parse_status)
+    parse_status.include_args.append((parse_status.current_index, include_arg))
+    if not parse_status.is_template:
+        add_include(parse_status, parse_status.current_index, include_arg)
+    return True
+
+def add_include(parse_status, index, include_arg):
     #We ignore "include(*/cmake-test.cmake)"
     CMAKE_TEST_FILENAME = "cmake-test.cmake"
-    temp = None
-    index_temp = parse_status.current_index
-    str_temp = parse_status.lines[index_temp]
- 
-    if app_singleton.re_include.search(str_temp) is None:
-        return False
-    index_temp = str_temp.index('(')
-    
-    str_temp = (str_temp[index_temp + 1: -2]).strip()
-    str_temp = strip_quotation_marks(str_temp)
-    
-    temp = filepath_helper.resolve_abs_path(str_temp)
-    str_temp = pathlib.Path(str_temp).name
+    temp = filepath_helper.resolve_abs_path(include_arg)
     
     #Quietly ignore the include of the dummy definitions:        
-    if not CMAKE_TEST_FILENAME in str_temp:
+    if not CMAKE_TEST_FILENAME in pathlib.Path(include_arg).name:
         parse_status.includes.append(
             (
-                parse_status.current_index, 
+                index, 
                 remove_cmake_escape_sequences(temp.__str__())
             )
         )
-    parse_status.current_index += 1
-    return True
-
-#Macros and functions are defined similarly and can be detected in the same way.
-#returns tuple: (start, end). If not macro, returns None
-def check_for_command_definition(command_type, parse_status, app_singleton):
-    re_command_start = None
-    re_command_end = None
-
-    match command_type :
-        case CommandDefinitionTypes.MACRO:
-            re_command_start = app_singleton.re_macro_definition
-            re_command_end = app_singleton.re_macro_end
-
-        case CommandDefinitionTypes.FUNCTION:
-            re_command_start = app_singleton.re_function_definition
-            re_command_end = app_singleton.re_function_end
-
-    if re_command_start.search(parse_status.lines[parse_status.current_index]) is None:
-        return None
-
-    temp = None        
-    index = parse_status.current_index
-    command_start_stack = [parse_status.current_index]
-    command_end_stack = []
-
-    #We break out of the loop programmatically
-    while len(command_start_stack) != len(command_end_stack):
-        index += 1 
-        temp = parse_status.lines[index]
-        if not re_command_end.search(temp) is None:
-            command_end_stack.append(index)
-            continue
-
-        if not re_command_start.search(temp) is None:
-            command_start_stack.append(index) 
-
-    final_command_end = command_end_stack[len(command_end_stack) - 1]
-    parse_status.current_index = final_command_end + 1
-    return (command_start_stack[0], final_command_end)
-
-
-def scan_for_macro_definition(parse_status, app_singleton):
-    start_end_tuple = check_for_command_definition(CommandDefinitionTypes.MACRO, parse_status, app_singleton)
-    if start_end_tuple is None:
-        return False
-    
+        parse_status.include_paths.append(temp.__str__())
+
+#The blocks the block index tracks, by the command that closes them.
+BLOCK_END_COMMANDS = {
+    "endmacro": "macro",
+    "endfunction": "function"
+}
+BLOCK_START_COMMANDS = frozenset(BLOCK_END_COMMANDS.values())
+
+#Finds the macro() and function() definitions of a descriptor in a single
+#forward pass with one stack of open blocks. The block index is the only
+#consumer of the lexer's invocations: iterating it hands the scanner every
+#invocation outside a block, and "get_range" reads ahead to the end of the
+#block opened by the invocation the scanner is on. Every invocation is seen
+#once, so nested definitions do not make the scan quadratic.
+class BlockIndex:
+    def __init__(self, invocations):
+        self.invocations = invocations
+        #(command name, start line) of every block that is still open:
+        self.open_blocks = []
+        #start line -> (start line, end line)
+        self.ranges = {}
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        invocation = next(self.invocations)
+        self.index_invocation(invocation)
+        return invocation
+
+    def index_invocation(self, invocation):
+        command_name = invocation.name.lower()
+        if command_name in BLOCK_START_COMMANDS:
+            self.open_blocks.append((command_name, invocation.start_line))
+            return
+
+        start_command_name = BLOCK_END_COMMANDS.get(command_name)
+        if start_command_name is None:
+            return
+
+        if len(self.open_blocks) == 0:
+            raise TestDescriptorFileParseError(
+                "{}() does not close any {}().".format(command_name, start_command_name),
+                line = invocation.start_line
+            )
+        open_command_name, start = self.open_blocks.pop()
+        if open_command_name != start_command_name:
+            raise TestDescriptorFileParseError(
+                "{}() cannot close the {}() opened on line {}.".format(command_name, open_command_name, start),
+                line = invocation.start_line
+            )
+        self.ranges[start] = (start, invocation.end_line)
+
+    #Returns tuple: (start, end) of the block opened on line "start".
+    def get_range(self, start):
+        while not start in self.ranges:
+            try:
+                next(self)
+            except StopIteration:
+                raise TestDescriptorFileParseError(
+                    "The block opened on line {} is never closed.".format(start),
+                    line = start
+                )
+        return self.ranges[start]
+
+
+#Macros and functions are defined similarly and are both looked up in the block index.
+def scan_for_command_definition(parse_status):
+    start_end_tuple = parse_status.block_index.get_range(parse_status.current_index)
+    parse_status.lines.retain(start_end_tuple[0], start_end_tuple[1])
     parse_status.command_definitions.append(start_end_tuple)
+    parse_status.current_index = start_end_tuple[1] + 1
     return True
 
+def scan_for_macro_definition(parse_status, app_singleton):
+    return scan_for_command_definition(parse_status)
 
 def scan_for_function_definition(parse_status, app_singleton):
-    start_end_tuple = check_for_command_definition(CommandDefinitionTypes.FUNCTION, parse_status, app_singleton)
-    if start_end_tuple is None:
-        return False
-    
-    parse_status.command_definitions.append(start_end_tuple)
-    return True
+    return scan_for_command_definition(parse_status)
 
-##Returns None if not a \"add_setup\" pseudo-macro
 def scan_for_add_setup_macro(parse_status, app_singleton):
-    index_temp1 = parse_status.current_index
-    #index_temp2 = -1
-    str_temp = None
-
-    str_temp = parse_status.lines[index_temp1]
-    if app_singleton.re_add_setup_macro.search(str_temp) is None:
-        return False
-
     if not parse_status.setup_macro is None:
         raise TestDescriptorFileParseError(
             "You cannot define more than one setup macro.",
-            line = index_temp1
+            line = parse_status.current_index
         )
 
-    index_temp1 = str_temp.index('(')
-    str_temp = (str_temp[index_temp1 + 1:-2]).strip()
-    str_temp = (str_temp.split()[1])
-    str_temp = strip_quotation_marks(str_temp)
-    parse_status.setup_macro = str_temp
-    parse_status.current_index += 1
-
+    parse_status.setup_macro = get_keyword_arguments(
+        parse_status,
+        ("MACRO_NAME",),
+        required_keywords = ("MACRO_NAME",)
+    )["MACRO_NAME"]
     return True
 
-##Accepts: tuple: lines, and ranges_to_cut
-##Returns None if not a \"add_teardown\" pseudo-macro
 def scan_for_add_teardown_macro(parse_status, app_singleton):
-    index_temp1 = parse_status.current_index
-    #index_temp2 = -1
-    str_temp = None
-
-    str_temp = parse_status.lines[index_temp1]
-    if app_singleton.re_add_teardown_macro.search(str_temp) is None:
-        return False
-
     if not parse_status.teardown_macro is None:
         raise TestDescriptorFileParseError(
             "You cannot define more than one teardown macro.",
-            line = index_temp1
+            line = parse_status.current_index
         )
 
-    index_temp1 = str_temp.index('(')
-    str_temp = (str_temp[index_temp1 + 1:-2]).strip()
-    str_temp = (str_temp.split()[1])
-    str_temp = strip_quotation_marks(str_temp)
-    parse_status.teardown_macro = str_temp
-    parse_status.current_index += 1
-
+    parse_status.teardown_macro = get_keyword_arguments(
+        parse_status,
+        ("MACRO_NAME",),
+        required_keywords = ("MACRO_NAME",)
+    )["MACRO_NAME"]
     return True
 
 
 def scan_for_add_test_macro(parse_status, app_singleton):
-    TOTAL_POSSIBLE_ARGUMENTS = 4
     macro_name = None
     test_group = None
-    index_temp = None
-    arr_temp = None
-    str_temp = parse_status.lines[parse_status.current_index]
-    str_temp.strip()
-
-    if app_singleton.re_add_test_macro.search(str_temp) is None:
-        return False 
-    index_temp = str_temp.index('(')
-    str_temp = (str_temp[index_temp + 1: -(len(str_temp) - str_temp.index(')'))]).strip()
-    arr_temp = str_temp.split()
-
-    macro_name = arr_temp[1]
-    macro_name = strip_quotation_marks(macro_name)
-    if len(arr_temp) < TOTAL_POSSIBLE_ARGUMENTS:
-        test_group = macro_name
-    else:
-        test_group = arr_temp[3]
+    keyword_arguments = get_keyword_arguments(
+        parse_status,
+        ("MACRO_NAME", "TEST_GROUP"),
+        required_keywords = ("MACRO_NAME",)
+    )
+
+    macro_name = keyword_arguments["MACRO_NAME"]
+    test_group = keyword_arguments.get("TEST_GROUP", macro_name)
 
     if not test_group in parse_status.test_groups:
         parse_status.test_groups[test_group] = {}
@@ -301,110 +354,248 @@ def scan_for_add_test_macro(parse_status, app_singleton):
         )
 
     parse_status.test_groups[test_group][macro_name] = True
-    parse_status.current_index += 1
     return True
 
-#Accepts: tuple: lines, and ranges_to_cut
-#def scan_lines_for_macro_match(lines, app_singleton):
-#    raise NotImplemented()
-
-#We need to move variable expansion time to here:
-def parse_file(app_singleton):
-    #Shoud these checks pass, they advance "parse_status.current_index"
-    #by point to the line after that indicating the end of the
-    #structures they are looking for.
-    checks = [
-        scan_for_include,
-        scan_for_macro_definition,
-        scan_for_function_definition,
-        scan_for_add_setup_macro,
-        scan_for_add_teardown_macro,
-        scan_for_add_test_macro
-    ]
-    temp_str = None
-    checks_index = 0
-    check_passed = False
-    parse_status = ParseStatus()
+#Returns the DescriptorCommand a line starts, or None if it does not start
+#one. This takes a single regex match and a dictionary lookup, however many
+#commands the scanner knows about. The scanner itself works on lexed
+#invocations; see "classify_invocation".
+def classify_line(line, app_singleton):
+    match = app_singleton.re_command_invocation.match(line)
+    if match is None:
+        return None
+    return DESCRIPTOR_COMMANDS_BY_NAME.get(match.group(1))
+
+#CMake command names are case insensitive.
+def classify_invocation(invocation):
+    return DESCRIPTOR_COMMANDS_BY_NAME.get(invocation.name.lower())
+
+#Maps each DescriptorCommand to the scan_for_* function that handles it.
+#The handlers read the invocation in "parse_status.current_invocation".
+SCAN_FUNCTIONS = {
+    DescriptorCommand.INCLUDE: scan_for_include,
+    DescriptorCommand.MACRO: scan_for_macro_definition,
+    DescriptorCommand.FUNCTION: scan_for_function_definition,
+    DescriptorCommand.ADD_SETUP_MACRO: scan_for_add_setup_macro,
+    DescriptorCommand.ADD_TEARDOWN_MACRO: scan_for_add_teardown_macro,
+    DescriptorCommand.ADD_TEST_MACRO: scan_for_add_test_macro
+}
+
+#Reads the descriptor of "app_singleton.context" line by line, lexes it into
+#command invocations and scans those in a single pass. Lines are released as
+#soon as the scanner is past them, unless they belong to a command definition.
+def scan_descriptor(parse_status, app_singleton):
+    #"parse_status.current_index" is the first line of the invocation being
+    #scanned. Command definitions advance it past their end.
+    command = None
+    profile = generation_profile.get_active_profile()
     try:
-        with open(app_singleton.context.list_file.__str__(), 'r') as file:
-            parse_status.lines = file.readlines()
+        with open(app_singleton.context.list_file.__str__(), 'r') as file, generation_profile.phase(generation_profile.SCAN):
+            parse_status.lines = descriptor_reader.DescriptorLineReader(generation_profile.wrap_reader(file))
+            parse_status.block_index = BlockIndex(cmake_lexer.iter_invocations(parse_status.lines))
+            for invocation in parse_status.block_index:
+                parse_status.current_invocation = invocation
+                parse_status.current_index = invocation.start_line
+                command = classify_invocation(invocation)
+                if command is not None and profile is None:
+                    SCAN_FUNCTIONS[command](parse_status, app_singleton)
+                elif command is not None:
+                    profile.call_handler(SCAN_FUNCTIONS[command], parse_status, app_singleton)
+                parse_status.current_index = max(parse_status.current_index, invocation.end_line + 1)
+                parse_status.lines.release_before(parse_status.current_index)
+            parse_status.current_invocation = None
     except FileNotFoundError:
         print("Test descriptor file \"{}\" does not exist.".format(app_singleton.context.list_file.__str__()), file=sys.stderr)
         return None
-    
-    for i in range(0,len(parse_status.lines)):
-        temp_str = parse_status.lines[i]
-        parse_status.lines[i] = app_singleton.context.resolve_vars(temp_str, no_fail = True)
-
-    while parse_status.current_index < len(parse_status.lines):
-        checks_index = 0
-        check_passed = False
-        while checks_index < len(checks):
-            check_passed = checks[checks_index](parse_status, app_singleton)
-            if check_passed:
-                break;
-            checks_index += 1
-        if not check_passed:
-            parse_status.current_index += 1 
+    except cmake_lexer.CMakeLexError as e:
+        raise TestDescriptorFileParseError(e.__str__(), line = e.line)
     return parse_status
 
-def generate_file_contents(parse_status):
-    preamble = """
+#Scans a descriptor without expanding any variables, so that the result can be
+#rendered for any number of contexts with "render_descriptor_template".
+#Only the list file of "app_singleton.context" is used.
+def parse_descriptor_template(app_singleton):
+    parse_status = ParseStatus()
+    parse_status.is_template = True
+    parse_status.input_filepath = app_singleton.context.list_file
+    return scan_descriptor(parse_status, app_singleton)
+
+#Variables are only expanded where the generated file uses them: in the
+#include paths, the setup, teardown and test names, and the command
+#definitions that get copied into the output. Everything else is scanned
+#as written.
+def parse_file(app_singleton):
+    template = parse_descriptor_template(app_singleton)
+    if template is None:
+        return None
+    return render_descriptor_template(template, app_singleton)
+
+#Fills the holes a template left for the variable expansions using the
+#context of "app_singleton". Returns a ParseStatus like "parse_file" would.
+def render_descriptor_template(template, app_singleton):
+    context = app_singleton.context
+    resolve_vars = generation_profile.wrap_resolve_vars(context.resolve_vars)
+    test_group = None
+    parse_status = ParseStatus()
+    parse_status.input_filepath = context.list_file
+    parse_status.current_index = template.current_index
+    parse_status.command_definitions = list(template.command_definitions)
+    parse_status.lines = template.lines.copy_retained(
+        transform = lambda line: resolve_vars(line, no_fail = True)
+    )
+
+    for index, include_arg in template.include_args:
+        parse_status.include_args.append((index, include_arg))
+        add_include(parse_status, index, resolve_vars(include_arg, no_fail = True))
+
+    if template.setup_macro is not None:
+        parse_status.setup_macro = resolve_vars(template.setup_macro, no_fail = True)
+    if template.teardown_macro is not None:
+        parse_status.teardown_macro = resolve_vars(template.teardown_macro, no_fail = True)
+
+    for group_name, tests in template.test_groups.items():
+        test_group = parse_status.test_groups.setdefault(
+            resolve_vars(group_name, no_fail = True),
+            {}
+        )
+        for macro_name in tests.keys():
+            macro_name = resolve_vars(macro_name, no_fail = True)
+            #Names that differ before expansion can still collide after it.
+            if macro_name in test_group:
+                raise TestDescriptorFileParseError(
+                    "You cannot add the same test to the same test group more than once."
+                )
+            test_group[macro_name] = True
+    return parse_status
+
+#Yields the generated file section by section, so that it can be streamed
+#to disk without being held in memory as a whole.
+#"instrument" reports how long every setup, test and teardown call takes;
+#see "instrumentation".
+def iter_file_contents(parse_status, instrument = False):
+    yield GENERATED_FILE_PREAMBLE
+    yield from iter_includes(parse_status)
+    yield from iter_command_definitions(parse_status)
+    yield from iter_tests(parse_status, instrument = instrument)
+
+GENERATED_FILE_PREAMBLE = """
 #*******************************************************
 # This is a generated file that is usually destroyed
 # after it is used. Any changes to this file will be
 # discarded. Instead, make your changes to the descriptor
 # file used to generate this file.
 #*******************************************************\n"""
-    indices_to_ignore=[]
-    str_buffer = [preamble]
 
-    #Add includes:
-    str_buffer.append(
-"""#*****************
+def iter_includes(parse_status):
+    yield """#*****************
 # Includes:
-#*****************\n""")
+#*****************\n"""
     for elem in parse_status.includes:
-        str_buffer.append("".join(["include(\"", elem[1], "\")\n"]))
-        indices_to_ignore.append(elem[0])
-    str_buffer.append("\n")
-
-    #Add command definitions:
-    str_buffer.append(
-"""#************************
+        yield "".join(["include(\"", elem[1], "\")\n"])
+    yield "\n"
+
+#"namespace", if given, is the descriptor_bundle.CommandNamespace the
+#definitions are renamed with.
+def iter_command_definitions(parse_status, namespace = None):
+    lines = None
+    yield """#************************
 # Command Definitions:
-#************************\n""")
+#************************\n"""
     for elem in parse_status.command_definitions:
-        #Hello:
-        for index in range(elem[0], elem[1] + 1):
-            str_buffer.append(parse_status.lines[index])
-            indices_to_ignore.append(index)
-        str_buffer.append("\n")
-
-    #Add everything that is not a test definition:
-    str_buffer.append(
-"""#************************
+        lines = [parse_status.lines[index] for index in range(elem[0], elem[1] + 1)]
+        if namespace is not None:
+            lines = namespace.rename_lines(lines)
+        yield from lines
+        yield "\n"
+
+#"test_groups", if given, limits the output to those groups.
+def iter_tests(parse_status, namespace = None, test_groups = None, instrument = False):
+    get_name = namespace.get_name if namespace is not None else lambda name: name
+    yield """#************************
 # Tests: 
-#************************\n""")
+#************************\n"""
     for test_group in parse_status.test_groups.keys():
-        str_buffer.append(
-"""#*
+        if test_groups is not None and not test_group in test_groups:
+            continue
+        yield """#*
 #* Test Group: {}
 #*
 #*************************\n""".format(test_group)
-)
+        if instrument:
+            yield from iter_timed_test_group(parse_status, test_group, get_name)
+            continue
+
         #Hello:
         if(parse_status.setup_macro is not None):
-            str_buffer.append("{}()\n".format(parse_status.setup_macro))
+            yield "{}()\n".format(get_name(parse_status.setup_macro))
         for test in parse_status.test_groups[test_group].keys():
-            str_buffer.append("{}()\n".format(test))
+            yield "{}()\n".format(get_name(test))
 
         if(parse_status.teardown_macro is not None):
-            str_buffer.append("{}()".format(parse_status.teardown_macro))
-        str_buffer.append("\n\n")
-    return str_buffer
+            yield "{}()".format(get_name(parse_status.teardown_macro))
+        yield "\n\n"
+
+def iter_timed_test_group(parse_status, test_group, get_name):
+    import instrumentation
+    if parse_status.setup_macro is not None:
+        yield instrumentation.get_timed_call(
+            instrumentation.SETUP,
+            test_group,
+            get_name(parse_status.setup_macro),
+            name = parse_status.setup_macro
+        )
+    for test in parse_status.test_groups[test_group].keys():
+        yield instrumentation.get_timed_call(instrumentation.TEST, test_group, get_name(test), name = test)
+    if parse_status.teardown_macro is not None:
+        yield instrumentation.get_timed_call(
+            instrumentation.TEARDOWN,
+            test_group,
+            get_name(parse_status.teardown_macro),
+            name = parse_status.teardown_macro
+        )
+    yield "\n"
+
+#A file that runs "test_group" on its own: the includes and command
+#definitions every group shares, then the group's setup, tests and teardown.
+def iter_group_file_contents(parse_status, test_group, instrument = False):
+    yield GENERATED_FILE_PREAMBLE
+    yield from iter_includes(parse_status)
+    yield from iter_command_definitions(parse_status)
+    yield from iter_tests(parse_status, test_groups = (test_group,), instrument = instrument)
+
+#Yields a bundle of the parsed descriptors in "parse_statuses", in order. Each
+#gets its own section, with its commands renamed so that they cannot collide
+#with another descriptor's, between a BEGIN and a PASS marker.
+def iter_bundle_contents(parse_statuses, instrument = False):
+    import descriptor_bundle
+    namespace = None
+    yield GENERATED_FILE_PREAMBLE
+    for index, parse_status in enumerate(parse_statuses):
+        namespace = descriptor_bundle.CommandNamespace.from_definitions(
+            descriptor_bundle.get_command_prefix(index),
+            [
+                [parse_status.lines[line_index] for line_index in range(elem[0], elem[1] + 1)]
+                for elem in parse_status.command_definitions
+            ]
+        )
+        yield """
+#*******************************************************
+# Descriptor: {}
+#*******************************************************\n""".format(parse_status.input_filepath)
+        yield descriptor_bundle.get_marker_command(descriptor_bundle.BEGIN_MARKER, parse_status.input_filepath)
+        yield from iter_includes(parse_status)
+        yield from iter_command_definitions(parse_status, namespace)
+        yield from iter_tests(parse_status, namespace, instrument = instrument)
+        yield descriptor_bundle.get_marker_command(descriptor_bundle.PASS_MARKER, parse_status.input_filepath)
 
-def run_cmake_as_linter(filename, working_dir):
+def generate_file_contents(parse_status):
+    return list(iter_file_contents(parse_status))
+
+#Returns tuple: (passed, messages). "messages" explains a failure and is
+#empty otherwise. Nothing is printed, so it is safe to call from several
+#threads at once.
+def lint_cmake_file(filename, working_dir):
+    import subprocess
     try:
         cmake_process = subprocess.run(
             ["cmake", "-P", filename],
@@ -414,41 +605,74 @@ def run_cmake_as_linter(filename, working_dir):
         )
 
         if cmake_process.returncode != 0:
-            print("CMake lint failed. Input is not a valid CMake file.", file=sys.stderr)
-            print(f"CMake stdout: {cmake_process.stdout}", file=sys.stderr)
-            print(f"CMake stderr: {cmake_process.stderr}", file=sys.stderr)
-            return False
+            return False, [
+                "CMake lint failed. Input is not a valid CMake file.",
+                f"CMake stdout: {cmake_process.stdout}",
+                f"CMake stderr: {cmake_process.stderr}"
+            ]
     except Exception as e:
-        print("Failed to run CMake as linter", file=sys.stderr)
-        print(e, file=sys.stderr)
-        return False
-    return True
-
-def parse_args_into_context(args):
-    context = None
-    build_dir = None
-    source_dir = None
-    proj_source_dir = None
+        return False, ["Failed to run CMake as linter", str(e)]
+    return True, []
 
+def run_cmake_as_linter(filename, working_dir):
+    passed, messages = lint_cmake_file(filename, working_dir)
+    for message in messages:
+        print(message, file=sys.stderr)
+    return passed
+
+def lint_descriptor(list_file):
+    list_file = pathlib.Path(os.path.abspath(list_file))
+    return lint_cmake_file(list_file.__str__(), list_file.parent.__str__())
+
+#Lints every descriptor under "root", printing each verdict as soon as it is known.
+#Runs from argument validation, but is profiled as linting.
+def run_lint_sweep(root, jobs, exclude_dirs = ()):
+    if not pathlib.Path(root).is_dir():
+        print_err("\"{}\" is not a directory.".format(root))
+        return 1
+
+    with generation_profile.phase(generation_profile.LINT):
+        return run_lint_sweep_unprofiled(root, jobs, exclude_dirs)
+
+def run_lint_sweep_unprofiled(root, jobs, exclude_dirs = ()):
+    import lint_sweep
+    descriptors = lint_sweep.find_descriptors(root, exclude_dirs = exclude_dirs)
+    if len(descriptors) == 0:
+        print("No test descriptor files found under \"{}\".".format(root))
+        return 0
+
+    def report(descriptor, result):
+        passed, messages = result
+        if passed:
+            print("PASS: {}".format(descriptor), flush = True)
+        else:
+            print("FAIL: {}".format(descriptor), flush = True)
+            for message in messages:
+                print_err("    {}".format(message))
+
+    results = lint_sweep.sweep(descriptors, lint_descriptor, jobs, on_result = report)
+    failures = [descriptor for descriptor, (passed, _) in results if not passed]
+    print("{} of {} test descriptor files passed lint.".format(len(results) - len(failures), len(results)))
+    return 0 if len(failures) == 0 else 1
+
+def build_arg_parser():
     parser = argparse.ArgumentParser(
         prog = 'generate-test-file.py',
-        description = 'Takes in a test descriptor file and generates a CMake unit test file.',
-        usage='%(prog)s [options]'
+        description = 'Takes in one or more test descriptor files and generates a CMake unit test file for each.',
+        usage='%(prog)s [options] list_file [list_file ...]'
     )
     parser.add_argument(
         '-b',
         '--build_dir',
         type=str,
-        help='CMake build directory.',
-        required = True
+        help='CMake build directory. Required unless "--serve" or "--context" is given.'
     )
 
     parser.add_argument(
         '-c',
         '--source_dir',
         type=str,
-        help = "CMake source directory.",
-        required = True
+        help = 'CMake source directory. Required unless "--serve" or "--context" is given.'
     )
 
     parser.add_argument(
@@ -458,27 +682,173 @@ def parse_args_into_context(args):
         help = 'Project source directory.'
     )
 
+    parser.add_argument(
+        '--context',
+        action='append',
+        nargs=4,
+        metavar=('NAME', 'BUILD_DIR', 'SOURCE_DIR', 'PROJECT_SOURCE_DIR'),
+        help = """Build configuration to generate for. May be repeated. Each descriptor
+is parsed once and a test file is generated for every configuration, in
+"tests/NAME/". Replaces "-b", "-c" and "-p"."""
+    )
+
+    parser.add_argument(
+        '--bundle',
+        type=str,
+        metavar='NAME',
+        help = """Generate a single file, "tests/NAME", that runs the tests of every
+descriptor in order in one "cmake -P". The commands each descriptor defines
+are renamed so that they cannot collide, and a BEGIN and a PASS marker are
+printed around each descriptor's tests."""
+    )
+
+    parser.add_argument(
+        '--split-groups',
+        action='store_true',
+        help = """Write each test group to a file of its own, with the includes and
+command definitions it needs, so that the groups can run in parallel. The
+files of "tests/NAME" go to "tests/NAME.groups/", and "index.txt" there
+lists them."""
+    )
+
+    parser.add_argument(
+        '--instrument',
+        action='store_true',
+        help = """Time every setup, test and teardown call in the generated files and
+print a "CMAKE-TEST TIMING" line for each. Needs CMake 3.23 or newer to run."""
+    )
+
+    parser.add_argument(
+        '--depfile',
+        type=str,
+        metavar='PATH',
+        help = """Write a Make/Ninja depfile to PATH that lists, for the generated
+files, the descriptors, the files they include and "cmake-test.cmake", for
+use with "add_custom_command(... DEPFILE PATH)"."""
+    )
+
+    parser.add_argument(
+        '--stamp',
+        type=str,
+        metavar='PATH',
+        help = """With "--depfile", touch PATH after every successful run and list it as
+the depfile's first target, for use as the custom command's OUTPUT. Generated
+files that did not change keep their mtime, so without a stamp Make reruns
+generation until an input changes what it writes."""
+    )
+
+    parser.add_argument(
+        '--profile',
+        type=str,
+        metavar='REPORT_PATH',
+        help = """Write a JSON report of where the time went to REPORT_PATH: the wall
+time of argument validation, linting, reading the descriptor, variable
+expansion, scanning and writing the output, the time spent in each
+"scan_for_*" handler, and the slowest variable expansions. Runs a single job
+at a time."""
+    )
+
+    parser.add_argument(
+        '--profile-cprofile',
+        action='store_true',
+        help = 'Add the functions cProfile finds most expensive to the "--profile" report.'
+    )
+
+    parser.add_argument(
+        '--profile-memory',
+        action='store_true',
+        help = 'Add the peak memory use tracemalloc measures to the "--profile" report.'
+    )
+
+    parser.add_argument(
+        '-l',
+        '--descriptor_list',
+        type=str,
+        help = """File listing test descriptor files, one per line. Blank lines
+and lines starting with \"#\" are ignored. Relative paths are taken relative
+to the directory of the listing file."""
+    )
+
+    parser.add_argument(
+        '-j',
+        '--jobs',
+        type=int,
+        help = """Number of worker processes used to generate the test files (default: 1),
+or of concurrent lints with "--lint-only" (default: number of CPUs)."""
+    )
+
+    parser.add_argument(
+        '-f',
+        '--force',
+        action='store_true',
+        help = 'Regenerate test files even if none of their inputs have changed.'
+    )
+
+    parser.add_argument(
+        '--no-lint-cache',
+        action='store_true',
+        help = 'Always run CMake to lint the descriptors instead of reusing cached verdicts.'
+    )
+
+    parser.add_argument(
+        '--lint-only',
+        type=str,
+        metavar='ROOT',
+        help = 'Only lint every test descriptor file found under ROOT. Nothing is generated.'
+    )
+
+    parser.add_argument(
+        '--serve',
+        type=str,
+        metavar='SOCKET_PATH',
+        help = """Run as a daemon that serves generate requests on the given Unix
+domain socket. See "generate-test-file-client.py"."""
+    )
+
     parser.add_argument(
         'list_file',
         type=str,
-        nargs=1,
+        nargs='*',
         help = 'Test descriptor file',
     )
+    return parser
 
-    parse_results = parser.parse_args(args)
-    list_file = parse_results.list_file[0]
-    build_dir = parse_results.build_dir
+def read_descriptor_list(filepath):
+    retval = []
+    str_temp = None
+    list_dir = pathlib.Path(filepath).parent
+
+    with open(filepath, 'r') as file:
+        for line in file:
+            str_temp = line.strip()
+            if str_temp == '' or str_temp.startswith('#'):
+                continue
+            retval.append((list_dir / str_temp).__str__())
+    return retval
+
+def collect_list_files(parse_results):
+    retval = list(parse_results.list_file)
+    if parse_results.descriptor_list is not None:
+        try:
+            retval.extend(read_descriptor_list(parse_results.descriptor_list))
+        except OSError as e:
+            print_err("Unable to read descriptor list \"{}\": {}".format(parse_results.descriptor_list, e))
+            return 1, None
+
+    if len(retval) == 0:
+        print_err("No test descriptor files were specified.")
+        return 1, None
+    return 0, retval
+
+def create_context(list_file, build_dir, source_dir, proj_source_dir):
     if build_dir is None or build_dir == '':
         print_err("\"-b/--build_dir\" cannot be the empty string.")
         return 1, None
 
-    source_dir = parse_results.source_dir
     if source_dir is None or source_dir == '':
         print_err("\"-c/--source_dir\" cannot be the empty string.")
         return 1, None
-    source_dir = parse_results.source_dir
 
-    proj_source_dir = parse_results.project_source_dir
     if proj_source_dir is None or proj_source_dir == '':
         proj_source_dir = source_dir
 
@@ -519,48 +889,700 @@ def parse_args_into_context(args):
     if not context.list_file.is_file():
         print_err("\"list_file\" is not a file.")
         return 1, None
-    
-    if not run_cmake_as_linter(list_file, context.current_list_dir.__str__() ):
+
+    return 0, context
+
+#Kept for callers that only deal with a single descriptor.
+#Only the first descriptor on the command line is used.
+def parse_args_into_context(args):
+    errcode = None
+    context = None
+    list_files = None
+
+    parse_results = build_arg_parser().parse_args(args)
+    errcode, list_files = collect_list_files(parse_results)
+    if errcode != 0:
+        return 1, None
+
+    errcode, context = create_context(
+        list_files[0],
+        parse_results.build_dir,
+        parse_results.source_dir,
+        parse_results.project_source_dir
+    )
+    if errcode != 0:
+        return 1, None
+
+    if not run_cmake_as_linter(list_files[0], context.current_list_dir.__str__() ):
         print_err("Input file is not a valid CMake file")
         return 1, None
 
     return 0, context
 
+def prepare_test_directory(test_directory):
+    if test_directory.exists():
+        if not test_directory.is_dir():
+            print(
+                "There exists something at path \"tests\", but it is not a directory",
+                file=sys.stderr
+            )
+            return 1
+        if not os.access(test_directory, os.W_OK):
+            print(
+                "While the \"tests\" directory exists, You do not have write access to it."
+            )
+            return 1
+    else:
+        test_directory.mkdir(exist_ok = True)
+    return 0
+
+#Returns tuple: (errcode, cache, lint_key). "cache" is None when
+#"use_lint_cache" is False; otherwise the caller stores the verdict once it
+#knows which files the descriptor includes.
+def lint_list_file(context, test_directory, use_lint_cache = True):
+    with generation_profile.phase(generation_profile.LINT):
+        return lint_list_file_unprofiled(context, test_directory, use_lint_cache)
+
+def lint_list_file_unprofiled(context, test_directory, use_lint_cache = True):
+    cache = None
+    lint_key = None
+    if use_lint_cache:
+        cache = lint_cache.LintCache(lint_cache.get_default_cache_dir(test_directory))
+        lint_key = cache.compute_key(
+            context.list_file,
+            context.current_list_dir,
+            framework_files = [CMAKE_TEST_FILE_PATH]
+        )
+
+    if cache is None or not cache.lookup(lint_key):
+        #CMake runs from the descriptor's directory, so a relative path would not resolve.
+        if not run_cmake_as_linter(os.path.abspath(context.list_file), context.current_list_dir.__str__()):
+            print_err("Input file is not a valid CMake file")
+            return 1, None, None
+    return 0, cache, lint_key
+
+#
+# With "--split-groups", the test groups of "tests/NAME" are written to one
+# file each in "tests/NAME.groups/", and "index.txt" in that directory lists
+# the group files in order, one per line, relative to the directory. The
+# index is what the manifest tracks.
+#
+TEST_GROUPS_DIR_SUFFIX = ".groups"
+TEST_GROUP_INDEX_NAME = "index.txt"
+RE_UNSAFE_FILENAME_CHARS = re.compile(R"[^A-Za-z0-9_.-]+")
+
+def get_test_groups_directory(test_file):
+    return test_file.with_name(test_file.name + TEST_GROUPS_DIR_SUFFIX)
+
+def get_test_group_index_path(test_file):
+    return get_test_groups_directory(test_file) / TEST_GROUP_INDEX_NAME
+
+#Group names can hold any character, so the file name only borrows the safe
+#ones. The position of the group keeps the names unique.
+def get_test_group_file_name(index, test_group):
+    return "{:03d}-{}.cmake".format(index, RE_UNSAFE_FILENAME_CHARS.sub("_", test_group)[:64])
+
+#Returns the path of the index file.
+def write_test_group_files(parse_status, groups_directory, instrument = False):
+    file_names = []
+    groups_directory.mkdir(parents = True, exist_ok = True)
+    for index, test_group in enumerate(parse_status.test_groups.keys()):
+        file_names.append(get_test_group_file_name(index, test_group))
+        output_writer.write_if_changed(
+            groups_directory / file_names[-1],
+            iter_group_file_contents(parse_status, test_group, instrument = instrument)
+        )
+
+    #Files of groups the descriptor no longer has:
+    for path in groups_directory.glob("*.cmake"):
+        if not path.name in file_names:
+            path.unlink(missing_ok = True)
+
+    index_path = groups_directory / TEST_GROUP_INDEX_NAME
+    output_writer.write_if_changed(
+        index_path,
+        ["#Test groups of \"{}\", one file per group.\n".format(parse_status.input_filepath)] +
+        ["{}\n".format(file_name) for file_name in file_names]
+    )
+    return index_path
+
+#Returns the files listed in the test group index "index_path", in order.
+def read_test_group_index(index_path):
+    return read_descriptor_list(index_path)
+
+#The test file keeps its mtime when its contents do not change.
+#With "split_groups", "test_file" is the name the groups are written under;
+#see "write_test_group_files".
+def write_test_file(
+    parse_status,
+    context,
+    test_file,
+    manifest_path,
+    generator_digest,
+    split_groups = False,
+    instrument = False
+):
+    output_path = test_file
+    with generation_profile.phase(generation_profile.OUTPUT_WRITE):
+        if split_groups:
+            output_path = write_test_group_files(parse_status, get_test_groups_directory(test_file), instrument = instrument)
+        else:
+            output_writer.write_if_changed(test_file, iter_file_contents(parse_status, instrument = instrument))
+
+        generation_manifest.write_manifest(
+            manifest_path,
+            generation_manifest.build_manifest(
+                context,
+                parse_status.include_paths,
+                output_path,
+                options = get_output_options(instrument),
+                generator_digest = generator_digest
+            )
+        )
+
+#The options that change the contents of a generated file without changing
+#where it goes. The manifest records them, so that toggling one regenerates.
+def get_output_options(instrument = False):
+    return {"instrument": instrument}
+
+#The files a change to which may change the generated files: the archive when
+#run from one, otherwise every module next to the script and in its packages,
+#whether this run imports it or not.
+def get_generator_sources():
+    retval = None
+
+    if SCRIPT_PATH.suffix != ".py":
+        return [SCRIPT_PATH]
+
+    retval = list(SCRIPT_PATH.parent.glob("*.py"))
+    for package in GENERATOR_PACKAGES:
+        retval.extend((SCRIPT_PATH.parent / package).rglob("*.py"))
+    return sorted(retval)
+
+#The digest of "get_generator_sources" that manifests record. It is computed
+#once per process, so that checking many descriptors hashes the sources once.
+def get_generator_digest():
+    global GENERATOR_DIGEST
+    if GENERATOR_DIGEST is None:
+        GENERATOR_DIGEST = generation_manifest.hash_files(get_generator_sources())
+    return GENERATOR_DIGEST
+
+#The file the manifest of "test_file" tracks.
+def get_tracked_output_path(test_file, split_groups = False):
+    if split_groups:
+        return get_test_group_index_path(test_file)
+    return test_file
+
+#Unless "force" is set, generation is skipped when the manifest shows that
+#none of the inputs of the existing test file have changed.
+#Lint verdicts are cached unless "use_lint_cache" is False.
+#"split_groups" writes one file per test group; see "write_test_group_files".
+#"instrument" adds timing output; see "instrumentation".
+def generate_test_file(
+    context,
+    test_directory,
+    force = False,
+    use_lint_cache = True,
+    split_groups = False,
+    instrument = False
+):
+    errcode = None
+    cache = None
+    lint_key = None
+    test_file = test_directory / context.list_file.name
+    output_path = get_tracked_output_path(test_file, split_groups)
+    manifest_path = generation_manifest.get_manifest_path(output_path)
+    generator_digest = get_generator_digest()
+
+    if not force and generation_manifest.is_up_to_date(
+        manifest_path,
+        context,
+        output_path,
+        options = get_output_options(instrument),
+        generator_digest = generator_digest
+    ):
+        return 0
+
+    errcode, cache, lint_key = lint_list_file(context, test_directory, use_lint_cache)
+    if errcode != 0:
+        return 1
+
+    app_singleton = ApplicationSingleton(context)
+    parse_status = parse_file(app_singleton)
+
+    if parse_status is None:
+        print("An error occurred while parsing file \"{}\".".format(context.list_file), file=sys.stderr)
+        return 1
+
+    if cache is not None:
+        cache.store(lint_key, parse_status.include_paths)
+
+    write_test_file(parse_status, context, test_file, manifest_path, generator_digest, split_groups, instrument)
+    return 0
+
+#Generates one test file per build configuration from a single parse of the
+#descriptor. "configurations" is a list of (name, context) tuples, all for the
+#same list file, and each test file is written to "<test_directory>/<name>/".
+#The descriptor is linted and scanned once; only the variable expansions are
+#redone for every configuration.
+def generate_test_file_matrix(
+    configurations,
+    test_directory,
+    force = False,
+    use_lint_cache = True,
+    split_groups = False,
+    instrument = False
+):
+    errcode = None
+    cache = None
+    lint_key = None
+    template = None
+    parse_status = None
+    pending = []
+    include_paths = {}
+    generator_digest = get_generator_digest()
+
+    for name, context in configurations:
+        test_file = test_directory / name / context.list_file.name
+        manifest_path = generation_manifest.get_manifest_path(get_tracked_output_path(test_file, split_groups))
+        if not force and generation_manifest.is_up_to_date(
+            manifest_path,
+            context,
+            get_tracked_output_path(test_file, split_groups),
+            options = get_output_options(instrument),
+            generator_digest = generator_digest
+        ):
+            continue
+        pending.append((context, test_file, manifest_path))
+
+    if len(pending) == 0:
+        return 0
+
+    errcode, cache, lint_key = lint_list_file(pending[0][0], test_directory, use_lint_cache)
+    if errcode != 0:
+        return 1
+
+    template = parse_descriptor_template(ApplicationSingleton(pending[0][0]))
+    if template is None:
+        print("An error occurred while parsing file \"{}\".".format(pending[0][0].list_file), file=sys.stderr)
+        return 1
+
+    for context, test_file, manifest_path in pending:
+        parse_status = render_descriptor_template(template, ApplicationSingleton(context))
+        include_paths.update(dict.fromkeys(parse_status.include_paths))
+        if prepare_test_directory(test_file.parent) != 0:
+            return 1
+        write_test_file(parse_status, context, test_file, manifest_path, generator_digest, split_groups, instrument)
+
+    #The lint verdict does not depend on the configuration, but includes such
+    #as "${CMAKE_BUILD_DIR}/config.cmake" do. A change to any of them has to
+    #invalidate the verdict.
+    if cache is not None:
+        cache.store(lint_key, list(include_paths.keys()))
+    return 0
+
+#Lints and parses one member of a bundle.
+#Returns tuple: (errcode, parse_status).
+def prepare_bundle_member(context, test_directory, use_lint_cache = True):
+    errcode = None
+    cache = None
+    lint_key = None
+    parse_status = None
+    try:
+        errcode, cache, lint_key = lint_list_file(context, test_directory, use_lint_cache)
+        if errcode != 0:
+            return 1, None
+
+        parse_status = parse_file(ApplicationSingleton(context))
+        if parse_status is None:
+            print_err("An error occurred while parsing file \"{}\".".format(context.list_file))
+            return 1, None
+    except Exception as e:
+        print_err("Failed to parse \"{}\": {}".format(context.list_file, e))
+        return 1, None
+
+    if cache is not None:
+        cache.store(lint_key, parse_status.include_paths)
+    return 0, parse_status
+
+#Generates a single file, "bundle_file", that runs the tests of every context
+#in "contexts" in order, so that the whole suite needs one "cmake -P". Up to
+#"jobs" descriptors are linted at once. Nothing is written unless every
+#descriptor lints and parses.
+#"depfile_path", if given, receives a depfile for the bundle, with
+#"stamp_path" as its first target; see "depfile".
+def generate_test_bundle(
+    contexts,
+    bundle_file,
+    jobs = 1,
+    use_lint_cache = True,
+    instrument = False,
+    depfile_path = None,
+    stamp_path = None
+):
+    import depfile
+    import lint_sweep
+    parse_statuses = {}
+    failures = []
+
+    results = lint_sweep.sweep(
+        contexts,
+        lambda context: prepare_bundle_member(context, bundle_file.parent, use_lint_cache),
+        jobs
+    )
+    for context, (errcode, parse_status) in results:
+        if errcode != 0:
+            failures.append(context.list_file)
+        parse_statuses[id(context)] = parse_status
+
+    if len(failures) > 0:
+        print_err("Failed to bundle {} of {} test descriptor files:".format(len(failures), len(contexts)))
+        for list_file in failures:
+            print_err("    {}".format(list_file))
+        return 1
+
+    with generation_profile.phase(generation_profile.OUTPUT_WRITE):
+        output_writer.write_if_changed(
+            bundle_file,
+            iter_bundle_contents([parse_statuses[id(context)] for context in contexts], instrument = instrument)
+        )
+
+    if depfile_path is not None:
+        depfile.write_depfile(
+            depfile_path,
+            [os.path.abspath(bundle_file)],
+            [
+                path for context in contexts for path in
+                [os.path.abspath(context.list_file)] + parse_statuses[id(context)].include_paths
+            ] + [CMAKE_TEST_FILE_PATH.__str__()],
+            stamp_path = stamp_path
+        )
+    return 0
+
+def run_bundle_generation(list_files, parse_results, test_directory):
+    errcode = None
+    context = None
+    contexts = []
+    for list_file in list_files:
+        errcode, context = create_context(
+            list_file,
+            parse_results.build_dir,
+            parse_results.source_dir,
+            parse_results.project_source_dir
+        )
+        if errcode != 0:
+            print_err("Cannot bundle \"{}\".".format(list_file))
+            return 1
+        contexts.append(context)
+
+    return generate_test_bundle(
+        contexts,
+        test_directory / parse_results.bundle,
+        jobs = parse_results.jobs if parse_results.jobs is not None else 1,
+        use_lint_cache = not parse_results.no_lint_cache,
+        instrument = parse_results.instrument,
+        depfile_path = parse_results.depfile,
+        stamp_path = parse_results.stamp
+    )
+
+#Returns the files "list_file" was generated from, as the manifest at
+#"manifest_path" records them: the descriptor and the files it includes.
+#Returns None if there is no manifest for "list_file".
+def get_recorded_dependencies(list_file, manifest_path):
+    manifest = generation_manifest.load_manifest(manifest_path)
+    if manifest is None or os.path.abspath(manifest.get("list_file", "")) != os.path.abspath(list_file):
+        return None
+    return [os.path.abspath(list_file)] + [path for path in manifest.get("includes", [])]
+
+#Writes a single rule to "depfile_path": every file generated for
+#"list_files" depends on every descriptor, the files they include and
+#"cmake-test.cmake". "descriptor_list", if given, is a dependency as well.
+#"stamp_path", if given, is touched and listed as the first target.
+def write_generation_depfile(
+    depfile_path,
+    list_files,
+    test_directory,
+    configurations = None,
+    split_groups = False,
+    descriptor_list = None,
+    stamp_path = None
+):
+    import depfile
+    targets = []
+    dependencies = []
+    output_path = None
+    recorded = None
+    directories = [test_directory]
+    if configurations is not None:
+        directories = [test_directory / name for name, _, _, _ in configurations]
+
+    for list_file in list_files:
+        for directory in directories:
+            output_path = get_tracked_output_path(directory / pathlib.Path(list_file).name, split_groups)
+            recorded = get_recorded_dependencies(list_file, generation_manifest.get_manifest_path(output_path))
+            if recorded is None:
+                print_err("No manifest records what \"{}\" was generated from.".format(output_path))
+                return 1
+            targets.append(os.path.abspath(output_path))
+            dependencies.extend(recorded)
+
+    if descriptor_list is not None:
+        dependencies.append(os.path.abspath(descriptor_list))
+    dependencies.append(CMAKE_TEST_FILE_PATH.__str__())
+
+    try:
+        depfile.write_depfile(depfile_path, targets, dependencies, stamp_path = stamp_path)
+    except OSError as e:
+        print_err("Unable to write depfile \"{}\": {}".format(depfile_path, e))
+        return 1
+    return 0
+
+#Checks the names given with "--context".
+#Returns tuple: (errcode, [(name, build_dir, source_dir, project_source_dir)]).
+def collect_configurations(context_args):
+    retval = []
+    names = set()
+    for name, build_dir, source_dir, proj_source_dir in context_args:
+        if name in ('', '.', '..') or pathlib.Path(name).name != name:
+            print_err("Context name \"{}\" must be a plain directory name.".format(name))
+            return 1, None
+
+        if name in names:
+            print_err("Context name \"{}\" is given more than once.".format(name))
+            return 1, None
+        names.add(name)
+        retval.append((name, build_dir, source_dir, proj_source_dir))
+    return 0, retval
+
+#Entry point for a single descriptor in batch mode. It has to live at module
+#scope so that it can be handed to a process pool. Errors are reported and
+#turned into a non-zero return code so that one bad descriptor does not stop
+#the others from being generated.
+def run_generation_job(
+    list_file,
+    build_dir,
+    source_dir,
+    proj_source_dir,
+    test_directory,
+    force = False,
+    use_lint_cache = True,
+    configurations = None,
+    split_groups = False,
+    instrument = False
+):
+    errcode = None
+    context = None
+    try:
+        if configurations is not None:
+            return list_file, run_matrix_generation_job(
+                list_file,
+                configurations,
+                test_directory,
+                force = force,
+                use_lint_cache = use_lint_cache,
+                split_groups = split_groups,
+                instrument = instrument
+            )
+
+        with generation_profile.phase(generation_profile.ARGUMENT_VALIDATION):
+            errcode, context = create_context(list_file, build_dir, source_dir, proj_source_dir)
+        if errcode != 0:
+            return list_file, 1
+        return list_file, generate_test_file(
+            context,
+            test_directory,
+            force = force,
+            use_lint_cache = use_lint_cache,
+            split_groups = split_groups,
+            instrument = instrument
+        )
+    except Exception as e:
+        print_err("Failed to generate test file for \"{}\": {}".format(list_file, e))
+        return list_file, 1
+
+#"configurations" as returned by "collect_configurations".
+def run_matrix_generation_job(
+    list_file,
+    configurations,
+    test_directory,
+    force = False,
+    use_lint_cache = True,
+    split_groups = False,
+    instrument = False
+):
+    errcode = None
+    context = None
+    contexts = []
+    for name, build_dir, source_dir, proj_source_dir in configurations:
+        errcode, context = create_context(list_file, build_dir, source_dir, proj_source_dir)
+        if errcode != 0:
+            print_err("Invalid context \"{}\".".format(name))
+            return 1
+        contexts.append((name, context))
+    return generate_test_file_matrix(
+        contexts,
+        test_directory,
+        force = force,
+        use_lint_cache = use_lint_cache,
+        split_groups = split_groups,
+        instrument = instrument
+    )
+
+def run_generation_jobs(list_files, parse_results, test_directory, configurations = None):
+    results = []
+    job_args = [
+        (
+            list_file,
+            parse_results.build_dir,
+            parse_results.source_dir,
+            parse_results.project_source_dir,
+            test_directory,
+            parse_results.force,
+            not parse_results.no_lint_cache,
+            configurations,
+            parse_results.split_groups,
+            parse_results.instrument
+        ) for list_file in list_files
+    ]
+
+    if parse_results.jobs is None or parse_results.jobs == 1 or len(list_files) == 1:
+        for elem in job_args:
+            results.append(run_generation_job(*elem))
+        return results
+
+    import concurrent.futures
+    with concurrent.futures.ProcessPoolExecutor(max_workers = parse_results.jobs) as executor:
+        futures = [executor.submit(run_generation_job, *elem) for elem in job_args]
+        for future in concurrent.futures.as_completed(futures):
+            results.append(future.result())
+    return results
+
+#Primes what a forked daemon child would otherwise have to set up on every
+#request: the compiled regexes, the variable expansion machinery and the
+#digest of the generator's sources, which thereby describes the code the
+#daemon loaded rather than what is on disk when a request comes in.
+def warm_up_daemon():
+    ApplicationSingleton(None)
+    get_generator_digest()
+    context = cmake_helper.CMakeScriptContext(
+        list_file = __file__,
+        build_dir = os.getcwd(),
+        source_dir = os.getcwd(),
+        project_source_dir = os.getcwd()
+    )
+    context.resolve_vars("${CMAKE_CURRENT_LIST_DIR}/warm-up.cmake", no_fail = True)
+
+#Where the generated test files are written.
+def get_test_directory():
+    return SCRIPT_PATH.parent / "tests"
+
 def main(args):
-     test_directory = pathlib.Path(__file__).parent / "tests"
-     
+     test_directory = get_test_directory()
      
-     errcode, context = parse_args_into_context(args)
-     if(errcode != 0):
+     parser = build_arg_parser()
+     parse_results = parser.parse_args(args)
+     if parse_results.serve is not None:
+         import generator_daemon
+         return generator_daemon.serve(parse_results.serve, main, warm_up = warm_up_daemon)
+
+     if parse_results.profile is None:
+         if parse_results.profile_cprofile or parse_results.profile_memory:
+             parser.error("\"--profile-cprofile\" and \"--profile-memory\" need \"--profile\"")
+         return run_from_args(parser, parse_results, test_directory)
+
+     #Work done in other processes or threads would not be profiled.
+     if parse_results.jobs is not None and parse_results.jobs > 1:
+         print("\"--profile\" runs a single job at a time.")
+     parse_results.jobs = 1
+     return generation_profile.run_profiled(
+         lambda: run_from_args(parser, parse_results, test_directory),
+         parse_results.profile,
+         use_cprofile = parse_results.profile_cprofile,
+         trace_memory = parse_results.profile_memory
+     )
+
+def run_from_args(parser, parse_results, test_directory):
+     with generation_profile.phase(generation_profile.ARGUMENT_VALIDATION):
+         errcode, list_files, configurations = validate_args(parser, parse_results, test_directory)
+     if errcode != 0 or list_files is None:
+         return errcode
+
+     if parse_results.bundle is not None:
+         return run_bundle_generation(list_files, parse_results, test_directory)
+
+     results = run_generation_jobs(list_files, parse_results, test_directory, configurations = configurations)
+     failures = [list_file for list_file, errcode in results if errcode != 0]
+     if len(failures) > 0:
+         if len(list_files) > 1:
+             print_err("Failed to generate {} of {} test files:".format(len(failures), len(list_files)))
+             for list_file in failures:
+                 print_err("    {}".format(list_file))
          return 1
 
-     app_singleton = ApplicationSingleton(context)
-     parse_status = parse_file(app_singleton)
-
-     if parse_status is None:
-         print("An error occurred while parsing file \"{}\".".format(context.list_file), file=sys.stderr)
-         return 1
+     if parse_results.depfile is not None:
+         return write_generation_depfile(
+             parse_results.depfile,
+             list_files,
+             test_directory,
+             configurations = configurations,
+             split_groups = parse_results.split_groups,
+             descriptor_list = parse_results.descriptor_list,
+             stamp_path = parse_results.stamp
+         )
+     return 0
 
-     output_buffer = generate_file_contents(parse_status)
-     if test_directory.exists():
-         if not test_directory.is_dir():
-             print(
-                 "There exists something at path \"tests\", but it is not a directory",
-                 file=sys.stderr
-             )
-             return 1
-         if not os.access(test_directory, os.W_OK):
-             print(
-                 "While the \"tests\" directory exists, You do not have write access to it."
-             )
-             return 1
+#Returns tuple: (errcode, list_files, configurations). "list_files" is None
+#when there is nothing left to generate, as after "--lint-only".
+def validate_args(parser, parse_results, test_directory):
+     if parse_results.jobs is not None and parse_results.jobs < 1:
+         print_err("\"-j/--jobs\" must be at least 1.")
+         return 1, None, None
+
+     if parse_results.stamp is not None and parse_results.depfile is None:
+         parser.error("\"--stamp\" requires \"--depfile\"")
+
+     if parse_results.lint_only is not None:
+         if parse_results.depfile is not None:
+             parser.error("\"--depfile\" cannot be combined with \"--lint-only\"")
+         return run_lint_sweep(
+             parse_results.lint_only,
+             parse_results.jobs if parse_results.jobs is not None else (os.cpu_count() or 1),
+             exclude_dirs = [test_directory]
+         ), None, None
+
+     configurations = None
+     if parse_results.context is not None:
+         if parse_results.build_dir is not None or parse_results.source_dir is not None or parse_results.project_source_dir is not None:
+             parser.error("\"--context\" cannot be combined with -b/--build_dir, -c/--source_dir or -p/--project_source_dir")
+
+         errcode, configurations = collect_configurations(parse_results.context)
+         if errcode != 0:
+             return 1, None, None
      else:
-         test_directory.mkdir() 
+         if parse_results.build_dir is None:
+             parser.error("the following arguments are required: -b/--build_dir")
 
-     test_file = test_directory / context.list_file.name
-     with open(test_file, 'w') as file:
-         file.writelines(output_buffer)
-     return 0
+         if parse_results.source_dir is None:
+             parser.error("the following arguments are required: -c/--source_dir")
+
+     if parse_results.bundle is not None:
+         if configurations is not None:
+             parser.error("\"--bundle\" cannot be combined with \"--context\"")
+
+         if parse_results.split_groups:
+             parser.error("\"--bundle\" cannot be combined with \"--split-groups\"")
+
+         if parse_results.bundle in ('', '.', '..') or pathlib.Path(parse_results.bundle).name != parse_results.bundle:
+             print_err("Bundle name \"{}\" must be a plain file name.".format(parse_results.bundle))
+             return 1, None, None
+
+     errcode, list_files = collect_list_files(parse_results)
+     if errcode != 0:
+         return 1, None, None
+
+     if prepare_test_directory(test_directory) != 0:
+         return 1, None, None
+     return 0, list_files, configurations
 
 
 if __name__ == "__main__":
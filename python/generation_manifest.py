@@ -0,0 +1,132 @@
+#Records what a generated test file was built from, so that regeneration can
+#be skipped when none of its inputs have changed.
+#
+#The manifest sits next to the generated file and stores a digest over:
+#    - the descriptor file
+#    - every file it includes
+#    - the CMakeScriptContext directories
+#    - the environment variables dereferenced during expansion
+#    - any extra files the output depends on
+#    - the generator itself, as a digest over all of its sources
+#    - the generator options that change the output, such as "--instrument"
+#It also stores a digest of the generated file, so that a hand-edited or
+#truncated output is regenerated as well.
+import hashlib
+import json
+import os
+import pathlib
+
+MANIFEST_VERSION = 2
+MANIFEST_SUFFIX = ".manifest.json"
+HASH_CHUNK_SIZE = 1 << 16
+
+#Returns None if the file does not exist.
+def hash_file(filepath):
+    hasher = hashlib.sha256()
+    try:
+        with open(filepath, 'rb') as file:
+            for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b''):
+                hasher.update(chunk)
+    except FileNotFoundError:
+        return None
+    return hasher.hexdigest()
+
+#Returns one digest over the names and contents of "filepaths".
+def hash_files(filepaths):
+    hasher = hashlib.sha256()
+    for path in filepaths:
+        hasher.update(json.dumps([path.__str__(), hash_file(path)]).encode())
+    return hasher.hexdigest()
+
+def get_manifest_path(test_file):
+    test_file = pathlib.Path(test_file)
+    return test_file.with_name(test_file.name + MANIFEST_SUFFIX)
+
+def get_context_inputs(context):
+    return {
+        "list_file": context.list_file.__str__(),
+        "build_dir": context.build_dir.__str__(),
+        "source_dir": context.source_dir.__str__(),
+        "project_source_dir": context.project_source_dir.__str__()
+    }
+
+def compute_input_digest(context, include_paths, env_var_names, extra_inputs = ()):
+    inputs = {
+        "context": get_context_inputs(context),
+        "files": [
+            [path.__str__(), hash_file(path)]
+            for path in [context.list_file] + list(include_paths) + list(extra_inputs)
+        ],
+        "env": [[name, os.environ.get(name)] for name in sorted(env_var_names)]
+    }
+    return hashlib.sha256(json.dumps(inputs).encode()).hexdigest()
+
+def build_manifest(context, include_paths, output_path, extra_inputs = (), options = None, generator_digest = None):
+    include_paths = [path.__str__() for path in include_paths]
+    extra_inputs = [path.__str__() for path in extra_inputs]
+    env_var_names = sorted(context.dereferenced_env_vars.keys())
+    return {
+        "version": MANIFEST_VERSION,
+        "list_file": context.list_file.__str__(),
+        "includes": include_paths,
+        "extra_inputs": extra_inputs,
+        "env_vars": env_var_names,
+        "options": options if options is not None else {},
+        "generator_digest": generator_digest,
+        "input_digest": compute_input_digest(context, include_paths, env_var_names, extra_inputs),
+        "output_digest": hash_file(output_path)
+    }
+
+#Returns None if the manifest is missing or unreadable.
+def load_manifest(manifest_path):
+    try:
+        with open(manifest_path, 'r') as file:
+            manifest = json.load(file)
+    except (OSError, ValueError):
+        return None
+
+    if not isinstance(manifest, dict) or manifest.get("version") != MANIFEST_VERSION:
+        return None
+    return manifest
+
+def write_manifest(manifest_path, manifest):
+    manifest_path = pathlib.Path(manifest_path)
+    temp_path = manifest_path.with_name("{}.{}.tmp".format(manifest_path.name, os.getpid()))
+    with open(temp_path, 'w') as file:
+        json.dump(manifest, file, indent = 4)
+    os.replace(temp_path, manifest_path)
+
+#The include list and environment variable names are taken from the manifest:
+#if none of the recorded inputs changed, the descriptor will include the same
+#files and read the same variables as last time.
+def is_up_to_date(manifest_path, context, output_path, extra_inputs = (), options = None, generator_digest = None):
+    manifest = load_manifest(manifest_path)
+    if manifest is None:
+        return False
+
+    try:
+        if manifest["list_file"] != context.list_file.__str__():
+            return False
+
+        if [path.__str__() for path in extra_inputs] != manifest["extra_inputs"]:
+            return False
+
+        if (options if options is not None else {}) != manifest.get("options", {}):
+            return False
+
+        if generator_digest != manifest.get("generator_digest"):
+            return False
+
+        input_digest = compute_input_digest(
+            context,
+            manifest["includes"],
+            manifest["env_vars"],
+            manifest["extra_inputs"]
+        )
+        if input_digest != manifest["input_digest"]:
+            return False
+
+        output_digest = hash_file(output_path)
+        return output_digest is not None and output_digest == manifest["output_digest"]
+    except (KeyError, TypeError):
+        return False
@@ -0,0 +1,210 @@
+#Where the generator spends its time, for "--profile".
+#
+#The run is split into phases: argument validation, linting, reading the
+#descriptor, variable expansion, scanning and writing the output. Phases nest,
+#as reading happens while scanning, and each is charged only for the time no
+#nested phase was running, so the phase times add up to the wall time, less
+#whatever ran outside of any phase ("other").
+#
+#On top of the phases, the report breaks scanning down by "scan_for_*"
+#handler and records every "resolve_vars" call, keeping the slowest ones with
+#their input. cProfile statistics and the tracemalloc peak are optional, since
+#both slow the run down.
+#
+#The code being profiled calls the module-level functions below, which do
+#nothing unless a profile is active.
+import contextlib
+import heapq
+import json
+import time
+
+REPORT_VERSION = 1
+
+ARGUMENT_VALIDATION = "argument_validation"
+LINT = "lint"
+FILE_READ = "file_read"
+VARIABLE_EXPANSION = "variable_expansion"
+SCAN = "scan"
+OUTPUT_WRITE = "output_write"
+PHASES = (ARGUMENT_VALIDATION, LINT, FILE_READ, VARIABLE_EXPANSION, SCAN, OUTPUT_WRITE)
+
+SLOWEST_CALL_COUNT = 20
+MAX_REPORTED_INPUT_LENGTH = 200
+CPROFILE_FUNCTION_COUNT = 30
+
+ACTIVE_PROFILE = None
+
+class GenerationProfile:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.end = None
+        self.phase_times = {name: 0.0 for name in PHASES}
+        #[name, time the phase last started or resumed] of the running phases,
+        #innermost last:
+        self.running_phases = []
+        #name -> [calls, seconds]:
+        self.handlers = {}
+        self.resolve_vars_calls = 0
+        self.resolve_vars_seconds = 0.0
+        #Min-heap of (seconds, call number, input):
+        self.slowest_resolve_vars_calls = []
+        self.tracemalloc_peak = None
+        self.cprofile_functions = None
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        now = time.perf_counter()
+        if len(self.running_phases) > 0:
+            self.charge(self.running_phases[-1], now)
+        self.running_phases.append([name, now])
+        try:
+            yield
+        finally:
+            now = time.perf_counter()
+            self.charge(self.running_phases.pop(), now)
+            if len(self.running_phases) > 0:
+                self.running_phases[-1][1] = now
+
+    def charge(self, running_phase, now):
+        self.phase_times[running_phase[0]] = self.phase_times.get(running_phase[0], 0.0) + now - running_phase[1]
+        running_phase[1] = now
+
+    def call_handler(self, handler, *args):
+        start = time.perf_counter()
+        try:
+            return handler(*args)
+        finally:
+            stats = self.handlers.setdefault(handler.__name__, [0, 0.0])
+            stats[0] += 1
+            stats[1] += time.perf_counter() - start
+
+    def call_resolve_vars(self, resolve_vars, string, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            with self.phase(VARIABLE_EXPANSION):
+                return resolve_vars(string, *args, **kwargs)
+        finally:
+            self.record_resolve_vars(string, time.perf_counter() - start)
+
+    def record_resolve_vars(self, string, seconds):
+        self.resolve_vars_calls += 1
+        self.resolve_vars_seconds += seconds
+        entry = (seconds, self.resolve_vars_calls, string[:MAX_REPORTED_INPUT_LENGTH])
+        if len(self.slowest_resolve_vars_calls) < SLOWEST_CALL_COUNT:
+            heapq.heappush(self.slowest_resolve_vars_calls, entry)
+        elif entry > self.slowest_resolve_vars_calls[0]:
+            heapq.heapreplace(self.slowest_resolve_vars_calls, entry)
+
+    def finish(self):
+        self.end = time.perf_counter()
+
+    def to_dict(self):
+        wall_time = (self.end if self.end is not None else time.perf_counter()) - self.start
+        phases = dict(self.phase_times)
+        phases["other"] = max(0.0, wall_time - sum(self.phase_times.values()))
+        return {
+            "version": REPORT_VERSION,
+            "wall_time": wall_time,
+            "phases": phases,
+            "scan_handlers": {
+                name: {"calls": calls, "seconds": seconds}
+                for name, (calls, seconds) in sorted(self.handlers.items())
+            },
+            "resolve_vars": {
+                "calls": self.resolve_vars_calls,
+                "seconds": self.resolve_vars_seconds,
+                "slowest": [
+                    {"seconds": seconds, "input": string}
+                    for seconds, _, string in sorted(self.slowest_resolve_vars_calls, reverse = True)
+                ]
+            },
+            "tracemalloc_peak_bytes": self.tracemalloc_peak,
+            "cprofile": self.cprofile_functions
+        }
+
+class TimedReader:
+    #Times the reads "DescriptorLineReader" makes from "file".
+    def __init__(self, file, profile):
+        self.file = file
+        self.profile = profile
+
+    def readline(self):
+        with self.profile.phase(FILE_READ):
+            return self.file.readline()
+
+def get_active_profile():
+    return ACTIVE_PROFILE
+
+#Makes "profile" the active profile inside the "with" block.
+@contextlib.contextmanager
+def activated(profile):
+    global ACTIVE_PROFILE
+    ACTIVE_PROFILE = profile
+    try:
+        yield profile
+    finally:
+        ACTIVE_PROFILE = None
+
+def phase(name):
+    if ACTIVE_PROFILE is None:
+        return contextlib.nullcontext()
+    return ACTIVE_PROFILE.phase(name)
+
+#Returns "resolve_vars", timed if a profile is active.
+def wrap_resolve_vars(resolve_vars):
+    profile = ACTIVE_PROFILE
+    if profile is None:
+        return resolve_vars
+    return lambda string, *args, **kwargs: profile.call_resolve_vars(resolve_vars, string, *args, **kwargs)
+
+def wrap_reader(file):
+    if ACTIVE_PROFILE is None:
+        return file
+    return TimedReader(file, ACTIVE_PROFILE)
+
+#The functions that took the most time, including the functions they called.
+def get_cprofile_functions(profiler, count = CPROFILE_FUNCTION_COUNT):
+    import pstats
+    stats = pstats.Stats(profiler).stats
+    rows = sorted(stats.items(), key = lambda item: item[1][3], reverse = True)[:count]
+    return [
+        {
+            "function": "{}:{}({})".format(filename, line, function_name),
+            "calls": call_count,
+            "primitive_calls": primitive_call_count,
+            "total_seconds": total_time,
+            "cumulative_seconds": cumulative_time
+        }
+        for (filename, line, function_name), (primitive_call_count, call_count, total_time, cumulative_time, _) in rows
+    ]
+
+#Runs "func" with a profile active and writes the report to "report_path".
+#Returns what "func" returns.
+def run_profiled(func, report_path, use_cprofile = False, trace_memory = False):
+    profiler = None
+    retval = None
+    profile = GenerationProfile()
+
+    if trace_memory:
+        import tracemalloc
+        tracemalloc.start()
+    if use_cprofile:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    try:
+        with activated(profile):
+            retval = func()
+    finally:
+        profile.finish()
+        if profiler is not None:
+            profiler.disable()
+            profile.cprofile_functions = get_cprofile_functions(profiler)
+        if trace_memory:
+            profile.tracemalloc_peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+        with open(report_path, 'w') as file:
+            json.dump(profile.to_dict(), file, indent = 4)
+    return retval
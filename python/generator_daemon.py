@@ -0,0 +1,177 @@
+#Long-lived server for generate-test-file.py.
+#
+#The daemon is started once ("generate-test-file.py --serve <socket>") and
+#keeps the interpreter, the imported parsing modules and the compiled regexes
+#warm. Every request is handled in a child forked from the warm daemon, so
+#requests run in parallel, each with the client's working directory and
+#environment and its own captured output.
+#
+#Only what the daemon set up before forking is shared: whatever a request adds
+#to the lint, expansion or parse caches goes away with its child. The in-memory
+#caches are therefore only warmed once, by "warm_up" at start-up, and every
+#request starts from that state, not from that of earlier requests. The lint
+#cache lives on disk, so it is shared all the same.
+#
+#A request runs the generator with whatever working directory and environment
+#it asks for, so only the user who started the daemon may connect: the socket
+#is created with mode 0600, and where the platform reports the peer's
+#credentials (SO_PEERCRED), connections from other users are dropped as well.
+#
+#The protocol is one JSON object per line in each direction:
+#    request:  {"cwd": <working directory>, "env": {<environment>},
+#               "args": [<generator arguments>]}
+#    response: {"returncode": <int>, "stdout": <str>, "stderr": <str>}
+#
+#This module only depends on the standard library so that the client side
+#stays cheap to start.
+import io
+import json
+import os
+import signal
+import socket
+import socketserver
+import struct
+import sys
+
+#Returned by the client when no daemon answers on the socket, so that
+#callers can fall back to running the generator directly. (EX_TEMPFAIL)
+DAEMON_UNAVAILABLE_EXIT_CODE = 75
+
+class GeneratorDaemonError(RuntimeError):
+    def __init__(self, msg):
+        super().__init__(f"Generator daemon error: {msg}")
+
+
+class GeneratorRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        response = None
+        line = self.rfile.readline()
+        try:
+            request = json.loads(line)
+            response = self.server.run_request(request)
+        except (ValueError, KeyError, TypeError) as e:
+            response = {
+                "returncode": 1,
+                "stdout": "",
+                "stderr": "Malformed generator daemon request: {}\n".format(e)
+            }
+        self.wfile.write((json.dumps(response) + "\n").encode())
+
+
+class GeneratorDaemon(socketserver.ForkingMixIn, socketserver.UnixStreamServer):
+    #Parallel "ctest -j" runs connect in bursts.
+    request_queue_size = 128
+
+    def __init__(self, socket_path, generate_func):
+        self.socket_path = socket_path
+        self.generate_func = generate_func
+        self.allowed_uid = os.getuid()
+        super().__init__(socket_path, GeneratorRequestHandler)
+
+    #The umask makes bind() create the socket with mode 0600, so there is no
+    #window in which other users could connect.
+    def server_bind(self):
+        saved_umask = os.umask(0o177)
+        try:
+            super().server_bind()
+        finally:
+            os.umask(saved_umask)
+
+    def verify_request(self, request, client_address):
+        credentials = None
+        uid = None
+        if not hasattr(socket, "SO_PEERCRED"):
+            return True
+
+        credentials = request.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i"))
+        _, uid, _ = struct.unpack("3i", credentials)
+        return uid == self.allowed_uid
+
+    #Runs inside the forked child, so changing the working directory and the
+    #environment and swapping out the standard streams cannot leak into other
+    #requests.
+    def run_request(self, request):
+        returncode = None
+        stdout = io.StringIO()
+        stderr = io.StringIO()
+        saved_streams = (sys.stdout, sys.stderr)
+
+        os.chdir(request["cwd"])
+        #"$ENV{}" references and the manifest's environment digest have to see
+        #the client's environment, not the daemon's.
+        if "env" in request:
+            os.environ.clear()
+            os.environ.update(request["env"])
+        sys.stdout = stdout
+        sys.stderr = stderr
+        try:
+            returncode = self.generate_func(list(request["args"]))
+        except SystemExit as e:
+            #argparse exits on bad arguments.
+            returncode = e.code if isinstance(e.code, int) else 1
+        except Exception as e:
+            print("Generator raised an exception: {}".format(e), file=sys.stderr)
+            returncode = 1
+        finally:
+            sys.stdout, sys.stderr = saved_streams
+
+        return {
+            "returncode": 0 if returncode is None else returncode,
+            "stdout": stdout.getvalue(),
+            "stderr": stderr.getvalue()
+        }
+
+def is_daemon_listening(socket_path):
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(socket_path)
+    except OSError:
+        return False
+    return True
+
+def serve(socket_path, generate_func, warm_up = None):
+    if os.path.exists(socket_path):
+        if is_daemon_listening(socket_path):
+            raise GeneratorDaemonError(
+                "A daemon is already listening on \"{}\".".format(socket_path)
+            )
+        #Left behind by a daemon that did not shut down cleanly.
+        os.unlink(socket_path)
+
+    if warm_up is not None:
+        warm_up()
+
+    server = GeneratorDaemon(socket_path, generate_func)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        print("Generator daemon listening on \"{}\".".format(socket_path), flush = True)
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+    return 0
+
+#Raises OSError if no daemon is listening on "socket_path". "cwd" and "env"
+#default to the caller's working directory and environment.
+def request_generation(socket_path, args, cwd = None, timeout = None, env = None):
+    response_line = None
+    request = {
+        "cwd": os.getcwd() if cwd is None else cwd,
+        "env": dict(os.environ) if env is None else dict(env),
+        "args": list(args)
+    }
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(socket_path)
+        with sock.makefile('rwb') as stream:
+            stream.write((json.dumps(request) + "\n").encode())
+            stream.flush()
+            response_line = stream.readline()
+
+    if not response_line:
+        raise GeneratorDaemonError("The daemon closed the connection without answering.")
+    return json.loads(response_line)
@@ -0,0 +1,71 @@
+#Timing instrumentation for generated test files.
+#
+#With "--instrument", every setup, test and teardown call in a generated file
+#is wrapped in a pair of "string(TIMESTAMP ... "%s%f")" captures, which need
+#CMake 3.23 or newer, and followed by a line of the form
+#
+#   -- CMAKE-TEST TIMING:<TAB>KIND<TAB>MICROSECONDS<TAB>GROUP<TAB>NAME
+#
+#where KIND is "setup", "test" or "teardown". "parse_timings" reads these
+#lines back from the output of "cmake -P".
+from cmake_local.language_parsing import cmake_lexer
+
+TIMING_MARKER = "CMAKE-TEST TIMING:"
+TIMING_FIELD_SEPARATOR = "\t"
+
+SETUP = "setup"
+TEST = "test"
+TEARDOWN = "teardown"
+
+#Variables the instrumentation sets in the generated file. Setup, test and
+#teardown macros run in the file's scope, so the names stay out of their way.
+START_VARIABLE = "CMAKE_TEST_TIMING_START"
+END_VARIABLE = "CMAKE_TEST_TIMING_END"
+ELAPSED_VARIABLE = "CMAKE_TEST_TIMING_ELAPSED"
+
+class TestTiming:
+    def __init__(self, kind, test_group, name, duration):
+        self.kind = kind
+        self.test_group = test_group
+        self.name = name
+        #In seconds:
+        self.duration = duration
+
+    def __repr__(self):
+        return "TestTiming({!r}, {!r}, {!r}, {})".format(self.kind, self.test_group, self.name, self.duration)
+
+#Returns the CMake code that calls "command" and reports how long it took.
+def get_timed_call(kind, test_group, command, name = None):
+    name = command if name is None else name
+    return "".join([
+        "string(TIMESTAMP {} \"%s%f\")\n".format(START_VARIABLE),
+        "{}()\n".format(command),
+        "string(TIMESTAMP {} \"%s%f\")\n".format(END_VARIABLE),
+        "math(EXPR {} \"${{{}}} - ${{{}}}\")\n".format(ELAPSED_VARIABLE, END_VARIABLE, START_VARIABLE),
+        "message(STATUS \"{}\\t{}\\t${{{}}}\\t{}\\t{}\")\n".format(
+            TIMING_MARKER,
+            kind,
+            ELAPSED_VARIABLE,
+            cmake_lexer.escape_quoted_argument(test_group),
+            cmake_lexer.escape_quoted_argument(name)
+        )
+    ])
+
+#Returns a TestTiming for every timing line in "output", in order. Other
+#lines are ignored.
+def parse_timings(output):
+    retval = []
+    fields = None
+    for line in output.splitlines():
+        index = line.find(TIMING_MARKER)
+        if index < 0:
+            continue
+        fields = line[index + len(TIMING_MARKER):].split(TIMING_FIELD_SEPARATOR, 4)
+        #The marker is followed by a separator, so the first field is empty.
+        if len(fields) != 5:
+            continue
+        try:
+            retval.append(TestTiming(fields[1], fields[3], fields[4], int(fields[2]) / 1000000))
+        except ValueError:
+            continue
+    return retval
@@ -0,0 +1,120 @@
+#On-disk cache of "cmake -P" lint verdicts.
+#
+#Linting a descriptor means running CMake on it, which is the slowest step of
+#generation. A passing verdict only depends on the descriptor, the files it
+#includes and the framework's "cmake-test.cmake", so it is cached under a key
+#derived from their contents. Only passing verdicts are cached: the files a
+#failing descriptor includes are not known (it never gets parsed), and a
+#failing descriptor is about to be edited anyway.
+#
+#Each entry is its own small JSON file, written to a temporary file and
+#renamed into place, so several generator processes can share a cache
+#directory. Hits refresh the entry's mtime, and the least recently used
+#entries are evicted once the cache holds more than "max_entries".
+import hashlib
+import json
+import os
+import pathlib
+
+import generation_manifest
+
+LINT_CACHE_VERSION = 1
+LINT_CACHE_DIR_ENV_VAR = "CMAKE_TEST_LINT_CACHE_DIR"
+DEFAULT_MAX_ENTRIES = 1024
+ENTRY_SUFFIX = ".json"
+
+class LintCache:
+    def __init__(self, cache_dir, max_entries = DEFAULT_MAX_ENTRIES):
+        self.cache_dir = pathlib.Path(cache_dir)
+        self.max_entries = max_entries
+
+    #"framework_files" are the files every descriptor depends on,
+    #such as "cmake-test.cmake".
+    def compute_key(self, list_file, working_dir, framework_files = ()):
+        key_inputs = {
+            "version": LINT_CACHE_VERSION,
+            "list_file": [list_file.__str__(), generation_manifest.hash_file(list_file)],
+            "working_dir": working_dir.__str__(),
+            "framework_files": [[path.__str__(), generation_manifest.hash_file(path)] for path in framework_files]
+        }
+        return hashlib.sha256(json.dumps(key_inputs).encode()).hexdigest()
+
+    def get_entry_path(self, key):
+        return self.cache_dir / (key + ENTRY_SUFFIX)
+
+    def lookup(self, key):
+        entry_path = self.get_entry_path(key)
+        try:
+            with open(entry_path, 'r') as file:
+                entry = json.load(file)
+            if entry["version"] != LINT_CACHE_VERSION or entry["verdict"] is not True:
+                return False
+            for path, digest in entry["includes"].items():
+                if generation_manifest.hash_file(path) != digest:
+                    return False
+            os.utime(entry_path)
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            return False
+        return True
+
+    def store(self, key, include_paths):
+        entry_path = self.get_entry_path(key)
+        temp_path = entry_path.with_name("{}.{}.tmp".format(entry_path.name, os.getpid()))
+        entry = {
+            "version": LINT_CACHE_VERSION,
+            "verdict": True,
+            "includes": {path.__str__(): generation_manifest.hash_file(path) for path in include_paths}
+        }
+        try:
+            self.cache_dir.mkdir(parents = True, exist_ok = True)
+            with open(temp_path, 'w') as file:
+                json.dump(entry, file)
+            os.replace(temp_path, entry_path)
+        except OSError:
+            #A cache that cannot be written to is just a cache miss next time.
+            return False
+        self.evict()
+        return True
+
+    def evict(self):
+        entries = []
+        try:
+            with os.scandir(self.cache_dir) as iterator:
+                for dir_entry in iterator:
+                    if not dir_entry.name.endswith(ENTRY_SUFFIX):
+                        continue
+                    try:
+                        entries.append((dir_entry.stat().st_mtime_ns, dir_entry.path))
+                    except FileNotFoundError:
+                        continue
+        except OSError:
+            return
+
+        if len(entries) <= self.max_entries:
+            return
+
+        entries.sort()
+        for _, path in entries[:len(entries) - self.max_entries]:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                #Another process evicted it first.
+                continue
+
+    def clear(self):
+        try:
+            with os.scandir(self.cache_dir) as iterator:
+                for dir_entry in iterator:
+                    if dir_entry.name.endswith(ENTRY_SUFFIX):
+                        try:
+                            os.unlink(dir_entry.path)
+                        except FileNotFoundError:
+                            continue
+        except FileNotFoundError:
+            pass
+
+def get_default_cache_dir(test_directory):
+    cache_dir = os.environ.get(LINT_CACHE_DIR_ENV_VAR)
+    if cache_dir is not None and cache_dir != '':
+        return pathlib.Path(cache_dir)
+    return pathlib.Path(test_directory) / ".lint-cache"
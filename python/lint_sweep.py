@@ -0,0 +1,55 @@
+#Finds the test descriptors under a directory tree and lints them in parallel.
+#
+#Linting runs "cmake -P" in a subprocess, so the work is bound by the
+#subprocesses rather than by the GIL and a thread pool is enough to keep
+#several of them running at once.
+import concurrent.futures
+import os
+import pathlib
+import re
+
+#A test descriptor is a CMake file that includes "cmake-test.cmake".
+RE_CMAKE_TEST_INCLUDE = re.compile(R"^\s*include\s*\(.*cmake-test\.cmake", re.MULTILINE)
+DESCRIPTOR_SUFFIX = ".cmake"
+SKIPPED_DIR_NAMES = frozenset([".git", "__pycache__"])
+
+def is_descriptor(filepath):
+    try:
+        with open(filepath, 'r', errors = 'replace') as file:
+            return RE_CMAKE_TEST_INCLUDE.search(file.read()) is not None
+    except OSError:
+        return False
+
+def find_descriptors(root, exclude_dirs = ()):
+    retval = []
+    excluded = set(pathlib.Path(path).resolve() for path in exclude_dirs)
+
+    for dir_path, dir_names, file_names in os.walk(root):
+        dir_names[:] = sorted(
+            name for name in dir_names
+            if name not in SKIPPED_DIR_NAMES and
+            not (pathlib.Path(dir_path) / name).resolve() in excluded
+        )
+        for name in sorted(file_names):
+            if not name.endswith(DESCRIPTOR_SUFFIX):
+                continue
+            filepath = pathlib.Path(dir_path) / name
+            if is_descriptor(filepath):
+                retval.append(filepath)
+    return retval
+
+#Calls "lint_func(descriptor)" for every descriptor using at most "jobs"
+#threads. "on_result(descriptor, result)" is called from the calling thread as
+#soon as each lint finishes, in completion order.
+#Returns a list of (descriptor, result) tuples in completion order.
+def sweep(descriptors, lint_func, jobs, on_result = None):
+    results = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers = jobs) as executor:
+        futures = {executor.submit(lint_func, descriptor): descriptor for descriptor in descriptors}
+        for future in concurrent.futures.as_completed(futures):
+            descriptor = futures[future]
+            result = future.result()
+            results.append((descriptor, result))
+            if on_result is not None:
+                on_result(descriptor, result)
+    return results
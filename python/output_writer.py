@@ -0,0 +1,44 @@
+#Writes generated files atomically, and only when their contents change.
+#
+#The new contents are streamed to a temporary file next to the destination
+#and renamed over it, so a concurrent reader such as "cmake -P" sees either
+#the old file or the new one, never a partial write. When the new contents
+#are byte for byte the same as the existing file, the temporary file is
+#dropped and the destination, mtime included, is left alone so that build
+#steps depending on it do not rerun.
+import filecmp
+import os
+import pathlib
+import threading
+
+BUFFER_SIZE = 64 * 1024
+
+def get_temp_path(path):
+    #Unique per process and thread, since several generator processes or
+    #threads may be writing the same destination.
+    return path.with_name("{}.{}.{}.tmp".format(path.name, os.getpid(), threading.get_ident()))
+
+#Writes every string of "chunks" to "path".
+#Returns True if "path" was written, False if it already had these contents.
+def write_if_changed(path, chunks):
+    path = pathlib.Path(path)
+    temp_path = get_temp_path(path)
+    #Created like "open(path, 'w')" would, so that the umask applies.
+    fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+    try:
+        with open(fd, 'w', buffering = BUFFER_SIZE) as file:
+            for chunk in chunks:
+                file.write(chunk)
+
+        if path.is_file() and filecmp.cmp(temp_path, path, shallow = False):
+            os.unlink(temp_path)
+            return False
+
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except FileNotFoundError:
+            pass
+        raise
+    return True
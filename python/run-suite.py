@@ -0,0 +1,400 @@
+#!/usr/bin/env python3
+
+#Generates the test files for a set of test descriptors and runs them, each
+#in its own "cmake -P", on a bounded pool of workers. Where
+#"cmake-test-runner.cmake" runs the generated files one after another, this
+#keeps as many of them running at once as there are CPUs.
+#
+#Every run's exit code, duration and output are collected, and a summary is
+#printed once all of them have finished. The output of a failing test file is
+#printed with the summary; "-v/--verbose" prints it for passing ones too.
+#
+#With "--split-groups", every test group is generated into, and run from, a
+#file of its own, so that the groups of one descriptor run in parallel too.
+#With "--instrument", the summary also lists the slowest setup, test and
+#teardown calls.
+#
+#With "--watch", the script keeps running after the first run. Whenever a
+#descriptor, a file it includes or "cmake-test.cmake" changes, the
+#descriptors affected are regenerated and run again, and only those.
+import argparse
+import importlib
+import os
+import pathlib
+import subprocess
+import sys
+import time
+
+import file_watcher
+import generation_manifest
+import instrumentation
+import lint_sweep
+
+gentestfile = importlib.import_module("generate-test-file")
+
+class TestFileResult:
+    #"name" labels the result in the output; by default, it is "list_file".
+    def __init__(self, list_file, test_file, name = None):
+        self.list_file = list_file
+        self.test_file = test_file
+        self.name = list_file if name is None else name
+        #None if the test file was never run:
+        self.returncode = None
+        self.duration = 0.0
+        self.stdout = ''
+        self.stderr = ''
+        #Why the test file was not run, or did not finish:
+        self.error = None
+        #instrumentation.TestTiming of every timed call, if instrumented:
+        self.timings = []
+
+    def passed(self):
+        return self.error is None and self.returncode == 0
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(
+        prog = 'run-suite.py',
+        description = 'Generates the test files for one or more test descriptor files and runs them in parallel.',
+        usage='%(prog)s [options] list_file [list_file ...]'
+    )
+    parser.add_argument(
+        '-b',
+        '--build_dir',
+        type=str,
+        required=True,
+        help='CMake build directory.'
+    )
+
+    parser.add_argument(
+        '-c',
+        '--source_dir',
+        type=str,
+        required=True,
+        help = 'CMake source directory.'
+    )
+
+    parser.add_argument(
+        '-p',
+        '--project_source_dir',
+        type=str,
+        help = 'Project source directory.'
+    )
+
+    parser.add_argument(
+        '-l',
+        '--descriptor_list',
+        type=str,
+        help = """File listing test descriptor files, one per line. Blank lines
+and lines starting with \"#\" are ignored. Relative paths are taken relative
+to the directory of the listing file."""
+    )
+
+    parser.add_argument(
+        '-j',
+        '--jobs',
+        type=int,
+        help = 'Number of test files generated and run at once (default: number of CPUs).'
+    )
+
+    parser.add_argument(
+        '-f',
+        '--force',
+        action='store_true',
+        help = 'Regenerate test files even if none of their inputs have changed.'
+    )
+
+    parser.add_argument(
+        '--no-lint-cache',
+        action='store_true',
+        help = 'Always run CMake to lint the descriptors instead of reusing cached verdicts.'
+    )
+
+    parser.add_argument(
+        '--split-groups',
+        action='store_true',
+        help = 'Generate and run every test group as a test file of its own.'
+    )
+
+    parser.add_argument(
+        '--instrument',
+        action='store_true',
+        help = 'Time every setup, test and teardown call and list the slowest ones in the summary.'
+    )
+
+    parser.add_argument(
+        '--slowest',
+        type=int,
+        default=10,
+        metavar='COUNT',
+        help = 'Number of calls listed by "--instrument" (default: 10).'
+    )
+
+    parser.add_argument(
+        '--timeout',
+        type=float,
+        metavar='SECONDS',
+        help = 'Stop a test file that runs for longer than SECONDS and count it as failed.'
+    )
+
+    parser.add_argument(
+        '--watch',
+        action='store_true',
+        help = 'After the first run, rerun the descriptors affected by every change to their files until interrupted.'
+    )
+
+    parser.add_argument(
+        '--poll-interval',
+        type=float,
+        default=file_watcher.DEFAULT_POLL_INTERVAL,
+        metavar='SECONDS',
+        help = 'How often "--watch" checks the files for changes (default: {}).'.format(file_watcher.DEFAULT_POLL_INTERVAL)
+    )
+
+    parser.add_argument(
+        '-v',
+        '--verbose',
+        action='store_true',
+        help = 'Print the output of passing test files as well as failing ones.'
+    )
+
+    parser.add_argument(
+        'list_file',
+        type=str,
+        nargs='*',
+        help = 'Test descriptor file',
+    )
+    return parser
+
+#Runs "result.test_file" and fills in "result". CMake runs from the
+#descriptor's directory.
+def run_test_file(result, timeout = None):
+    start = time.perf_counter()
+    try:
+        cmake_process = subprocess.run(
+            ["cmake", "-P", result.test_file.__str__()],
+            cwd = pathlib.Path(result.list_file).parent.__str__(),
+            capture_output = True,
+            text = True,
+            timeout = timeout,
+            shell = False
+        )
+        result.returncode = cmake_process.returncode
+        result.stdout = cmake_process.stdout
+        result.stderr = cmake_process.stderr
+        result.timings = instrumentation.parse_timings(result.stdout)
+    except subprocess.TimeoutExpired as e:
+        result.error = "Timed out after {} s.".format(timeout)
+        result.stdout = e.stdout.decode(errors = 'replace') if e.stdout is not None else ''
+        result.stderr = e.stderr.decode(errors = 'replace') if e.stderr is not None else ''
+    except Exception as e:
+        result.error = "Failed to run CMake: {}".format(e)
+    result.duration = time.perf_counter() - start
+    return result
+
+#Runs every result's test file on at most "jobs" threads. "on_result(result)"
+#is called as soon as each one finishes.
+#Returns the results in completion order.
+def run_test_files(results, jobs, timeout = None, on_result = None):
+    return [
+        result for result, _ in lint_sweep.sweep(
+            results,
+            lambda result: run_test_file(result, timeout = timeout),
+            jobs,
+            on_result = None if on_result is None else lambda result, _: on_result(result)
+        )
+    ]
+
+def print_output(result):
+    for name, output in (("stdout", result.stdout), ("stderr", result.stderr)):
+        if output == '':
+            continue
+        print("    {}:".format(name))
+        for line in output.splitlines():
+            print("        {}".format(line))
+
+def print_summary(results, verbose = False):
+    failures = [result for result in results if not result.passed()]
+    for result in sorted(results, key = lambda result: result.name):
+        if result.passed():
+            print("PASS: {} ({:.2f} s)".format(result.name, result.duration))
+        elif result.error is not None:
+            print("FAIL: {} ({})".format(result.name, result.error))
+        else:
+            print("FAIL: {} (exit code {}, {:.2f} s)".format(result.name, result.returncode, result.duration))
+
+        if verbose or not result.passed():
+            print_output(result)
+    print("{} of {} test files passed.".format(len(results) - len(failures), len(results)))
+
+def print_slowest_calls(results, count):
+    timings = [(result, timing) for result in results for timing in result.timings]
+    if len(timings) == 0 or count <= 0:
+        return
+
+    timings.sort(key = lambda elem: elem[1].duration, reverse = True)
+    print("Slowest calls:")
+    for result, timing in timings[:count]:
+        print("    {:10.6f} s  {} {} in group \"{}\" of {}".format(
+            timing.duration,
+            timing.kind,
+            timing.name,
+            timing.test_group,
+            result.name
+        ))
+
+#Returns the results to run for "list_file": one for its test file, or one
+#per test group with "split_groups".
+def get_test_file_results(list_file, test_directory, split_groups = False):
+    test_file = test_directory / pathlib.Path(list_file).name
+    if not split_groups:
+        return [TestFileResult(list_file, test_file)]
+
+    return [
+        TestFileResult(
+            list_file,
+            pathlib.Path(group_file),
+            name = "{} [{}]".format(list_file, pathlib.Path(group_file).stem)
+        ) for group_file in gentestfile.read_test_group_index(gentestfile.get_test_group_index_path(test_file))
+    ]
+
+#Returns the files whose changes affect "list_file": the descriptor itself,
+#the files it includes, as the manifest of its test file records them, and
+#"cmake-test.cmake".
+def get_dependencies(list_file, test_directory, split_groups = False):
+    retval = set([
+        file_watcher.normalize_path(list_file),
+        file_watcher.normalize_path(gentestfile.CMAKE_TEST_FILE_PATH)
+    ])
+    test_file = test_directory / pathlib.Path(list_file).name
+    manifest = generation_manifest.load_manifest(
+        generation_manifest.get_manifest_path(gentestfile.get_tracked_output_path(test_file, split_groups))
+    )
+    #A descriptor that never generated has no manifest, and one of the same
+    #name elsewhere may own the test file.
+    if manifest is None or file_watcher.normalize_path(manifest.get("list_file", "")) != file_watcher.normalize_path(list_file):
+        return retval
+
+    retval.update(file_watcher.normalize_path(path) for path in manifest.get("includes", []))
+    return retval
+
+#Returns a dictionary: watched path -> set of the list files it affects.
+def get_dependents(list_files, test_directory, split_groups = False):
+    retval = {}
+    for list_file in list_files:
+        for path in get_dependencies(list_file, test_directory, split_groups):
+            retval.setdefault(path, set()).add(list_file)
+    return retval
+
+#Returns the list files affected by "changed_paths", in the order of
+#"list_files".
+def get_affected_list_files(changed_paths, dependents, list_files):
+    affected = set()
+    for path in changed_paths:
+        affected.update(dependents.get(path, ()))
+    return [list_file for list_file in list_files if list_file in affected]
+
+#Generates and runs the test files of "list_files" and prints the summary.
+#Returns the results.
+def run_suite(list_files, parse_results, test_directory):
+    generation_errcodes = {}
+    results = []
+    result = None
+
+    start = time.perf_counter()
+    for list_file, errcode in gentestfile.run_generation_jobs(list_files, parse_results, test_directory):
+        generation_errcodes[list_file] = errcode
+
+    for list_file in list_files:
+        if generation_errcodes[list_file] != 0:
+            result = TestFileResult(list_file, None)
+            result.error = "Test file generation failed."
+            results.append(result)
+            continue
+        results.extend(get_test_file_results(list_file, test_directory, parse_results.split_groups))
+
+    run_test_files(
+        [result for result in results if result.error is None],
+        parse_results.jobs,
+        timeout = parse_results.timeout,
+        on_result = lambda result: print(
+            "{}: {}".format("PASS" if result.passed() else "FAIL", result.name),
+            flush = True
+        )
+    )
+
+    print()
+    print_summary(results, verbose = parse_results.verbose)
+    print_slowest_calls(results, parse_results.slowest)
+    print("Ran in {:.2f} s with at most {} at once.".format(time.perf_counter() - start, parse_results.jobs))
+    return results
+
+#Reruns the descriptors affected by each batch of changes until interrupted.
+#"watcher", if given, is the FileWatcher to take the changes from, and
+#"max_batches" stops after that many batches; both are for testing.
+#Returns the exit code of the last run.
+def watch(list_files, parse_results, test_directory, last_passed = True, watcher = None, max_batches = None):
+    batch_count = 0
+    changed_paths = None
+    affected = None
+    results = None
+    dependents = get_dependents(list_files, test_directory, parse_results.split_groups)
+    if watcher is None:
+        watcher = file_watcher.FileWatcher(dependents.keys(), poll_interval = parse_results.poll_interval)
+    else:
+        watcher.set_paths(dependents.keys())
+
+    print("Watching {} files for changes. Press Ctrl+C to stop.".format(len(dependents)), flush = True)
+    try:
+        while max_batches is None or batch_count < max_batches:
+            changed_paths = watcher.wait_for_changes()
+            batch_count += 1
+            affected = get_affected_list_files(changed_paths, dependents, list_files)
+            if len(affected) == 0:
+                continue
+
+            print()
+            print("Changed: {}".format(", ".join(sorted(changed_paths))))
+            results = run_suite(affected, parse_results, test_directory)
+            last_passed = all(result.passed() for result in results)
+
+            #The affected descriptors may include other files now.
+            dependents = get_dependents(list_files, test_directory, parse_results.split_groups)
+            watcher.set_paths(dependents.keys())
+            print("Watching {} files for changes. Press Ctrl+C to stop.".format(len(dependents)), flush = True)
+    except KeyboardInterrupt:
+        print()
+    return 0 if last_passed else 1
+
+def main(args):
+    test_directory = gentestfile.get_test_directory()
+    results = None
+
+    parser = build_arg_parser()
+    parse_results = parser.parse_args(args)
+    if parse_results.jobs is None:
+        parse_results.jobs = os.cpu_count() or 1
+    if parse_results.jobs < 1:
+        gentestfile.print_err("\"-j/--jobs\" must be at least 1.")
+        return 1
+    if parse_results.poll_interval <= 0:
+        gentestfile.print_err("\"--poll-interval\" must be positive.")
+        return 1
+
+    errcode, list_files = gentestfile.collect_list_files(parse_results)
+    if errcode != 0:
+        return 1
+    #The generated files include paths as they were resolved from here, but
+    #each runs from its descriptor's directory.
+    list_files = [os.path.abspath(list_file) for list_file in list_files]
+
+    if gentestfile.prepare_test_directory(test_directory) != 0:
+        return 1
+
+    results = run_suite(list_files, parse_results, test_directory)
+    if parse_results.watch:
+        return watch(list_files, parse_results, test_directory, last_passed = all(result.passed() for result in results))
+    return 0 if all(result.passed() for result in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
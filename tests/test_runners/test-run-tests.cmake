@@ -0,0 +1,9 @@
+include(${CMAKE_CURRENT_LIST_DIR}/../../cmake-test-runner.cmake)
+run_tests(
+    TEST_SCRIPT_FILES
+        "${CMAKE_CURRENT_LIST_DIR}/../test_files/test-file.cmake"
+        "${CMAKE_CURRENT_LIST_DIR}/../test_files/test-file-no-setup.cmake"
+        "${CMAKE_CURRENT_LIST_DIR}/../test_files/test-file-no-teardown.cmake"
+    PROJECT_SOURCE_DIR "${CMAKE_CURRENT_LIST_DIR}"
+    JOBS 2
+)
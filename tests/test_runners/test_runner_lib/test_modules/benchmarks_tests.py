@@ -0,0 +1,169 @@
+import importlib
+import json
+import pathlib
+import shutil
+import sys
+import tempfile
+
+import common
+
+sys.path.append(common.scripts_dir.__str__())
+gentestfile = importlib.import_module("generate-test-file")
+benchmarks = importlib.import_module("benchmarks")
+benchmarks_main = importlib.import_module("benchmarks.__main__")
+
+class TestSyntheticDescriptor(common.TestCaseWrapper):
+    def setUp(self):
+        super().setUp()
+        self.work_dir = pathlib.Path(tempfile.mkdtemp())
+        self.list_file = self.work_dir / "synthetic.cmake"
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors = True)
+        super().tearDown()
+
+    def parse(self):
+        context = benchmarks.pipeline.create_context(self.list_file, self.work_dir)
+        return gentestfile.parse_file(gentestfile.ApplicationSingleton(context))
+
+    def test_invalid_shapes(self):
+        for kwargs in ({"line_count": 0}, {"test_group_count": 0}, {"nesting_depth": 0}, {"variable_density": 1.5}):
+            with self.assertRaises(ValueError):
+                benchmarks.DescriptorShape(**kwargs)
+
+    def test_shape(self):
+        shape = benchmarks.DescriptorShape(line_count = 500, test_group_count = 3, nesting_depth = 3)
+        if self.use_breakpoint:
+            breakpoint()
+        line_count = benchmarks.write_descriptor(shape, self.list_file)
+        self.assertGreaterEqual(line_count, 500)
+        with open(self.list_file, 'r') as file:
+            self.assertEqual(len(file.readlines()), line_count)
+
+        parse_status = self.parse()
+        self.assertEqual(sorted(parse_status.test_groups.keys()), ["group_0", "group_1", "group_2"])
+        test_count = sum(len(tests) for tests in parse_status.test_groups.values())
+        self.assertGreater(test_count, 0)
+        self.assertEqual(parse_status.setup_macro, "setup")
+        self.assertEqual(parse_status.teardown_macro, "teardown")
+        #Nested definitions are part of the test macro that contains them:
+        self.assertEqual(len(parse_status.command_definitions), test_count + 2)
+        self.assertEqual(
+            benchmarks.pipeline.scan_command_definitions(self.list_file),
+            3 * test_count + 2
+        )
+
+    def test_same_seed_same_descriptor(self):
+        shape = benchmarks.DescriptorShape(line_count = 200, variable_density = 0.5, seed = 7)
+        other_file = self.work_dir / "other.cmake"
+        benchmarks.write_descriptor(shape, self.list_file)
+        benchmarks.write_descriptor(shape, other_file)
+        self.assertEqual(self.list_file.read_text(), other_file.read_text())
+
+    def test_variable_density(self):
+        benchmarks.write_descriptor(benchmarks.DescriptorShape(line_count = 200, variable_density = 0.0), self.list_file)
+        self.assertNotIn("${", self.list_file.read_text())
+
+        benchmarks.write_descriptor(benchmarks.DescriptorShape(line_count = 200, variable_density = 1.0), self.list_file)
+        body_lines = [line for line in self.list_file.read_text().splitlines() if " step " in line]
+        self.assertGreater(len(body_lines), 0)
+        self.assertTrue(all("${" in line for line in body_lines))
+        #Every reference expands:
+        self.assertTrue(all("${" not in line for line in self.parse().lines))
+
+
+class TestPipelineBenchmarks(common.TestCaseWrapper):
+    def setUp(self):
+        super().setUp()
+        self.work_dir = pathlib.Path(tempfile.mkdtemp())
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors = True)
+        super().tearDown()
+
+    def test_results(self):
+        shape = benchmarks.DescriptorShape(line_count = 300, nesting_depth = 2)
+        if self.use_breakpoint:
+            breakpoint()
+        results = benchmarks.run_benchmarks([shape], self.work_dir, repeats = 2)
+        self.assertEqual(results["repeats"], 2)
+        self.assertEqual(len(results["benchmarks"]), 1)
+
+        result = results["benchmarks"][0]
+        self.assertEqual(result["shape"], shape.to_dict())
+        self.assertEqual(
+            set(result["stages"].keys()),
+            {"parse_file", "generate_file_contents", "command_definition_scan"}
+        )
+        for stage in result["stages"].values():
+            self.assertLessEqual(stage["min_seconds"], stage["median_seconds"])
+            self.assertGreater(stage["lines_per_second"], 0)
+            self.assertGreater(stage["peak_memory_bytes"], 0)
+        self.assertEqual(result["scan_handlers"]["scan_for_add_test_macro"]["calls"], result["test_count"])
+        self.assertEqual(result["scan_handlers"]["scan_for_macro_definition"]["calls"], result["test_count"] + 2)
+
+    def test_main_writes_json(self):
+        output = self.work_dir / "results.json"
+        self.assertEqual(
+            benchmarks_main.main(["--lines", "100", "200", "--depth", "2", "-r", "1", "-o", output.__str__()]),
+            0
+        )
+        with open(output, 'r') as file:
+            results = json.load(file)
+        self.assertEqual([result["shape"]["line_count"] for result in results["benchmarks"]], [100, 200])
+        #Keys are sorted, so results from different runs diff cleanly.
+        self.assertEqual(list(results.keys()), sorted(results.keys()))
+
+    def test_main_rejects_bad_shapes(self):
+        with self.assertRaises(SystemExit):
+            benchmarks_main.main(["--depth", "0"])
+
+
+class TestVarExpansionScaling(common.TestCaseWrapper):
+    def test_fit_power_law(self):
+        sizes = [100, 200, 400, 800]
+        if self.use_breakpoint:
+            breakpoint()
+        linear = benchmarks.complexity.fit_power_law(sizes, [0.5 * size for size in sizes])
+        self.assertAlmostEqual(linear.exponent, 1.0)
+        self.assertAlmostEqual(linear.coefficient, 0.5)
+        self.assertAlmostEqual(linear.predict(1600), 800.0)
+        self.assertFalse(linear.is_superlinear())
+
+        quadratic = benchmarks.complexity.fit_power_law(sizes, [size * size for size in sizes])
+        self.assertAlmostEqual(quadratic.exponent, 2.0)
+        self.assertTrue(quadratic.is_superlinear())
+
+    def test_fit_needs_two_sizes(self):
+        with self.assertRaises(ValueError):
+            benchmarks.complexity.fit_power_law([100, 100], [1.0, 2.0])
+        with self.assertRaises(ValueError):
+            benchmarks.complexity.fit_power_law([100, 200], [1.0])
+
+    #Counts executed lines rather than timing, so that a loaded machine
+    #cannot fail it. "python -m benchmarks.var_expansion" checks run times.
+    def test_expansion_work_grows_linearly(self):
+        for case in benchmarks.var_expansion.SCALING_CASES:
+            with self.subTest(name = case.name):
+                result = benchmarks.var_expansion.run_step_count_case(case)
+                self.assertFalse(
+                    result["superlinear"],
+                    "{} grows with exponent {:.2f}".format(case.name, result["fit"]["exponent"])
+                )
+
+    def test_step_counts_are_deterministic(self):
+        case = benchmarks.var_expansion.SCALING_CASES[2]
+        self.assertEqual(
+            benchmarks.var_expansion.run_step_count_case(case, sizes = (10, 20)),
+            benchmarks.var_expansion.run_step_count_case(case, sizes = (10, 20))
+        )
+
+    def test_timed_results(self):
+        results = benchmarks.var_expansion.run_var_expansion_benchmarks(
+            cases = benchmarks.var_expansion.SCALING_CASES[2:3],
+            sizes = (10, 20),
+            repeats = 1
+        )
+        result = results["benchmarks"]["sibling_references"]
+        self.assertEqual(result["sizes"], [10, 20])
+        self.assertEqual(len(result["min_seconds"]), 2)
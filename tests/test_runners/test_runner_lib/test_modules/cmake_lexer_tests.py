@@ -0,0 +1,110 @@
+import importlib
+import pathlib
+import shutil
+import sys
+import tempfile
+
+import common
+
+sys.path.append(common.scripts_dir.__str__())
+gentestfile = importlib.import_module("generate-test-file")
+from cmake_local.language_parsing import cmake_lexer
+
+class TestCMakeLexer(common.TestCaseWrapper):
+    def lex(self, source):
+        return list(cmake_lexer.iter_invocations(source.splitlines(keepends = True)))
+
+    def test_single_line_invocation(self):
+        invocations = self.lex('include("${CMAKE_CURRENT_LIST_DIR}/a.cmake")\n')
+        if self.use_breakpoint:
+            breakpoint()
+        self.assertEqual(len(invocations), 1)
+        self.assertEqual(invocations[0].name, "include")
+        self.assertEqual(invocations[0].get_argument_values(), ["${CMAKE_CURRENT_LIST_DIR}/a.cmake"])
+        self.assertEqual(invocations[0].arguments[0].argument_type, cmake_lexer.CMakeArgumentType.QUOTED)
+
+    def test_multi_line_invocation_with_comments(self):
+        invocations = self.lex(
+            "# A line comment with add_test_macro(MACRO_NAME nope)\n"
+            "add_test_macro(\n"
+            "    MACRO_NAME my_test # The macro to run\n"
+            "    #[[ A bracket comment\n"
+            "        spanning lines ]] TEST_GROUP \"my group\"\n"
+            ")\n"
+        )
+        self.assertEqual(len(invocations), 1)
+        self.assertEqual(invocations[0].get_argument_values(), ["MACRO_NAME", "my_test", "TEST_GROUP", "my group"])
+        self.assertEqual((invocations[0].start_line, invocations[0].end_line), (1, 5))
+
+    def test_bracket_and_quoted_arguments(self):
+        invocations = self.lex(
+            'set(X [==[\n'
+            'keeps ]] and "quotes"]==] "a \\" quote\n'
+            'and a newline" unquoted\\ argument)\n'
+        )
+        self.assertEqual(
+            invocations[0].get_argument_values(),
+            ["X", 'keeps ]] and "quotes"', 'a \\" quote\nand a newline', "unquoted\\ argument"]
+        )
+
+    def test_nested_parentheses(self):
+        invocations = self.lex("if((A OR B) AND C)\nendif()\n")
+        self.assertEqual([invocation.name for invocation in invocations], ["if", "endif"])
+        self.assertEqual(invocations[0].get_argument_values(), ["A", "OR", "B", "AND", "C"])
+
+    def test_unterminated_invocation(self):
+        with self.assertRaises(cmake_lexer.CMakeLexError):
+            self.lex("add_test_macro(MACRO_NAME test\n")
+
+    def test_garbage_at_top_level(self):
+        with self.assertRaises(cmake_lexer.CMakeLexError):
+            self.lex("this is not cmake\n")
+
+
+class TestLexedDescriptorScan(common.TestCaseWrapper):
+    def setUp(self):
+        super().setUp()
+        self.work_dir = pathlib.Path(tempfile.mkdtemp())
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors = True)
+        super().tearDown()
+
+    def parse(self, contents):
+        list_file = self.work_dir / "descriptor.cmake"
+        with open(list_file, 'w') as file:
+            file.write(contents)
+        context = gentestfile.cmake_helper.CMakeScriptContext(
+            list_file = list_file.__str__(),
+            build_dir = self.work_dir.__str__(),
+            source_dir = self.work_dir.__str__(),
+            project_source_dir = self.work_dir.__str__()
+        )
+        return gentestfile.parse_file(gentestfile.ApplicationSingleton(context))
+
+    def test_real_world_formatting(self):
+        parse_status = self.parse(
+            "INCLUDE(\n"
+            "    \"${CMAKE_CURRENT_LIST_DIR}/helpers.cmake\" # Shared helpers\n"
+            ")\n"
+            "function(outer)\n"
+            "    function(inner)\n"
+            "    endfunction()\n"
+            "endfunction()\n"
+            "add_setup_macro(MACRO_NAME\n"
+            "    setup)\n"
+            "add_test_macro(\n"
+            "    TEST_GROUP group # Keywords in any order\n"
+            "    MACRO_NAME [[test_one]]\n"
+            ")\n"
+        )
+        if self.use_breakpoint:
+            breakpoint()
+        self.assertEqual(parse_status.include_paths, [(self.work_dir / "helpers.cmake").__str__()])
+        self.assertEqual(parse_status.command_definitions, [(3, 6)])
+        self.assertEqual(parse_status.setup_macro, "setup")
+        self.assertEqual(parse_status.test_groups, {"group": {"test_one": True}})
+
+    def test_missing_macro_name(self):
+        with self.assertRaises(gentestfile.TestDescriptorFileParseError):
+            self.parse("add_test_macro(TEST_GROUP group)\n")
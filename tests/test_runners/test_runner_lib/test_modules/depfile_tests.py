@@ -0,0 +1,163 @@
+import importlib
+import os
+import pathlib
+import shutil
+import sys
+import tempfile
+
+import common
+
+sys.path.append(common.scripts_dir.__str__())
+gentestfile = importlib.import_module("generate-test-file")
+depfile = importlib.import_module("depfile")
+
+class TestDepfileFormat(common.TestCaseWrapper):
+    def test_escape_path(self):
+        if self.use_breakpoint:
+            breakpoint()
+        self.assertEqual(depfile.escape_path("/a b/c#d/$e"), "/a\\ b/c\\#d/$$e")
+        self.assertEqual(depfile.escape_path(pathlib.PurePosixPath("/plain/path")), "/plain/path")
+
+    def test_format_depfile(self):
+        self.assertEqual(
+            depfile.format_depfile(["out.cmake"], ["a.cmake", "my include.cmake", "a.cmake"]),
+            "out.cmake: \\\n  a.cmake \\\n  my\\ include.cmake\n"
+        )
+        self.assertEqual(depfile.format_depfile(["a", "b"], []), "a b:\n")
+
+
+class TestWriteDepfile(common.TestCaseWrapper):
+    def setUp(self):
+        super().setUp()
+        self.work_dir = pathlib.Path(tempfile.mkdtemp())
+        self.target = self.work_dir / "target.cmake"
+        self.dependency = self.work_dir / "dependency.cmake"
+        self.target.write_text("target\n")
+        self.dependency.write_text("dependency\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors = True)
+        super().tearDown()
+
+    def test_targets_are_not_touched(self):
+        os.utime(self.target, ns = (1000000000, 1000000000))
+        if self.use_breakpoint:
+            breakpoint()
+        depfile.write_depfile(self.work_dir / "target.d", [self.target], [self.dependency])
+        self.assertEqual(self.target.stat().st_mtime_ns, 1000000000)
+
+    def test_stamp_is_first_target_and_touched(self):
+        path = self.work_dir / "target.d"
+        stamp = self.work_dir / "stamps" / "target.stamp"
+        depfile.write_depfile(path, [self.target], [self.dependency], stamp_path = stamp)
+        self.assertTrue(path.read_text().startswith("{} {}:".format(stamp, self.target)))
+        os.utime(stamp, ns = (1000000000, 1000000000))
+        os.utime(self.target, ns = (1000000000, 1000000000))
+        depfile.write_depfile(path, [self.target], [self.dependency], stamp_path = stamp)
+        self.assertGreaterEqual(stamp.stat().st_mtime_ns, self.dependency.stat().st_mtime_ns)
+        self.assertEqual(self.target.stat().st_mtime_ns, 1000000000)
+
+    def test_unchanged_depfile_is_not_rewritten(self):
+        path = self.work_dir / "deps" / "target.d"
+        depfile.write_depfile(path, [self.target], [self.dependency])
+        os.utime(path, ns = (1000000000, 1000000000))
+        depfile.write_depfile(path, [self.target], [self.dependency])
+        self.assertEqual(path.stat().st_mtime_ns, 1000000000)
+
+
+class TestGenerationDepfile(common.TestCaseWrapper):
+    def setUp(self):
+        super().setUp()
+        self.work_dir = pathlib.Path(tempfile.mkdtemp())
+        self.test_output_dir = common.scripts_dir / "tests"
+        self.include_file = self.work_dir / "depfile-test-include.cmake"
+        self.descriptor = self.work_dir / "test-file-depfile-{}.cmake".format(os.getpid())
+        self.test_file = self.test_output_dir / self.descriptor.name
+        self.depfile_path = self.work_dir / "generated" / "test-file.d"
+        self.cmake_test_file = common.project_base_dir / "cmake-test.cmake"
+        self.bundle_name = "depfile-bundle-{}.cmake".format(os.getpid())
+
+        self.include_file.write_text('message(STATUS "Included.")\n')
+        with open(self.descriptor, 'w') as file:
+            file.write(
+                'include("{}")\n'.format(self.cmake_test_file.as_posix()) +
+                'include("{}")\n'.format(self.include_file.as_posix()) +
+                'macro(test)\n' +
+                '    message(STATUS "I am the test.")\n' +
+                'endmacro()\n' +
+                'add_test_macro(MACRO_NAME test)\n'
+            )
+
+        self.args = [
+            "-b", (common.test_helper_dir / "build").__str__(),
+            "-c", common.project_base_dir.__str__(),
+            "--depfile", self.depfile_path.__str__()
+        ]
+
+    def tearDown(self):
+        for path in (self.test_file, self.test_output_dir / self.bundle_name):
+            path.unlink(missing_ok = True)
+            pathlib.Path("{}.manifest.json".format(path)).unlink(missing_ok = True)
+        shutil.rmtree(self.work_dir, ignore_errors = True)
+        super().tearDown()
+
+    def read_rule(self):
+        lines = self.depfile_path.read_text().replace(" \\\n", "").splitlines()
+        self.assertEqual(len(lines), 1)
+        targets, dependencies = lines[0].split(":", 1)
+        return targets.split(), dependencies.split()
+
+    def test_descriptor_includes_and_cmake_test_are_listed(self):
+        if self.use_breakpoint:
+            breakpoint()
+        self.assertEqual(gentestfile.main(self.args + [self.descriptor.__str__()]), 0)
+        targets, dependencies = self.read_rule()
+        self.assertEqual(targets, [os.path.abspath(self.test_file)])
+        self.assertEqual(
+            dependencies,
+            [self.descriptor.__str__(), self.include_file.__str__(), self.cmake_test_file.__str__()]
+        )
+
+    def test_up_to_date_output_keeps_its_mtime(self):
+        self.assertEqual(gentestfile.main(self.args + [self.descriptor.__str__()]), 0)
+        #Touching the include leaves the generated file unchanged:
+        os.utime(self.test_file, ns = (1000000000, 1000000000))
+        self.include_file.write_text('message(STATUS "Included.")\n')
+        self.assertEqual(gentestfile.main(self.args + [self.descriptor.__str__()]), 0)
+        self.assertEqual(self.test_file.stat().st_mtime_ns, 1000000000)
+
+    def test_stamp_is_newer_than_inputs(self):
+        stamp = self.work_dir / "generated" / "test-file.stamp"
+        args = self.args + ["--stamp", stamp.__str__(), self.descriptor.__str__()]
+        self.assertEqual(gentestfile.main(args), 0)
+        os.utime(stamp, ns = (1000000000, 1000000000))
+        self.include_file.write_text('message(STATUS "Included.")\n')
+        self.assertEqual(gentestfile.main(args), 0)
+        self.assertGreaterEqual(stamp.stat().st_mtime_ns, self.include_file.stat().st_mtime_ns)
+        targets, _ = self.read_rule()
+        self.assertEqual(targets, [stamp.__str__(), os.path.abspath(self.test_file)])
+
+    def test_stamp_requires_depfile(self):
+        with self.assertRaises(SystemExit):
+            gentestfile.main([
+                "-b", (common.test_helper_dir / "build").__str__(),
+                "-c", common.project_base_dir.__str__(),
+                "--stamp", (self.work_dir / "test-file.stamp").__str__(),
+                self.descriptor.__str__()
+            ])
+
+    def test_bundle(self):
+        self.assertEqual(
+            gentestfile.main(self.args + ["--bundle", self.bundle_name, self.descriptor.__str__()]),
+            0
+        )
+        targets, dependencies = self.read_rule()
+        self.assertEqual(targets, [os.path.abspath(self.test_output_dir / self.bundle_name)])
+        self.assertEqual(
+            dependencies,
+            [self.descriptor.__str__(), self.include_file.__str__(), self.cmake_test_file.__str__()]
+        )
+
+    def test_lint_only_is_rejected(self):
+        with self.assertRaises(SystemExit):
+            gentestfile.main(self.args + ["--lint-only", self.work_dir.__str__()])
@@ -0,0 +1,134 @@
+import importlib
+import pathlib
+import shutil
+import subprocess
+import sys
+import tempfile
+
+import common
+
+sys.path.append(common.scripts_dir.__str__())
+gentestfile = importlib.import_module("generate-test-file")
+descriptor_bundle = importlib.import_module("descriptor_bundle")
+
+class TestCommandNamespace(common.TestCaseWrapper):
+    def test_definitions_and_calls_are_renamed(self):
+        definitions = [
+            ["macro(setup)\n", "    helper()\n", "    message(STATUS \"setup()\")\n", "endmacro()\n"],
+            ["function(\n", "    Helper ARG)\n", "  if(COMMAND helper)\n", "  endif()\n", "endfunction()\n"],
+            ["macro(\"quoted\")\n", "    SETUP()\n", "endmacro()\n"]
+        ]
+        namespace = descriptor_bundle.CommandNamespace.from_definitions("bundle_3_", definitions)
+        if self.use_breakpoint:
+            breakpoint()
+        self.assertEqual(
+            namespace.rename_lines(definitions[0]),
+            ["macro(bundle_3_setup)\n", "    bundle_3_helper()\n", "    message(STATUS \"setup()\")\n", "endmacro()\n"]
+        )
+        #Only calls are renamed, not other references to the command.
+        self.assertEqual(
+            namespace.rename_lines(definitions[1]),
+            ["function(\n", "    bundle_3_Helper ARG)\n", "  if(COMMAND helper)\n", "  endif()\n", "endfunction()\n"]
+        )
+        self.assertEqual(
+            namespace.rename_lines(definitions[2]),
+            ["macro(\"bundle_3_quoted\")\n", "    bundle_3_SETUP()\n", "endmacro()\n"]
+        )
+        self.assertEqual(namespace.get_name("Setup"), "bundle_3_Setup")
+        self.assertEqual(namespace.get_name("message"), "message")
+
+    def test_parse_bundle_output(self):
+        output = "\n".join([
+            "-- " + descriptor_bundle.BEGIN_MARKER + "a.cmake",
+            "-- some test output",
+            "-- " + descriptor_bundle.PASS_MARKER + "a.cmake",
+            "-- " + descriptor_bundle.BEGIN_MARKER + "b.cmake",
+            "CMake Error at bundle.cmake:12 (message):"
+        ])
+        self.assertEqual(
+            descriptor_bundle.parse_bundle_output(output, ["a.cmake", "b.cmake", "c.cmake"]),
+            {
+                "a.cmake": descriptor_bundle.DescriptorResult.PASS,
+                "b.cmake": descriptor_bundle.DescriptorResult.FAIL,
+                "c.cmake": descriptor_bundle.DescriptorResult.NOT_RUN
+            }
+        )
+
+
+class TestBundleGeneration(common.TestCaseWrapper):
+    def setUp(self):
+        super().setUp()
+        self.work_dir = pathlib.Path(tempfile.mkdtemp())
+        self.test_output_dir = common.scripts_dir / "tests"
+        self.bundle_name = "descriptor-bundle-test.cmake"
+        self.cmake_test_file = (common.project_base_dir / "cmake-test.cmake").as_posix()
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors = True)
+        (self.test_output_dir / self.bundle_name).unlink(missing_ok = True)
+        super().tearDown()
+
+    #Every descriptor defines the same commands, each printing its own name.
+    def write_descriptor(self, name, test_body = ""):
+        path = self.work_dir / name
+        with open(path, 'w') as file:
+            file.write('include("{}")\n'.format(self.cmake_test_file))
+            file.write('macro(setup)\n    message(STATUS "setup {}")\nendmacro()\n'.format(name))
+            file.write('macro(test)\n    say()\n{}endmacro()\n'.format(test_body))
+            file.write('function(say)\n    message(STATUS "test {}")\nendfunction()\n'.format(name))
+            file.write('add_setup_macro(MACRO_NAME setup)\nadd_test_macro(MACRO_NAME test)\n')
+        return path
+
+    def generate_and_run(self, descriptors):
+        prog_args = [
+            "-b", (common.test_helper_dir / "build").__str__(),
+            "-c", common.project_base_dir.__str__(),
+            "--bundle", self.bundle_name
+        ]
+        prog_args.extend([descriptor.__str__() for descriptor in descriptors])
+        if self.use_breakpoint:
+            breakpoint()
+        self.assertEqual(gentestfile.main(prog_args), 0)
+        return subprocess.run(
+            ["cmake", "-P", (self.test_output_dir / self.bundle_name).__str__()],
+            capture_output = True,
+            text = True
+        )
+
+    def test_descriptors_do_not_collide(self):
+        descriptors = [self.write_descriptor("first.cmake"), self.write_descriptor("second.cmake")]
+        cmake_process = self.generate_and_run(descriptors)
+        self.assertEqual(cmake_process.returncode, 0)
+        self.assertLess(
+            cmake_process.stdout.index("-- setup first.cmake\n-- test first.cmake\n"),
+            cmake_process.stdout.index("-- setup second.cmake\n-- test second.cmake\n")
+        )
+        results = descriptor_bundle.parse_bundle_output(cmake_process.stdout, descriptors)
+        self.assertEqual(set(results.values()), {descriptor_bundle.DescriptorResult.PASS})
+
+    def test_failing_descriptor_is_reported(self):
+        descriptors = [
+            self.write_descriptor("first.cmake"),
+            self.write_descriptor("second.cmake", test_body = '    message(FATAL_ERROR "Broken.")\n'),
+            self.write_descriptor("third.cmake")
+        ]
+        cmake_process = self.generate_and_run(descriptors)
+        self.assertNotEqual(cmake_process.returncode, 0)
+        results = descriptor_bundle.parse_bundle_output(cmake_process.stdout, descriptors)
+        self.assertEqual(
+            [results[descriptor.__str__()] for descriptor in descriptors],
+            [
+                descriptor_bundle.DescriptorResult.PASS,
+                descriptor_bundle.DescriptorResult.FAIL,
+                descriptor_bundle.DescriptorResult.NOT_RUN
+            ]
+        )
+
+    def test_bundle_rejects_context(self):
+        source_dir = common.project_base_dir.__str__()
+        with self.assertRaises(SystemExit):
+            gentestfile.main([
+                "--bundle", self.bundle_name,
+                "--context", "bundle-debug", self.work_dir.__str__(), source_dir, source_dir,
+                self.write_descriptor("first.cmake").__str__()
+            ])
@@ -0,0 +1,98 @@
+import importlib
+import io
+import pathlib
+import shutil
+import sys
+import tempfile
+
+import common
+
+sys.path.append(common.scripts_dir.__str__())
+gentestfile = importlib.import_module("generate-test-file")
+descriptor_reader = importlib.import_module("descriptor_reader")
+import development.exceptions
+
+class TestDescriptorLineReader(common.TestCaseWrapper):
+    def get_reader(self, line_count, transform = None):
+        return descriptor_reader.DescriptorLineReader(
+            io.StringIO("".join("line {}\n".format(i) for i in range(line_count))),
+            transform = transform
+        )
+
+    def test_lines_are_read_lazily(self):
+        reader = self.get_reader(100)
+        if self.use_breakpoint:
+            breakpoint()
+        self.assertEqual(reader[2], "line 2\n")
+        self.assertEqual(len(reader.window), 3)
+        self.assertTrue(reader.has_line(99))
+        self.assertFalse(reader.has_line(100))
+        with self.assertRaises(IndexError):
+            reader[100]
+
+    def test_released_lines_are_dropped(self):
+        reader = self.get_reader(10)
+        reader[5]
+        reader.release_before(4)
+        self.assertEqual(reader.window, ["line 4\n", "line 5\n"])
+        with self.assertRaises(development.exceptions.DevelopmentError):
+            reader[3]
+
+    def test_retained_lines_survive_release(self):
+        reader = self.get_reader(10, transform = str.upper)
+        reader.retain(2, 3)
+        reader.release_before(8)
+        self.assertEqual(reader[2], "LINE 2\n")
+        self.assertEqual(reader[3], "LINE 3\n")
+        self.assertEqual(list(reader.copy_retained(transform = str.lower)), ["line 2\n", "line 3\n"])
+
+
+class TestStreamingParse(common.TestCaseWrapper):
+    def setUp(self):
+        super().setUp()
+        self.work_dir = pathlib.Path(tempfile.mkdtemp())
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors = True)
+        super().tearDown()
+
+    def get_generated_descriptor(self, block_count):
+        list_file = self.work_dir / "descriptor-{}.cmake".format(block_count)
+        with open(list_file, 'w') as file:
+            for i in range(block_count):
+                file.write("#Block {0}\nmessage(STATUS \"${{CMAKE_BUILD_DIR}}\")\nmacro(test_{0})\n    message(STATUS \"{0}\")\nendmacro()\nadd_test_macro(MACRO_NAME test_{0})\n".format(i))
+
+        context = gentestfile.cmake_helper.CMakeScriptContext(
+            list_file = list_file.__str__(),
+            build_dir = self.work_dir.__str__(),
+            source_dir = self.work_dir.__str__(),
+            project_source_dir = self.work_dir.__str__()
+        )
+        return gentestfile.ApplicationSingleton(context)
+
+    def test_window_does_not_grow_with_the_descriptor(self):
+        small = gentestfile.parse_descriptor_template(self.get_generated_descriptor(10))
+        large = gentestfile.parse_descriptor_template(self.get_generated_descriptor(500))
+        if self.use_breakpoint:
+            breakpoint()
+        self.assertEqual(small.lines.peak_window_size, large.lines.peak_window_size)
+        #Only the command definitions are kept.
+        self.assertEqual(len(large.lines.retained), 500 * 3)
+        self.assertEqual(len(large.command_definitions), 500)
+        self.assertEqual(len(large.test_groups), 500)
+
+    def test_only_used_lines_are_expanded(self):
+        app_singleton = self.get_generated_descriptor(20)
+        expanded = []
+        saved_resolve_vars = app_singleton.context.resolve_vars
+
+        def recording_resolve_vars(input, no_fail = False):
+            expanded.append(input)
+            return saved_resolve_vars(input, no_fail = no_fail)
+        app_singleton.context.resolve_vars = recording_resolve_vars
+
+        parse_status = gentestfile.parse_file(app_singleton)
+        self.assertEqual(len(parse_status.command_definitions), 20)
+        #The "message()" lines outside the macros are never expanded.
+        self.assertFalse(any("CMAKE_BUILD_DIR" in input for input in expanded))
+        self.assertFalse(any(input.startswith("#Block") for input in expanded))
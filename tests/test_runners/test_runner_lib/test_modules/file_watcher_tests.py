@@ -0,0 +1,101 @@
+import importlib
+import os
+import pathlib
+import shutil
+import sys
+import tempfile
+
+import common
+
+sys.path.append(common.scripts_dir.__str__())
+file_watcher = importlib.import_module("file_watcher")
+
+class FakeTime:
+    #Advances the clock on every sleep and runs the edits scheduled for it.
+    def __init__(self):
+        self.now = 0.0
+        self.sleep_count = 0
+        self.edits = {}
+
+    def clock(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+        self.sleep_count += 1
+        for edit in self.edits.pop(self.sleep_count, ()):
+            edit()
+
+class TestFileWatcher(common.TestCaseWrapper):
+    def setUp(self):
+        super().setUp()
+        self.work_dir = pathlib.Path(tempfile.mkdtemp())
+        self.first = self.work_dir / "first.cmake"
+        self.second = self.work_dir / "second.cmake"
+        self.missing = self.work_dir / "missing.cmake"
+        self.mtime = 1000000000
+        for path in (self.first, self.second):
+            self.write(path, "message(STATUS \"{}\")\n".format(path.name))
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors = True)
+        super().tearDown()
+
+    #Every write gets a later mtime, however coarse the file system clock.
+    def write(self, path, contents):
+        with open(path, 'w') as file:
+            file.write(contents)
+        self.mtime += 1
+        os.utime(path, (self.mtime, self.mtime))
+
+    def test_snapshot(self):
+        if self.use_breakpoint:
+            breakpoint()
+        snapshot = file_watcher.take_snapshot([self.first, self.missing])
+        self.assertEqual(set(snapshot.keys()), {self.first.__str__(), self.missing.__str__()})
+        self.assertEqual(snapshot[self.first.__str__()][1], self.first.stat().st_size)
+        self.assertIsNone(snapshot[self.missing.__str__()])
+        self.assertIsNone(file_watcher.take_snapshot([self.work_dir / "gone" / "x.cmake"])[(self.work_dir / "gone" / "x.cmake").__str__()])
+
+    def test_poll(self):
+        watcher = file_watcher.FileWatcher([self.first, self.second, self.missing])
+        self.assertEqual(watcher.poll(), set())
+
+        self.write(self.first, "changed\n")
+        self.write(self.missing, "created\n")
+        self.assertEqual(watcher.poll(), {self.first.__str__(), self.missing.__str__()})
+        self.assertEqual(watcher.poll(), set())
+
+        os.remove(self.second)
+        self.assertEqual(watcher.poll(), {self.second.__str__()})
+
+    def test_changes_made_before_set_paths_are_kept(self):
+        watcher = file_watcher.FileWatcher([self.first])
+        self.write(self.first, "changed\n")
+        watcher.set_paths([self.first, self.second])
+        self.assertEqual(watcher.get_paths(), {self.first.__str__(), self.second.__str__()})
+        self.assertEqual(watcher.poll(), {self.first.__str__()})
+
+        watcher.set_paths([self.second])
+        self.write(self.first, "changed again\n")
+        self.assertEqual(watcher.poll(), set())
+
+    def test_changes_are_batched(self):
+        fake_time = FakeTime()
+        watcher = file_watcher.FileWatcher(
+            [self.first, self.second],
+            poll_interval = 0.5,
+            settle_time = 1.0,
+            sleep = fake_time.sleep,
+            clock = fake_time.clock
+        )
+        #Nothing for two polls, then a change, another one before the files
+        #settle, and nothing after.
+        fake_time.edits[3] = [lambda: self.write(self.first, "one\n")]
+        fake_time.edits[5] = [lambda: self.write(self.second, "two\n")]
+        fake_time.edits[12] = [lambda: self.write(self.first, "too late\n")]
+        if self.use_breakpoint:
+            breakpoint()
+        self.assertEqual(watcher.wait_for_changes(), {self.first.__str__(), self.second.__str__()})
+        self.assertEqual(fake_time.sleep_count, 7)
+        self.assertEqual(watcher.wait_for_changes(), {self.first.__str__()})
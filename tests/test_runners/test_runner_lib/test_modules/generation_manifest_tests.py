@@ -0,0 +1,162 @@
+import importlib
+import os
+import pathlib
+import shutil
+import sys
+import tempfile
+
+import common
+
+sys.path.append(common.scripts_dir.__str__())
+gentestfile = importlib.import_module("generate-test-file")
+generation_manifest = importlib.import_module("generation_manifest")
+
+class TestIncrementalGeneration(common.TestCaseWrapper):
+    ENV_VAR = "CMAKE_TEST_MANIFEST_TEST_DIR"
+
+    def setUp(self):
+        super().setUp()
+        self.work_dir = pathlib.Path(tempfile.mkdtemp())
+        self.test_output_dir = common.scripts_dir / "tests"
+        self.include_file = self.work_dir / "manifest-test-include.cmake"
+        self.descriptor = self.work_dir / "test-file-manifest-{}.cmake".format(os.getpid())
+        self.test_file = self.test_output_dir / self.descriptor.name
+        self.manifest_file = generation_manifest.get_manifest_path(self.test_file)
+
+        self.write_include('message(STATUS "First version.")\n')
+        with open(self.descriptor, 'w') as file:
+            file.write(
+                'include("{}")\n'.format((common.project_base_dir / "cmake-test.cmake").as_posix()) +
+                'include("$ENV{' + self.ENV_VAR + '}/manifest-test-include.cmake")\n' +
+                'macro(test)\n' +
+                '    message(STATUS "I am the test.")\n' +
+                'endmacro()\n' +
+                'add_test_macro(MACRO_NAME test)\n'
+            )
+        os.environ[self.ENV_VAR] = self.work_dir.__str__()
+
+        self.args = [
+            "-b", (common.test_helper_dir / "build").__str__(),
+            "-c", common.project_base_dir.__str__(),
+            self.descriptor.__str__()
+        ]
+
+    def tearDown(self):
+        os.environ.pop(self.ENV_VAR, None)
+        self.test_file.unlink(missing_ok = True)
+        self.manifest_file.unlink(missing_ok = True)
+        shutil.rmtree(self.work_dir, ignore_errors = True)
+        super().tearDown()
+
+    def write_include(self, contents):
+        with open(self.include_file, 'w') as file:
+            file.write(contents)
+
+    def generate(self, extra_args = None):
+        args = self.args if extra_args is None else extra_args + self.args
+        self.assertEqual(gentestfile.main(args), 0)
+        return self.test_file.stat().st_mtime_ns
+
+    def test_manifest_written(self):
+        self.generate()
+        manifest = generation_manifest.load_manifest(self.manifest_file)
+        self.assertIsNotNone(manifest)
+        self.assertEqual(manifest["includes"], [self.include_file.__str__()])
+        self.assertEqual(manifest["env_vars"], [self.ENV_VAR])
+
+    def test_unchanged_inputs_skip_generation(self):
+        first = self.generate()
+        if self.use_breakpoint:
+            breakpoint()
+        second = self.generate()
+        self.assertEqual(first, second)
+
+    def test_force_regenerates(self):
+        self.generate()
+        os.utime(self.manifest_file, ns = (0, 0))
+        self.generate(["--force"])
+        self.assertNotEqual(self.manifest_file.stat().st_mtime_ns, 0)
+
+    def test_identical_output_keeps_its_mtime(self):
+        first = self.generate()
+        os.utime(self.test_file, ns = (first - 10**9, first - 10**9))
+        second = self.generate(["--force"])
+        self.assertEqual(first - 10**9, second)
+        self.assertEqual(list(self.test_output_dir.glob(self.test_file.name + ".*.tmp")), [])
+
+    def test_changed_output_is_replaced(self):
+        self.generate()
+        with open(self.test_file, 'w') as file:
+            file.write("Stale contents\n")
+        self.generate(["--force"])
+        with open(self.test_file, 'r') as file:
+            self.assertIn("I am the test.", file.read())
+
+    def test_changed_include_triggers_regeneration(self):
+        self.generate()
+        manifest_before = generation_manifest.load_manifest(self.manifest_file)
+        self.write_include('message(STATUS "Second version.")\n')
+        self.generate()
+        manifest_after = generation_manifest.load_manifest(self.manifest_file)
+        self.assertNotEqual(manifest_before["input_digest"], manifest_after["input_digest"])
+
+    def test_changed_env_var_triggers_regeneration(self):
+        self.generate()
+        other_dir = self.work_dir / "other"
+        other_dir.mkdir()
+        shutil.copy(self.include_file, other_dir / self.include_file.name)
+        os.environ[self.ENV_VAR] = other_dir.__str__()
+        self.generate()
+        with open(self.test_file, 'r') as file:
+            self.assertIn(other_dir.__str__(), file.read())
+
+    def test_modified_output_triggers_regeneration(self):
+        self.generate()
+        with open(self.test_file, 'w') as file:
+            file.write("# Edited by hand.\n")
+        self.generate()
+        with open(self.test_file, 'r') as file:
+            self.assertIn("test()", file.read())
+
+    def test_changed_generator_triggers_regeneration(self):
+        self.generate()
+        os.utime(self.manifest_file, ns = (0, 0))
+        saved_digest = gentestfile.GENERATOR_DIGEST
+        gentestfile.GENERATOR_DIGEST = "digest of an edited generator"
+        try:
+            if self.use_breakpoint:
+                breakpoint()
+            self.generate()
+        finally:
+            gentestfile.GENERATOR_DIGEST = saved_digest
+        self.assertNotEqual(self.manifest_file.stat().st_mtime_ns, 0)
+        self.assertEqual(
+            generation_manifest.load_manifest(self.manifest_file)["generator_digest"],
+            "digest of an edited generator"
+        )
+
+
+class TestGeneratorDigest(common.TestCaseWrapper):
+    def test_sources_include_modules_imported_later(self):
+        sources = gentestfile.get_generator_sources()
+        if self.use_breakpoint:
+            breakpoint()
+        for name in (
+            "generate-test-file.py",
+            "descriptor_reader.py",
+            "depfile.py",
+            "cmake_local/language_parsing/var_expansion_parsing.py",
+            "development/exceptions.py"
+        ):
+            self.assertIn(common.scripts_dir / name, sources)
+
+    def test_edited_module_changes_digest(self):
+        work_dir = pathlib.Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, work_dir, ignore_errors = True)
+        modules = [work_dir / "a.py", work_dir / "b.py"]
+        for module in modules:
+            module.write_text("VALUE = 1\n")
+        before = generation_manifest.hash_files(modules)
+        self.assertEqual(generation_manifest.hash_files(modules), before)
+        modules[1].write_text("VALUE = 2\n")
+        self.assertNotEqual(generation_manifest.hash_files(modules), before)
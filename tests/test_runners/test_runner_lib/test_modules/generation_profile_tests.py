@@ -0,0 +1,139 @@
+import importlib
+import json
+import pathlib
+import shutil
+import sys
+import tempfile
+
+import common
+
+sys.path.append(common.scripts_dir.__str__())
+gentestfile = importlib.import_module("generate-test-file")
+generation_profile = importlib.import_module("generation_profile")
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class TestGenerationProfile(common.TestCaseWrapper):
+    def setUp(self):
+        super().setUp()
+        self.clock = FakeClock()
+        self.saved_perf_counter = generation_profile.time.perf_counter
+        generation_profile.time.perf_counter = self.clock
+
+    def tearDown(self):
+        generation_profile.time.perf_counter = self.saved_perf_counter
+        super().tearDown()
+
+    def test_nested_phases_are_charged_exclusively(self):
+        profile = generation_profile.GenerationProfile()
+        if self.use_breakpoint:
+            breakpoint()
+        with profile.phase(generation_profile.SCAN):
+            self.clock.now += 1.0
+            with profile.phase(generation_profile.FILE_READ):
+                self.clock.now += 2.0
+            self.clock.now += 4.0
+        self.clock.now += 8.0
+        profile.finish()
+
+        report = profile.to_dict()
+        self.assertEqual(report["wall_time"], 15.0)
+        self.assertEqual(report["phases"][generation_profile.SCAN], 5.0)
+        self.assertEqual(report["phases"][generation_profile.FILE_READ], 2.0)
+        self.assertEqual(report["phases"]["other"], 8.0)
+
+    def test_slowest_resolve_vars_calls_are_kept(self):
+        profile = generation_profile.GenerationProfile()
+        for i in range(generation_profile.SLOWEST_CALL_COUNT + 5):
+            profile.record_resolve_vars("input {}".format(i), float(i))
+
+        report = profile.to_dict()["resolve_vars"]
+        self.assertEqual(report["calls"], generation_profile.SLOWEST_CALL_COUNT + 5)
+        self.assertEqual(len(report["slowest"]), generation_profile.SLOWEST_CALL_COUNT)
+        self.assertEqual(report["slowest"][0], {"seconds": float(generation_profile.SLOWEST_CALL_COUNT + 4), "input": "input 24"})
+
+    def test_helpers_do_nothing_without_a_profile(self):
+        resolve_vars = lambda string, no_fail = False: string
+        self.assertIs(generation_profile.wrap_resolve_vars(resolve_vars), resolve_vars)
+        with generation_profile.phase(generation_profile.LINT):
+            pass
+
+
+class TestProfileOption(common.TestCaseWrapper):
+    def setUp(self):
+        super().setUp()
+        self.work_dir = pathlib.Path(tempfile.mkdtemp())
+        self.report_path = self.work_dir / "profile.json"
+        self.prog_args = [
+            "--force",
+            "--no-lint-cache",
+            "--profile", self.report_path.__str__(),
+            "-b", (common.test_helper_dir / "build").__str__(),
+            "-c", common.project_base_dir.__str__(),
+            (common.test_file_dir / "test-file.cmake").__str__()
+        ]
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors = True)
+        super().tearDown()
+
+    def load_report(self):
+        with open(self.report_path, 'r') as file:
+            return json.load(file)
+
+    def test_report(self):
+        if self.use_breakpoint:
+            breakpoint()
+        self.assertEqual(gentestfile.main(self.prog_args), 0)
+        report = self.load_report()
+        self.assertEqual(set(report["phases"].keys()), set(generation_profile.PHASES) | {"other"})
+        self.assertGreater(report["phases"][generation_profile.LINT], 0)
+        self.assertGreater(report["phases"][generation_profile.SCAN], 0)
+        self.assertAlmostEqual(sum(report["phases"].values()), report["wall_time"], places = 6)
+        self.assertEqual(report["scan_handlers"]["scan_for_add_test_macro"]["calls"], 5)
+        self.assertEqual(report["scan_handlers"]["scan_for_macro_definition"]["calls"], 7)
+        self.assertGreater(report["resolve_vars"]["calls"], 0)
+        self.assertIsNone(report["tracemalloc_peak_bytes"])
+        self.assertIsNone(report["cprofile"])
+
+    def test_optional_sections(self):
+        self.assertEqual(gentestfile.main(["--profile-memory", "--profile-cprofile"] + self.prog_args), 0)
+        report = self.load_report()
+        self.assertGreater(report["tracemalloc_peak_bytes"], 0)
+        self.assertGreater(len(report["cprofile"]), 0)
+
+    def test_optional_sections_need_profile(self):
+        with self.assertRaises(SystemExit):
+            gentestfile.main(["--profile-memory"] + [arg for arg in self.prog_args if arg not in ("--profile", self.report_path.__str__())])
+
+    def test_lint_only_is_profiled_as_lint(self):
+        clock = FakeClock()
+        saved_perf_counter = generation_profile.time.perf_counter
+        saved_lint_descriptor = gentestfile.lint_descriptor
+        descriptor = self.work_dir / "lint-only.cmake"
+        descriptor.write_text('include("{}")\n'.format((common.project_base_dir / "cmake-test.cmake").as_posix()))
+
+        def fake_lint_descriptor(list_file):
+            clock.now += 1.0
+            return True, []
+
+        generation_profile.time.perf_counter = clock
+        gentestfile.lint_descriptor = fake_lint_descriptor
+        try:
+            if self.use_breakpoint:
+                breakpoint()
+            self.assertEqual(
+                gentestfile.main(["--profile", self.report_path.__str__(), "--lint-only", self.work_dir.__str__(), "-j", "1"]),
+                0
+            )
+        finally:
+            generation_profile.time.perf_counter = saved_perf_counter
+            gentestfile.lint_descriptor = saved_lint_descriptor
+        report = self.load_report()
+        self.assertEqual(report["phases"][generation_profile.LINT], 1.0)
+        self.assertEqual(report["phases"][generation_profile.ARGUMENT_VALIDATION], 0.0)
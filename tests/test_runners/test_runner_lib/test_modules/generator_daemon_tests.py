@@ -0,0 +1,187 @@
+import concurrent.futures
+import importlib
+import os
+import pathlib
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+
+import common
+
+sys.path.append(common.scripts_dir.__str__())
+generator_daemon = importlib.import_module("generator_daemon")
+generation_manifest = importlib.import_module("generation_manifest")
+gentestfile = importlib.import_module("generate-test-file")
+
+@unittest.skipIf(os.name == 'nt', 'The generator daemon listens on a Unix domain socket.')
+class TestGeneratorDaemon(common.TestCaseWrapper):
+    CONCURRENT_CLIENTS = 32
+    DAEMON_START_TIMEOUT = 10
+    ENV_VAR = "CMAKE_TEST_DAEMON_CLIENT_VAR"
+
+    def setUp(self):
+        super().setUp()
+        self.socket_dir = tempfile.mkdtemp()
+        self.socket_path = os.path.join(self.socket_dir, "generator.sock")
+        self.test_output_dir = common.scripts_dir / "tests"
+        self.generator_args = [
+            "-b", (common.test_helper_dir / "build").__str__(),
+            "-c", common.project_base_dir.__str__(),
+            "-p", common.project_base_dir.__str__()
+        ]
+        self.daemon = subprocess.Popen(
+            [
+                sys.executable,
+                (common.scripts_dir / "generate-test-file.py").__str__(),
+                "--serve",
+                self.socket_path
+            ],
+            stdout = subprocess.DEVNULL,
+            stderr = subprocess.DEVNULL
+        )
+        deadline = time.monotonic() + self.DAEMON_START_TIMEOUT
+        while not generator_daemon.is_daemon_listening(self.socket_path):
+            if time.monotonic() > deadline or self.daemon.poll() is not None:
+                self.fail("Generator daemon did not start.")
+            time.sleep(0.05)
+
+    def tearDown(self):
+        self.daemon.terminate()
+        self.daemon.wait()
+        shutil.rmtree(self.socket_dir, ignore_errors = True)
+        super().tearDown()
+
+    def remove_test_file(self, descriptor):
+        test_file = self.test_output_dir / descriptor.name
+        test_file.unlink(missing_ok = True)
+        generation_manifest.get_manifest_path(test_file).unlink(missing_ok = True)
+
+    def request(self, descriptor):
+        args = self.generator_args + [descriptor.__str__()]
+        return generator_daemon.request_generation(self.socket_path, args, timeout = 60)
+
+    def test_daemon_generates_test_file(self):
+        descriptor = common.test_file_dir / "test-file.cmake"
+        (self.test_output_dir / descriptor.name).unlink(missing_ok = True)
+        if self.use_breakpoint:
+            breakpoint()
+        response = self.request(descriptor)
+        self.assertEqual(response["returncode"], 0, response["stderr"])
+        self.assertTrue((self.test_output_dir / descriptor.name).exists())
+
+    def test_client_environment_is_used(self):
+        descriptor = pathlib.Path(self.socket_dir) / "daemon-env-{}.cmake".format(os.getpid())
+        with open(descriptor, 'w') as file:
+            file.write(
+                'include("{}")\n'.format((common.project_base_dir / "cmake-test.cmake").as_posix()) +
+                'macro(test)\n' +
+                '    message(STATUS "Value: $ENV{' + self.ENV_VAR + '}")\n' +
+                'endmacro()\n' +
+                'add_test_macro(MACRO_NAME test)\n'
+            )
+        #The daemon was started without the variable.
+        os.environ[self.ENV_VAR] = "from-the-client"
+        try:
+            response = self.request(descriptor)
+        finally:
+            os.environ.pop(self.ENV_VAR, None)
+        self.addCleanup(self.remove_test_file, descriptor)
+
+        self.assertEqual(response["returncode"], 0, response["stderr"])
+        self.assertIn(
+            'message(STATUS "Value: from-the-client")',
+            (self.test_output_dir / descriptor.name).read_text()
+        )
+
+    def test_daemon_reports_generation_failure(self):
+        response = self.request(common.test_file_dir / "test-file-that-does-not-exist.cmake")
+        self.assertEqual(response["returncode"], 1)
+        self.assertIn("does not exist", response["stderr"])
+
+    def test_daemon_reports_bad_arguments(self):
+        response = generator_daemon.request_generation(self.socket_path, ["--not-an-option"])
+        self.assertEqual(response["returncode"], 2)
+
+    #Load test: many clients at once, as under "ctest -j".
+    def test_concurrent_clients(self):
+        descriptors = [
+            common.test_file_dir / "test-file.cmake",
+            common.test_file_dir / "test-file-no-setup.cmake",
+            common.test_file_dir / "test-file-no-teardown.cmake",
+            common.test_file_dir / "test-file-no-setup-no-teardown.cmake"
+        ]
+        for descriptor in descriptors:
+            self.remove_test_file(descriptor)
+        if self.use_breakpoint:
+            breakpoint()
+        start = time.perf_counter()
+        with concurrent.futures.ThreadPoolExecutor(max_workers = self.CONCURRENT_CLIENTS) as executor:
+            responses = list(executor.map(
+                self.request,
+                [descriptors[i % len(descriptors)] for i in range(self.CONCURRENT_CLIENTS)]
+            ))
+        elapsed = time.perf_counter() - start
+
+        if self.enable_output_printing:
+            print("{} concurrent requests served in {:.3f}s".format(self.CONCURRENT_CLIENTS, elapsed))
+
+        for response in responses:
+            self.assertEqual(response["returncode"], 0, response["stderr"])
+
+        #The daemon's files are the ones a direct run writes:
+        for descriptor in descriptors:
+            served = (self.test_output_dir / descriptor.name).read_text()
+            self.remove_test_file(descriptor)
+            self.assertEqual(gentestfile.main(self.generator_args + [descriptor.__str__()]), 0)
+            self.assertEqual(served, (self.test_output_dir / descriptor.name).read_text())
+
+    def test_client_without_daemon(self):
+        client = common.scripts_dir / "generate-test-file-client.py"
+        process = subprocess.run(
+            [
+                sys.executable,
+                client.__str__(),
+                "--socket",
+                os.path.join(self.socket_dir, "no-daemon-here.sock")
+            ] + self.generator_args,
+            capture_output = True
+        )
+        self.assertEqual(process.returncode, generator_daemon.DAEMON_UNAVAILABLE_EXIT_CODE)
+
+    def test_socket_is_private(self):
+        if self.use_breakpoint:
+            breakpoint()
+        self.assertEqual(os.stat(self.socket_path).st_mode & 0o777, 0o600)
+
+    def test_second_daemon_refuses_live_socket(self):
+        with self.assertRaises(generator_daemon.GeneratorDaemonError):
+            generator_daemon.serve(self.socket_path, lambda args: 0)
+
+
+@unittest.skipUnless(hasattr(socket, "SO_PEERCRED"), 'The platform does not report peer credentials.')
+class TestGeneratorDaemonPeerCheck(common.TestCaseWrapper):
+    def setUp(self):
+        super().setUp()
+        self.socket_dir = tempfile.mkdtemp()
+        self.server = generator_daemon.GeneratorDaemon(os.path.join(self.socket_dir, "generator.sock"), lambda args: 0)
+        self.client, self.peer = socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)
+
+    def tearDown(self):
+        self.client.close()
+        self.peer.close()
+        self.server.server_close()
+        shutil.rmtree(self.socket_dir, ignore_errors = True)
+        super().tearDown()
+
+    def test_same_user_is_accepted(self):
+        if self.use_breakpoint:
+            breakpoint()
+        self.assertTrue(self.server.verify_request(self.peer, ""))
+
+    def test_other_user_is_rejected(self):
+        self.server.allowed_uid = os.getuid() + 1
+        self.assertFalse(self.server.verify_request(self.peer, ""))
@@ -7,6 +7,7 @@ import sys
 sys.path.append(common.scripts_dir.__str__())
 
 gentestfile = importlib.import_module("generate-test-file")
+from cmake_local.language_parsing import cmake_lexer
 
 class TestFileGenerationHelperNoContextTests(common.TestCaseWrapper):
     #Hello
@@ -20,3 +21,85 @@ class TestFileGenerationHelperNoContextTests(common.TestCaseWrapper):
         output = gentestfile.remove_cmake_escape_sequences(input)
         self.assertEqual(output, R"\\MyFilePath\\\ DumbPathWithPreceedingSpace")
 
+    def test_classify_line(self):
+        app_singleton = gentestfile.ApplicationSingleton(None)
+        if self.use_breakpoint:
+            breakpoint()
+        self.assertEqual(
+            gentestfile.classify_line("include(\"test-include.cmake\")\n", app_singleton),
+            gentestfile.DescriptorCommand.INCLUDE
+        )
+        self.assertEqual(
+            gentestfile.classify_line(" add_test_macro (MACRO_NAME test)\n", app_singleton),
+            gentestfile.DescriptorCommand.ADD_TEST_MACRO
+        )
+        self.assertEqual(
+            gentestfile.classify_line("macro(setup)\n", app_singleton),
+            gentestfile.DescriptorCommand.MACRO
+        )
+
+    def test_classify_line_ignores_other_lines(self):
+        app_singleton = gentestfile.ApplicationSingleton(None)
+        for line in [
+            "message(STATUS \"Not a descriptor command.\")\n",
+            "endmacro()\n",
+            "# include(\"commented-out.cmake\")\n",
+            "\n",
+            "add_test_macros(MACRO_NAME test)\n"
+        ]:
+            self.assertIsNone(gentestfile.classify_line(line, app_singleton), line)
+
+
+class TestBlockIndex(common.TestCaseWrapper):
+    def get_block_index(self, lines):
+        self.pulled_invocations = []
+
+        def counting_invocations():
+            for invocation in cmake_lexer.iter_invocations([line + "\n" for line in lines]):
+                self.pulled_invocations.append(invocation)
+                yield invocation
+        return gentestfile.BlockIndex(counting_invocations())
+
+    def test_nested_ranges(self):
+        block_index = self.get_block_index([
+            "function(outer)",
+            "    macro(inner)",
+            "    endmacro()",
+            "    function(inner_function)",
+            "    endfunction(inner_function)",
+            "endfunction()",
+            "macro(after)",
+            "endmacro()"
+        ])
+        if self.use_breakpoint:
+            breakpoint()
+        self.assertEqual(next(block_index).start_line, 0)
+        self.assertEqual(block_index.get_range(0), (0, 5))
+        #Already indexed on the way to the end of "outer":
+        self.assertEqual(block_index.ranges[1], (1, 2))
+        self.assertEqual(block_index.ranges[3], (3, 4))
+        self.assertEqual(next(block_index).start_line, 6)
+        self.assertEqual(block_index.get_range(6), (6, 7))
+
+    def test_each_invocation_is_indexed_once(self):
+        block_index = self.get_block_index(["function(f{})".format(i) for i in range(50)] + ["endfunction()"] * 50)
+        for i in range(50):
+            self.assertEqual(block_index.get_range(i), (i, 99 - i))
+        self.assertEqual(len(self.pulled_invocations), 100)
+
+    def test_mismatched_end(self):
+        block_index = self.get_block_index(["macro(m)", "endfunction()"])
+        next(block_index)
+        with self.assertRaises(gentestfile.TestDescriptorFileParseError):
+            block_index.get_range(0)
+
+    def test_unterminated_block(self):
+        block_index = self.get_block_index(["function(f)", "message(STATUS \"No end.\")"])
+        next(block_index)
+        with self.assertRaises(gentestfile.TestDescriptorFileParseError):
+            block_index.get_range(0)
+
+    def test_stray_end(self):
+        block_index = self.get_block_index(["message(STATUS \"Hi.\")", "endmacro()"])
+        with self.assertRaises(gentestfile.TestDescriptorFileParseError):
+            list(block_index)
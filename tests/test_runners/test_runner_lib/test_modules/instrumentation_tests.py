@@ -0,0 +1,78 @@
+import importlib
+import subprocess
+import sys
+
+import common
+
+sys.path.append(common.scripts_dir.__str__())
+gentestfile = importlib.import_module("generate-test-file")
+instrumentation = importlib.import_module("instrumentation")
+
+class TestInstrumentation(common.TestCaseWrapper):
+    def setUp(self):
+        super().setUp()
+        self.test_output_dir = common.scripts_dir / "tests"
+        self.input = common.test_file_dir / "test-file.cmake"
+        self.base_args = [
+            "-b", (common.test_helper_dir / "build").__str__(),
+            "-c", common.project_base_dir.__str__()
+        ]
+
+    def tearDown(self):
+        #Leave the plain test file behind for the other tests.
+        gentestfile.main(self.base_args + [self.input.__str__()])
+        super().tearDown()
+
+    def run_test_file(self):
+        cmake_process = subprocess.run(
+            ["cmake", "-P", (self.test_output_dir / self.input.name).__str__()],
+            capture_output = True,
+            text = True
+        )
+        self.assertEqual(cmake_process.returncode, 0)
+        return cmake_process.stdout
+
+    def test_parse_timings(self):
+        output = "\n".join([
+            "-- I am a test.",
+            "-- CMAKE-TEST TIMING:\ttest\t1500\tmy group\tmy_test",
+            "-- CMAKE-TEST TIMING:\tsetup\tnot-a-number\tgroup\tsetup",
+            "-- CMAKE-TEST TIMING:\ttruncated",
+            "-- CMAKE-TEST TIMING:\tteardown\t2000000\tgroup\twith\ttab"
+        ])
+        if self.use_breakpoint:
+            breakpoint()
+        timings = instrumentation.parse_timings(output)
+        self.assertEqual(
+            [(timing.kind, timing.test_group, timing.name, timing.duration) for timing in timings],
+            [("test", "my group", "my_test", 0.0015), ("teardown", "group", "with\ttab", 2.0)]
+        )
+
+    def test_every_call_is_timed(self):
+        self.assertEqual(gentestfile.main(["--instrument"] + self.base_args + [self.input.__str__()]), 0)
+        timings = instrumentation.parse_timings(self.run_test_file())
+        self.assertEqual(
+            [(timing.kind, timing.test_group, timing.name) for timing in timings[:4]],
+            [("setup", "test", "setup"), ("test", "test", "test"), ("teardown", "test", "teardown"), ("setup", "grouptester", "setup")]
+        )
+        self.assertEqual(len(timings), 11)
+        self.assertTrue(all(timing.duration >= 0 for timing in timings))
+
+    def test_toggling_instrumentation_regenerates(self):
+        self.assertEqual(gentestfile.main(self.base_args + [self.input.__str__()]), 0)
+        self.assertEqual(instrumentation.parse_timings(self.run_test_file()), [])
+        #No "--force": the manifest records the option.
+        self.assertEqual(gentestfile.main(["--instrument"] + self.base_args + [self.input.__str__()]), 0)
+        self.assertEqual(len(instrumentation.parse_timings(self.run_test_file())), 11)
+
+    def test_bundle_reports_unprefixed_names(self):
+        context = gentestfile.cmake_helper.CMakeScriptContext(
+            list_file = self.input.__str__(),
+            build_dir = (common.test_helper_dir / "build").__str__(),
+            source_dir = common.project_base_dir.__str__(),
+            project_source_dir = common.project_base_dir.__str__()
+        )
+        parse_status = gentestfile.parse_file(gentestfile.ApplicationSingleton(context))
+        contents = "".join(gentestfile.iter_bundle_contents([parse_status], instrument = True))
+        self.assertIn("bundle_0_grouptester_test1()\n", contents)
+        self.assertIn("\\tgrouptester\\tgrouptester_test1\")\n", contents)
@@ -0,0 +1,163 @@
+import importlib
+import os
+import pathlib
+import shutil
+import sys
+import tempfile
+
+import common
+
+sys.path.append(common.scripts_dir.__str__())
+gentestfile = importlib.import_module("generate-test-file")
+lint_cache = importlib.import_module("lint_cache")
+
+class TestLintCache(common.TestCaseWrapper):
+    def setUp(self):
+        super().setUp()
+        self.work_dir = pathlib.Path(tempfile.mkdtemp())
+        self.cache = lint_cache.LintCache(self.work_dir / "cache", max_entries = 2)
+        self.descriptor = self.work_dir / "descriptor.cmake"
+        self.include_file = self.work_dir / "include.cmake"
+        self.write_file(self.descriptor, 'include("include.cmake")\n')
+        self.write_file(self.include_file, 'message(STATUS "Included.")\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors = True)
+        super().tearDown()
+
+    def write_file(self, path, contents):
+        with open(path, 'w') as file:
+            file.write(contents)
+
+    def get_key(self):
+        return self.cache.compute_key(
+            self.descriptor,
+            self.work_dir,
+            framework_files = [common.project_base_dir / "cmake-test.cmake"]
+        )
+
+    def test_miss_on_empty_cache(self):
+        self.assertFalse(self.cache.lookup(self.get_key()))
+
+    def test_hit_after_store(self):
+        self.cache.store(self.get_key(), [self.include_file])
+        if self.use_breakpoint:
+            breakpoint()
+        self.assertTrue(self.cache.lookup(self.get_key()))
+
+    def test_changed_descriptor_changes_key(self):
+        key = self.get_key()
+        self.write_file(self.descriptor, 'include("include.cmake")\nmessage(STATUS "Edited.")\n')
+        self.assertNotEqual(key, self.get_key())
+
+    def test_changed_include_is_a_miss(self):
+        self.cache.store(self.get_key(), [self.include_file])
+        self.write_file(self.include_file, 'message(STATUS "Edited.")\n')
+        self.assertFalse(self.cache.lookup(self.get_key()))
+
+    def test_eviction_keeps_newest_entries(self):
+        keys = ["a" * 64, "b" * 64, "c" * 64]
+        for index, key in enumerate(keys):
+            self.cache.store(key, [])
+            #Make the eviction order independent of the file system's timestamp resolution.
+            os.utime(self.cache.get_entry_path(key), ns = (index * 10**9, index * 10**9))
+        self.cache.evict()
+        self.assertFalse(self.cache.lookup(keys[0]))
+        self.assertTrue(self.cache.lookup(keys[1]))
+        self.assertTrue(self.cache.lookup(keys[2]))
+
+    def test_corrupt_entry_is_a_miss(self):
+        key = self.get_key()
+        self.cache.cache_dir.mkdir(parents = True)
+        self.write_file(self.cache.get_entry_path(key), "{ not json")
+        self.assertFalse(self.cache.lookup(key))
+
+    def test_clear(self):
+        self.cache.store(self.get_key(), [self.include_file])
+        self.cache.clear()
+        self.assertFalse(self.cache.lookup(self.get_key()))
+
+
+class TestGeneratorLintCache(common.TestCaseWrapper):
+    def setUp(self):
+        super().setUp()
+        self.cache_dir = tempfile.mkdtemp()
+        self.saved_cache_dir = os.environ.get(lint_cache.LINT_CACHE_DIR_ENV_VAR)
+        os.environ[lint_cache.LINT_CACHE_DIR_ENV_VAR] = self.cache_dir
+        self.saved_linter = gentestfile.run_cmake_as_linter
+        self.lint_count = 0
+
+        def counting_linter(filename, working_dir):
+            self.lint_count += 1
+            return self.saved_linter(filename, working_dir)
+        gentestfile.run_cmake_as_linter = counting_linter
+
+        self.args = [
+            "--force",
+            "-b", (common.test_helper_dir / "build").__str__(),
+            "-c", common.project_base_dir.__str__(),
+            (common.test_file_dir / "test-file.cmake").__str__()
+        ]
+
+    def tearDown(self):
+        gentestfile.run_cmake_as_linter = self.saved_linter
+        if self.saved_cache_dir is None:
+            os.environ.pop(lint_cache.LINT_CACHE_DIR_ENV_VAR, None)
+        else:
+            os.environ[lint_cache.LINT_CACHE_DIR_ENV_VAR] = self.saved_cache_dir
+        shutil.rmtree(self.cache_dir, ignore_errors = True)
+        super().tearDown()
+
+    def test_cache_hit_skips_lint(self):
+        self.assertEqual(gentestfile.main(self.args), 0)
+        if self.use_breakpoint:
+            breakpoint()
+        self.assertEqual(gentestfile.main(self.args), 0)
+        self.assertEqual(self.lint_count, 1)
+
+    def test_no_lint_cache_forces_lint(self):
+        self.assertEqual(gentestfile.main(self.args), 0)
+        self.assertEqual(gentestfile.main(["--no-lint-cache"] + self.args), 0)
+        self.assertEqual(self.lint_count, 2)
+
+    #Every configuration includes its own file, so a change to any of them
+    #has to invalidate the verdict, not just a change to the last one rendered.
+    def test_matrix_includes_of_every_configuration_are_tracked(self):
+        work_dir = pathlib.Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, work_dir, True)
+        descriptor = work_dir / "lint-cache-matrix-{}.cmake".format(os.getpid())
+        with open(descriptor, 'w') as file:
+            file.write(
+                'include("{}")\n'.format((common.project_base_dir / "cmake-test.cmake").as_posix()) +
+                'include("${CMAKE_BUILD_DIR}/config.cmake")\n' +
+                'macro(test)\n' +
+                '    message(STATUS "I am the test.")\n' +
+                'endmacro()\n' +
+                'add_test_macro(MACRO_NAME test)\n'
+            )
+        args = ["--force"]
+        build_dirs = []
+        for name in ("lint-cache-debug", "lint-cache-release"):
+            build_dir = work_dir / name
+            build_dir.mkdir()
+            (build_dir / "config.cmake").write_text('message(STATUS "{}")\n'.format(name))
+            build_dirs.append(build_dir)
+            args.extend(["--context", name, build_dir.__str__(), common.project_base_dir.__str__(), common.project_base_dir.__str__()])
+            self.addCleanup(shutil.rmtree, common.scripts_dir / "tests" / name, True)
+        args.append(descriptor.__str__())
+
+        #"cmake -P" on its own cannot resolve "${CMAKE_BUILD_DIR}".
+        def counting_linter(filename, working_dir):
+            self.lint_count += 1
+            return True
+        gentestfile.run_cmake_as_linter = counting_linter
+
+        if self.use_breakpoint:
+            breakpoint()
+        self.assertEqual(gentestfile.main(args), 0)
+        self.assertEqual(gentestfile.main(args), 0)
+        self.assertEqual(self.lint_count, 1)
+
+        (build_dirs[0] / "config.cmake").write_text('message(STATUS "changed")\n')
+        self.assertEqual(gentestfile.main(args), 0)
+        self.assertEqual(self.lint_count, 2)
@@ -0,0 +1,83 @@
+import importlib
+import pathlib
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+import common
+
+sys.path.append(common.scripts_dir.__str__())
+gentestfile = importlib.import_module("generate-test-file")
+lint_sweep = importlib.import_module("lint_sweep")
+
+class TestLintSweep(common.TestCaseWrapper):
+    def setUp(self):
+        super().setUp()
+        self.work_dir = pathlib.Path(tempfile.mkdtemp())
+        self.cmake_test_file = (common.project_base_dir / "cmake-test.cmake").as_posix()
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors = True)
+        super().tearDown()
+
+    def write_file(self, path, contents):
+        path.parent.mkdir(parents = True, exist_ok = True)
+        with open(path, 'w') as file:
+            file.write(contents)
+
+    def test_find_descriptors(self):
+        descriptors = lint_sweep.find_descriptors(common.test_file_dir)
+        names = [descriptor.name for descriptor in descriptors]
+        self.assertIn("test-file.cmake", names)
+        self.assertIn("test-file-no-test.cmake", names)
+        #Included helpers are not descriptors.
+        self.assertNotIn("test-include.cmake", names)
+
+    def test_find_descriptors_honours_exclusions(self):
+        self.write_file(self.work_dir / "a" / "descriptor.cmake", 'include("{}")\n'.format(self.cmake_test_file))
+        self.write_file(self.work_dir / "b" / "descriptor.cmake", 'include("{}")\n'.format(self.cmake_test_file))
+        descriptors = lint_sweep.find_descriptors(self.work_dir, exclude_dirs = [self.work_dir / "b"])
+        self.assertEqual(descriptors, [self.work_dir / "a" / "descriptor.cmake"])
+
+    def test_sweep_is_bounded_and_parallel(self):
+        lock = threading.Lock()
+        running = [0]
+        peak = [0]
+
+        def fake_lint(descriptor):
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.05)
+            with lock:
+                running[0] -= 1
+            return True, []
+
+        streamed = []
+        if self.use_breakpoint:
+            breakpoint()
+        results = lint_sweep.sweep(
+            list(range(12)),
+            fake_lint,
+            3,
+            on_result = lambda descriptor, result: streamed.append(descriptor)
+        )
+        self.assertEqual(len(results), 12)
+        self.assertEqual(sorted(streamed), list(range(12)))
+        self.assertLessEqual(peak[0], 3)
+        self.assertGreater(peak[0], 1)
+
+    def test_lint_only_mode(self):
+        self.write_file(
+            self.work_dir / "good.cmake",
+            'include("{}")\nmessage(STATUS "Fine.")\n'.format(self.cmake_test_file)
+        )
+        self.assertEqual(gentestfile.main(["--lint-only", self.work_dir.__str__(), "-j", "2"]), 0)
+
+        self.write_file(
+            self.work_dir / "bad.cmake",
+            'include("{}")\nmessage(FATAL_ERROR "Broken.")\n'.format(self.cmake_test_file)
+        )
+        self.assertEqual(gentestfile.main(["--lint-only", self.work_dir.__str__(), "-j", "2"]), 1)
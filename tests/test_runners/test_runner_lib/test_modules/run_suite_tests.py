@@ -0,0 +1,237 @@
+import importlib
+import os
+import pathlib
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+import common
+
+sys.path.append(common.scripts_dir.__str__())
+run_suite = importlib.import_module("run-suite")
+
+class TestRunSuite(common.TestCaseWrapper):
+    def setUp(self):
+        super().setUp()
+        self.work_dir = pathlib.Path(tempfile.mkdtemp())
+        self.cmake_test_file = (common.project_base_dir / "cmake-test.cmake").as_posix()
+        self.base_args = [
+            "-b", (common.test_helper_dir / "build").__str__(),
+            "-c", common.project_base_dir.__str__(),
+            "-j", "2"
+        ]
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors = True)
+        super().tearDown()
+
+    def write_descriptor(self, name, test_body):
+        path = self.work_dir / name
+        with open(path, 'w') as file:
+            file.write('include("{}")\n'.format(self.cmake_test_file))
+            file.write('macro(test)\n{}endmacro()\n'.format(test_body))
+            file.write('add_test_macro(MACRO_NAME test)\n')
+        return path
+
+    def test_suite_passes(self):
+        inputs = [
+            common.test_file_dir / "test-file.cmake",
+            common.test_file_dir / "test-file-no-setup.cmake",
+            common.test_file_dir / "test-file-no-teardown.cmake"
+        ]
+        if self.use_breakpoint:
+            breakpoint()
+        self.assertEqual(run_suite.main(self.base_args + [input.__str__() for input in inputs]), 0)
+
+    def test_relative_descriptor_path(self):
+        #"test-file.cmake" includes "test-include.cmake" by a relative path.
+        cwd = os.getcwd()
+        os.chdir(common.project_base_dir)
+        try:
+            self.assertEqual(
+                run_suite.main([
+                    "-b", (common.test_helper_dir / "build").relative_to(common.project_base_dir).__str__(),
+                    "-c", ".",
+                    (common.test_file_dir / "test-file.cmake").relative_to(common.project_base_dir).__str__()
+                ]),
+                0
+            )
+        finally:
+            os.chdir(cwd)
+
+    def test_failures_are_collected(self):
+        passing = self.write_descriptor("run-suite-passing.cmake", '    message(STATUS "Fine.")\n')
+        failing = self.write_descriptor("run-suite-failing.cmake", '    message(FATAL_ERROR "Broken.")\n')
+        self.assertEqual(run_suite.main(self.base_args + [passing.__str__(), failing.__str__()]), 1)
+
+        result = run_suite.run_test_file(
+            run_suite.TestFileResult(failing.__str__(), run_suite.gentestfile.get_test_directory() / failing.name)
+        )
+        self.assertFalse(result.passed())
+        self.assertNotEqual(result.returncode, 0)
+        self.assertIn("Broken.", result.stderr)
+        self.assertGreater(result.duration, 0)
+
+    def test_timeout(self):
+        slow = self.write_descriptor("run-suite-slow.cmake", '    execute_process(COMMAND "${CMAKE_COMMAND}" -E sleep 5)\n')
+        self.assertEqual(run_suite.main(self.base_args + ["--timeout", "0.5", slow.__str__()]), 1)
+
+    def test_runs_are_bounded_and_parallel(self):
+        lock = threading.Lock()
+        running = [0]
+        peak = [0]
+        saved_run_test_file = run_suite.run_test_file
+
+        def fake_run_test_file(result, timeout = None):
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.05)
+            with lock:
+                running[0] -= 1
+            result.returncode = 0
+            return result
+
+        run_suite.run_test_file = fake_run_test_file
+        try:
+            results = run_suite.run_test_files(
+                [run_suite.TestFileResult("{}.cmake".format(i), None) for i in range(12)],
+                3
+            )
+        finally:
+            run_suite.run_test_file = saved_run_test_file
+        self.assertEqual(len(results), 12)
+        self.assertTrue(all(result.passed() for result in results))
+        self.assertLessEqual(peak[0], 3)
+        self.assertGreater(peak[0], 1)
+
+    def test_split_groups_run_separately(self):
+        saved_run_test_files = run_suite.run_test_files
+        run = []
+
+        def recording_run_test_files(results, jobs, timeout = None, on_result = None):
+            run.extend(result.name for result in results)
+            return saved_run_test_files(results, jobs, timeout = timeout, on_result = on_result)
+
+        run_suite.run_test_files = recording_run_test_files
+        try:
+            self.assertEqual(
+                run_suite.main(self.base_args + ["--split-groups", (common.test_file_dir / "test-file.cmake").__str__()]),
+                0
+            )
+        finally:
+            run_suite.run_test_files = saved_run_test_files
+        self.assertEqual(len(run), 3)
+
+
+class FakeWatcher:
+    def __init__(self, batches):
+        self.batches = list(batches)
+        self.paths = set()
+
+    def set_paths(self, paths):
+        self.paths = set(paths)
+
+    def wait_for_changes(self):
+        if len(self.batches) == 0:
+            raise KeyboardInterrupt
+        return self.batches.pop(0)
+
+class TestWatch(common.TestCaseWrapper):
+    def setUp(self):
+        super().setUp()
+        self.work_dir = pathlib.Path(tempfile.mkdtemp())
+        self.cmake_test_file = (common.project_base_dir / "cmake-test.cmake").as_posix()
+        self.helper = self.work_dir / "watch-helper.cmake"
+        with open(self.helper, 'w') as file:
+            file.write('set(WATCH_HELPER_VALUE 1)\n')
+        self.including = self.write_descriptor("watch-including.cmake", 'include("{}")\n'.format(self.helper.as_posix()))
+        self.plain = self.write_descriptor("watch-plain.cmake", '')
+        self.list_files = [self.including.__str__(), self.plain.__str__()]
+        self.test_directory = run_suite.gentestfile.get_test_directory()
+        self.parse_results = run_suite.build_arg_parser().parse_args([
+            "-b", (common.test_helper_dir / "build").__str__(),
+            "-c", common.project_base_dir.__str__(),
+            "-j", "1"
+        ] + self.list_files)
+
+        self.run = []
+        self.saved_run_suite = run_suite.run_suite
+
+        def recording_run_suite(list_files, parse_results, test_directory):
+            self.run.append(list(list_files))
+            return self.saved_run_suite(list_files, parse_results, test_directory)
+        run_suite.run_suite = recording_run_suite
+
+    def tearDown(self):
+        run_suite.run_suite = self.saved_run_suite
+        shutil.rmtree(self.work_dir, ignore_errors = True)
+        super().tearDown()
+
+    def write_descriptor(self, name, preamble):
+        path = self.work_dir / name
+        with open(path, 'w') as file:
+            file.write('include("{}")\n'.format(self.cmake_test_file))
+            file.write(preamble)
+            file.write('macro(test)\n    message(STATUS "Fine.")\nendmacro()\n')
+            file.write('add_test_macro(MACRO_NAME test)\n')
+        return path
+
+    def generate(self):
+        self.assertTrue(all(result.passed() for result in self.saved_run_suite(self.list_files, self.parse_results, self.test_directory)))
+
+    def test_dependencies(self):
+        self.generate()
+        if self.use_breakpoint:
+            breakpoint()
+        cmake_test_file = os.path.abspath(self.cmake_test_file)
+        self.assertEqual(
+            run_suite.get_dependencies(self.including.__str__(), self.test_directory),
+            {self.including.__str__(), self.helper.__str__(), cmake_test_file}
+        )
+        dependents = run_suite.get_dependents(self.list_files, self.test_directory)
+        self.assertEqual(dependents[self.helper.__str__()], {self.including.__str__()})
+        self.assertEqual(dependents[cmake_test_file], set(self.list_files))
+        #Before its first generation, only the descriptor and the framework are known.
+        self.assertEqual(
+            run_suite.get_dependencies((self.work_dir / "never-generated.cmake").__str__(), self.test_directory),
+            {(self.work_dir / "never-generated.cmake").__str__(), cmake_test_file}
+        )
+
+    def test_only_affected_descriptors_rerun(self):
+        self.generate()
+        watcher = FakeWatcher([
+            {self.helper.__str__()},
+            {(self.work_dir / "unrelated.txt").__str__()},
+            {os.path.abspath(self.cmake_test_file)}
+        ])
+        self.assertEqual(run_suite.watch(self.list_files, self.parse_results, self.test_directory, watcher = watcher), 0)
+        self.assertEqual(self.run, [[self.including.__str__()], self.list_files])
+        self.assertIn(self.helper.__str__(), watcher.paths)
+
+    def test_new_include_is_watched(self):
+        self.generate()
+        other_helper = self.work_dir / "watch-other-helper.cmake"
+        with open(other_helper, 'w') as file:
+            file.write('set(WATCH_OTHER_HELPER_VALUE 1)\n')
+        watcher = FakeWatcher([])
+        edits = [lambda: self.write_descriptor("watch-plain.cmake", 'include("{}")\n'.format(other_helper.as_posix()))]
+
+        def wait_for_changes():
+            if len(edits) == 0:
+                raise KeyboardInterrupt
+            edits.pop()()
+            return {self.plain.__str__()}
+        watcher.wait_for_changes = wait_for_changes
+
+        self.assertEqual(run_suite.watch(self.list_files, self.parse_results, self.test_directory, watcher = watcher), 0)
+        self.assertEqual(self.run, [[self.plain.__str__()]])
+        self.assertIn(other_helper.__str__(), watcher.paths)
+
+    def test_failing_rerun_sets_exit_code(self):
+        self.generate()
+        watcher = FakeWatcher([{self.plain.__str__()}])
+        self.write_descriptor("watch-plain.cmake", 'message(FATAL_ERROR "Broken.")\n')
+        self.assertEqual(run_suite.watch(self.list_files, self.parse_results, self.test_directory, watcher = watcher), 1)
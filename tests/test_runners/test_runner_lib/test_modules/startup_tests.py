@@ -0,0 +1,163 @@
+import importlib
+import os
+import pathlib
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+import zipfile
+
+import common
+
+sys.path.append(common.scripts_dir.__str__())
+build_zipapp = importlib.import_module("build-zipapp")
+
+#Modules that only an option or a line with a "$" in it needs.
+DEFERRED_MODULES = (
+    "concurrent.futures",
+    "subprocess",
+    "socket",
+    "descriptor_bundle",
+    "generator_daemon",
+    "instrumentation",
+    "lint_sweep",
+    "depfile",
+    "cmake_local.language_parsing.cmake_var_expander",
+    "cmake_local.language_parsing.var_expansion_parsing"
+)
+#Cumulative time, in microseconds, that importing the generator from its
+#precompiled archive may take. It took about 85 ms before its imports were
+#deferred, and takes about 50 ms since. Wall-clock times depend on the machine
+#and its load, so the budget is only checked when this variable is set, as on
+#a quiet machine before a release.
+IMPORT_TIME_BUDGET = 75000
+IMPORT_TIME_RUNS = 5
+CHECK_IMPORT_TIME_VAR = "CMAKE_TEST_CHECK_IMPORT_TIME"
+
+#Returns {module name: cumulative microseconds} as "-X importtime" reports
+#them for running "code" with "path" first on sys.path.
+def get_import_times(path, code):
+    python_process = subprocess.run(
+        [
+            sys.executable, "-X", "importtime", "-c",
+            "import sys; sys.path.insert(0, {!r}); {}".format(path.__str__(), code)
+        ],
+        capture_output = True,
+        text = True
+    )
+    if python_process.returncode != 0:
+        raise AssertionError(python_process.stderr)
+
+    retval = {}
+    for line in python_process.stderr.splitlines():
+        fields = line.split("|")
+        if not line.startswith("import time:") or not fields[1].strip().isdigit():
+            continue
+        retval[fields[2].strip()] = int(fields[1])
+    return retval
+
+
+class TestLazyImports(common.TestCaseWrapper):
+    def test_deferred_modules_are_not_imported(self):
+        if self.use_breakpoint:
+            breakpoint()
+        import_times = get_import_times(common.scripts_dir, "__import__('generate-test-file')")
+        self.assertIn("generate-test-file", import_times)
+        for module in DEFERRED_MODULES:
+            with self.subTest(module = module):
+                self.assertNotIn(module, import_times)
+
+    def test_parser_loads_on_first_expansion(self):
+        code = "; ".join([
+            "import cmake_local.cmake_helper as cmake_helper",
+            "context = cmake_helper.CMakeScriptContext('a.cmake', '.', '.', '.')",
+            "assert context.resolve_vars('no variables') == 'no variables'",
+            "assert 'cmake_local.language_parsing.var_expansion_parsing' not in sys.modules",
+            "assert context.resolve_vars('${CMAKE_CURRENT_LIST_FILE}') == 'a.cmake'",
+            "assert 'cmake_local.language_parsing.var_expansion_parsing' in sys.modules"
+        ])
+        get_import_times(common.scripts_dir, code)
+
+    def test_package_exports(self):
+        language_parsing = importlib.import_module("cmake_local.language_parsing")
+        cmake_local = importlib.import_module("cmake_local")
+        self.assertIs(cmake_local.resolve_vars, language_parsing.resolve_vars)
+        self.assertIs(cmake_local.VarParseError, language_parsing.VarParseError)
+        self.assertEqual(sorted(dir(language_parsing)), sorted(set(dir(language_parsing))))
+        self.assertTrue(set(language_parsing.__all__) <= set(dir(language_parsing)))
+        with self.assertRaises(AttributeError):
+            language_parsing.no_such_name
+
+
+class TestZipapp(common.TestCaseWrapper):
+    def setUp(self):
+        super().setUp()
+        #The archive finds "cmake-test.cmake" and "tests/" relative to itself.
+        self.work_dir = pathlib.Path(tempfile.mkdtemp())
+        self.script_dir = self.work_dir / "python"
+        self.script_dir.mkdir()
+        self.zipapp = self.script_dir / build_zipapp.ZIPAPP_PATH.name
+        shutil.copy(common.project_base_dir / "cmake-test.cmake", self.work_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors = True)
+        super().tearDown()
+
+    def test_archive_contents(self):
+        if self.use_breakpoint:
+            breakpoint()
+        self.assertTrue(build_zipapp.write_zipapp(self.zipapp, common.scripts_dir))
+        with zipfile.ZipFile(self.zipapp) as archive:
+            names = archive.namelist()
+        for name in ("__main__.pyc", "generate-test-file.pyc", "cmake_local/language_parsing/cmake_lexer.pyc"):
+            self.assertIn(name, names)
+        self.assertNotIn("run-suite.py", names)
+        self.assertFalse(any(name.startswith("benchmarks/") for name in names))
+
+        #Rebuilding the same sources leaves the archive alone:
+        before = self.zipapp.read_bytes()
+        os.utime(self.zipapp, ns = (1000000000, 1000000000))
+        self.assertFalse(build_zipapp.write_zipapp(self.zipapp, common.scripts_dir))
+        self.assertEqual(self.zipapp.read_bytes(), before)
+        self.assertEqual(self.zipapp.stat().st_mtime_ns, 1000000000)
+
+    def test_generate(self):
+        descriptor = self.work_dir / "zipapp-test.cmake"
+        with open(descriptor, 'w') as file:
+            file.write(
+                'include("{}")\n'.format((self.work_dir / "cmake-test.cmake").as_posix()) +
+                'macro(test)\n' +
+                '    message(STATUS "Run from the archive.")\n' +
+                'endmacro()\n' +
+                'add_test_macro(MACRO_NAME test)\n'
+            )
+        build_zipapp.write_zipapp(self.zipapp, common.scripts_dir)
+        generator_process = subprocess.run(
+            [
+                sys.executable, self.zipapp.__str__(),
+                "-b", (common.test_helper_dir / "build").__str__(),
+                "-c", common.project_base_dir.__str__(),
+                descriptor.__str__()
+            ],
+            capture_output = True,
+            text = True
+        )
+        self.assertEqual(generator_process.returncode, 0, generator_process.stderr)
+        self.assertIn("test()", (self.script_dir / "tests" / descriptor.name).read_text())
+
+    @unittest.skipUnless(os.environ.get(CHECK_IMPORT_TIME_VAR), "Set {} to check the import time.".format(CHECK_IMPORT_TIME_VAR))
+    def test_import_time_budget(self):
+        build_zipapp.write_zipapp(self.zipapp, common.scripts_dir)
+        import_time = min(
+            get_import_times(self.zipapp, "__import__('generate-test-file')")["generate-test-file"]
+            for i in range(0, IMPORT_TIME_RUNS)
+        )
+        self.assertLessEqual(
+            import_time,
+            IMPORT_TIME_BUDGET,
+            "Importing the generator took {} ms, over the budget of {} ms.".format(
+                import_time // 1000,
+                IMPORT_TIME_BUDGET // 1000
+            )
+        )
@@ -3,8 +3,10 @@ import unittest
 import copy
 import importlib
 import pathlib
+import shutil
 import subprocess
 import sys
+import tempfile
 
 import common
 
@@ -192,4 +194,204 @@ class TestFileGenerationTests(unittest.TestCase):
        if self.enable_output_printing:
            self.print_output_header_banner("test_test_file")
        input = (common.test_file_dir / "test-file.cmake")
-       self.run_test_file_generation_test(input, self.args, self.test_output_dir)
\ No newline at end of file
+       self.run_test_file_generation_test(input, self.args, self.test_output_dir)
+
+class TestBatchFileGeneration(common.TestCaseWrapper):
+    def setUp(self):
+        super().setUp()
+        self.args = GenTestFileArgs(
+           build_dir = (common.test_helper_dir / "build").__str__(),
+           source_dir = common.project_base_dir.__str__(),
+           project_dir = common.project_base_dir.__str__()
+        )
+        self.test_output_dir = (common.scripts_dir / "tests")
+        self.inputs = [
+            common.test_file_dir / "test-file.cmake",
+            common.test_file_dir / "test-file-no-setup.cmake",
+            common.test_file_dir / "test-file-no-teardown.cmake"
+        ]
+
+    def remove_outputs(self):
+        for input in self.inputs:
+            (self.test_output_dir / input.name).unlink(missing_ok = True)
+
+    def assert_outputs_exist(self):
+        for input in self.inputs:
+            self.assertTrue((self.test_output_dir / input.name).exists())
+
+    def test_batch_generation_sequential(self):
+        self.remove_outputs()
+        prog_args = self.args.translate_to_array()
+        prog_args.extend([input.__str__() for input in self.inputs])
+        if self.use_breakpoint:
+            breakpoint()
+        self.assertEqual(gentestfile.main(prog_args), 0)
+        self.assert_outputs_exist()
+
+    def test_batch_generation_parallel(self):
+        self.remove_outputs()
+        prog_args = self.args.translate_to_array()
+        prog_args.extend(["-j", "2"])
+        prog_args.extend([input.__str__() for input in self.inputs])
+        if self.use_breakpoint:
+            breakpoint()
+        self.assertEqual(gentestfile.main(prog_args), 0)
+        self.assert_outputs_exist()
+
+    def test_batch_generation_from_descriptor_list(self):
+        self.remove_outputs()
+        descriptor_list = self.test_output_dir / "batch-descriptor-list.txt"
+        self.test_output_dir.mkdir(exist_ok = True)
+        with open(descriptor_list, 'w') as file:
+            file.write("# Descriptors for the batch generation test\n\n")
+            for input in self.inputs:
+                file.write("{}\n".format(input))
+
+        prog_args = self.args.translate_to_array()
+        prog_args.extend(["-l", descriptor_list.__str__()])
+        if self.use_breakpoint:
+            breakpoint()
+        self.assertEqual(gentestfile.main(prog_args), 0)
+        self.assert_outputs_exist()
+
+    def test_batch_generation_failure_does_not_stop_others(self):
+        self.remove_outputs()
+        prog_args = self.args.translate_to_array()
+        prog_args.extend(["-j", "2"])
+        prog_args.append((common.test_file_dir / "test-file-that-does-not-exist.cmake").__str__())
+        prog_args.extend([input.__str__() for input in self.inputs])
+        if self.use_breakpoint:
+            breakpoint()
+        self.assertEqual(gentestfile.main(prog_args), 1)
+        self.assert_outputs_exist()
+
+
+class TestMatrixFileGeneration(common.TestCaseWrapper):
+    def setUp(self):
+        super().setUp()
+        self.work_dir = pathlib.Path(tempfile.mkdtemp())
+        self.build_dirs = {
+            "matrix-debug": self.work_dir / "debug",
+            "matrix-release": self.work_dir / "release"
+        }
+        for build_dir in self.build_dirs.values():
+            build_dir.mkdir()
+        self.test_output_dir = (common.scripts_dir / "tests")
+        self.input = common.test_file_dir / "test-file-expand-cmake-build-dir.cmake"
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors = True)
+        for name in self.build_dirs.keys():
+            shutil.rmtree(self.test_output_dir / name, ignore_errors = True)
+        super().tearDown()
+
+    def get_matrix_args(self):
+        prog_args = ["--force"]
+        for name, build_dir in self.build_dirs.items():
+            prog_args.extend([
+                "--context",
+                name,
+                build_dir.__str__(),
+                common.project_base_dir.__str__(),
+                common.project_base_dir.__str__()
+            ])
+        prog_args.append(self.input.__str__())
+        return prog_args
+
+    def test_one_output_per_context(self):
+        if self.use_breakpoint:
+            breakpoint()
+        self.assertEqual(gentestfile.main(self.get_matrix_args()), 0)
+        for name, build_dir in self.build_dirs.items():
+            with open(self.test_output_dir / name / self.input.name, 'r') as file:
+                self.assertIn(build_dir.__str__(), file.read())
+
+    def test_descriptor_is_parsed_once(self):
+        saved_parse_template = gentestfile.parse_descriptor_template
+        parse_count = [0]
+
+        def counting_parse_template(app_singleton):
+            parse_count[0] += 1
+            return saved_parse_template(app_singleton)
+        gentestfile.parse_descriptor_template = counting_parse_template
+        try:
+            self.assertEqual(gentestfile.main(["--no-lint-cache"] + self.get_matrix_args()), 0)
+        finally:
+            gentestfile.parse_descriptor_template = saved_parse_template
+        self.assertEqual(parse_count[0], 1)
+
+    def test_render_matches_parse_file(self):
+        context = gentestfile.cmake_helper.CMakeScriptContext(
+            list_file = self.input.__str__(),
+            build_dir = self.build_dirs["matrix-debug"].__str__(),
+            source_dir = common.project_base_dir.__str__(),
+            project_source_dir = common.project_base_dir.__str__()
+        )
+        app_singleton = gentestfile.ApplicationSingleton(context)
+        template = gentestfile.parse_descriptor_template(app_singleton)
+        self.assertEqual(
+            gentestfile.generate_file_contents(gentestfile.render_descriptor_template(template, app_singleton)),
+            gentestfile.generate_file_contents(gentestfile.parse_file(app_singleton))
+        )
+
+    def test_bad_context_name_is_rejected(self):
+        source_dir = common.project_base_dir.__str__()
+        self.assertEqual(
+            gentestfile.main(["--context", "../escape", self.work_dir.__str__(), source_dir, source_dir, self.input.__str__()]),
+            1
+        )
+        self.assertEqual(
+            gentestfile.main(self.get_matrix_args() + ["--context", "matrix-debug", self.work_dir.__str__(), source_dir, source_dir]),
+            1
+        )
+
+
+class TestSplitGroupGeneration(common.TestCaseWrapper):
+    def setUp(self):
+        super().setUp()
+        self.test_output_dir = (common.scripts_dir / "tests")
+        self.input = common.test_file_dir / "test-file.cmake"
+        self.groups_dir = gentestfile.get_test_groups_directory(self.test_output_dir / self.input.name)
+        self.prog_args = [
+            "--force",
+            "--split-groups",
+            "-b", (common.test_helper_dir / "build").__str__(),
+            "-c", common.project_base_dir.__str__(),
+            self.input.__str__()
+        ]
+
+    def tearDown(self):
+        shutil.rmtree(self.groups_dir, ignore_errors = True)
+        super().tearDown()
+
+    def test_one_file_per_group(self):
+        if self.use_breakpoint:
+            breakpoint()
+        self.assertEqual(gentestfile.main(self.prog_args), 0)
+        group_files = gentestfile.read_test_group_index(self.groups_dir / gentestfile.TEST_GROUP_INDEX_NAME)
+        self.assertEqual(
+            [pathlib.Path(group_file).name for group_file in group_files],
+            ["000-test.cmake", "001-grouptester.cmake", "002-grouptester2.cmake"]
+        )
+
+        for group_file, tests in zip(group_files, (["test"], ["grouptester_test1", "grouptester_test2"], ["grouptester2_test1", "grouptester2_test2"])):
+            with open(group_file, 'r') as file:
+                contents = file.read()
+            #Every group file has all the definitions, but runs only its own tests.
+            self.assertIn("macro(grouptester2_test2)", contents)
+            self.assertEqual(contents.count("setup()\n"), 1)
+            for test in tests:
+                self.assertIn("\n{}()\n".format(test), contents)
+
+            cmake_process = subprocess.run(["cmake", "-P", group_file], capture_output = True)
+            self.assertEqual(cmake_process.returncode, 0)
+
+    def test_stale_group_files_are_removed(self):
+        self.groups_dir.mkdir(parents = True, exist_ok = True)
+        stale_file = self.groups_dir / "003-removed-group.cmake"
+        stale_file.write_text("message(FATAL_ERROR \"Stale.\")\n")
+        self.assertEqual(gentestfile.main(self.prog_args), 0)
+        self.assertFalse(stale_file.exists())
+
+    def test_group_file_names_are_safe(self):
+        self.assertEqual(gentestfile.get_test_group_file_name(7, "a group/with:odd*chars"), "007-a_group_with_odd_chars.cmake")
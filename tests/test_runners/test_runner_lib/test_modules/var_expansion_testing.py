@@ -1,12 +1,18 @@
+import concurrent.futures
 import importlib
 import sys
 import os
+import threading
+import time
 import unittest
 
 import common
 from cmake_local import language_parsing
 from cmake_local import cmake_helper
 from cmake_local.language_parsing import var_expansion_parsing
+from cmake_local.language_parsing import var_expansion_ast
+from cmake_local.language_parsing import var_expansion_tokens
+import development.exceptions
 
 class AugmentedCmakeScriptContext(cmake_helper.CMakeScriptContext):
     def __init__(self):
@@ -194,7 +200,321 @@ class TestVarExpansionResolution(common.TestCaseWrapper):
         with self.assertRaises(language_parsing.VarParseError):
             parser.build_ast()
 
+    def test_many_expansions_on_one_line(self):
+        input = "${CMAKE_CURRENT_LIST_DIR}/" * 2000
+        if self.use_breakpoint:
+            breakpoint()
+        self.assertEqual(language_parsing.resolve_vars(input, self.context), "tests/" * 2000)
+
+    def test_text_after_nested_var_expansion(self):
+        self.context.setVariable("TEST_ENV_VAR", "DIR", is_env_var = True)
+        input = "<${CMAKE_CURRENT_LIST_$ENV{TEST_ENV_VAR}}/tail>"
+        if self.use_breakpoint:
+            breakpoint()
+        output = language_parsing.resolve_vars(input, self.context)
+        self.context.unsetVariable("TEST_ENV_VAR", is_env_var = True)
+        self.assertEqual(output, "<tests/tail>")
+
+    def test_literal_braces_after_var_expansion(self):
+        input = "${CMAKE_CURRENT_LIST_DIR} {x} } {"
+        if self.use_breakpoint:
+            breakpoint()
+        self.assertEqual(language_parsing.resolve_vars(input, self.context), "tests {x} } {")
+
+    def test_throw_var_parse_error_on_unclosed_outer_brace(self):
+        self.context.setVariable("TEST_ENV_VAR", "DIR", is_env_var = True)
+        input = "${CMAKE_CURRENT_LIST_$ENV{TEST_ENV_VAR}"
+        if self.use_breakpoint:
+            breakpoint()
+        try:
+            with self.assertRaises(language_parsing.VarParseError):
+                language_parsing.resolve_vars(input, self.context)
+        finally:
+            self.context.unsetVariable("TEST_ENV_VAR", is_env_var = True)
+
     def test_no_fail_mode(self):
         input = "${NOT_A_VAR}"
         output = language_parsing.resolve_vars(input, self.context, no_fail = True)
         self.assertEqual(output, input)
+
+    def test_dollar_without_brace_is_literal(self):
+        for input in ("$ENVFOO", "literal {$ and $ENVFOO", "{$", "$", "$ENV", "ENV{$}", "${CMAKE_CURRENT_LIST_DIR}$"):
+            expected = input.replace("${CMAKE_CURRENT_LIST_DIR}", "tests")
+            for no_fail in (False, True):
+                with self.subTest(input = input, no_fail = no_fail):
+                    if self.use_breakpoint:
+                        breakpoint()
+                    self.assertEqual(language_parsing.resolve_vars(input, self.context, no_fail = no_fail), expected)
+
+    def test_unclosed_expansion_passes_through_with_no_fail(self):
+        for input in ("${", "${CMAKE_CURRENT_LIST_DIR", "$ENV{", "literal {${"):
+            with self.subTest(input = input):
+                with self.assertRaises(language_parsing.VarParseError):
+                    language_parsing.resolve_vars(input, self.context)
+                self.assertEqual(language_parsing.resolve_vars(input, self.context, no_fail = True), input)
+
+    def test_input_without_expansion_skips_the_parser(self):
+        saved_parser = var_expansion_parsing.VarExpansionParser
+        var_expansion_parsing.VarExpansionParser = None
+        try:
+            if self.use_breakpoint:
+                breakpoint()
+            self.assertEqual(language_parsing.resolve_vars("}{ ENV", self.context), "}{ ENV")
+        finally:
+            var_expansion_parsing.VarExpansionParser = saved_parser
+
+
+class TestVarExpansionTokenList(common.TestCaseWrapper):
+    def get_token_values(self, token_list):
+        return [token[1] for token in token_list]
+
+    def test_compact_tokens_point_into_source(self):
+        input = "a${B}ENV$ENV{C}"
+        if self.use_breakpoint:
+            breakpoint()
+        token_list = var_expansion_parsing.VarExpansionTokenList(input)
+        self.assertEqual(
+            [input[start:end] for _, start, end in token_list.compact_tokens],
+            ["a", "$", "{", "B", "}", "ENV", "$", "ENV", "{", "C", "}"]
+        )
+
+    def test_tokens_are_materialized_lazily(self):
+        token_list = var_expansion_parsing.VarExpansionTokenList("${A}/" * 10)
+        self.assertTrue(all(token is None for token in token_list.token_list))
+        token_list.get_current_token()
+        self.assertIsNotNone(token_list.token_list[0])
+        self.assertTrue(all(token is None for token in token_list.token_list[1:]))
+
+    def test_token_values_match_source(self):
+        input = "prefix EENV{x} $$ }{ suffix"
+        token_list = var_expansion_parsing.VarExpansionTokenList(input)
+        self.assertEqual("".join(self.get_token_values(token_list)), input)
+
+    def test_changes_to_retrieved_tokens_persist(self):
+        token_list = var_expansion_parsing.VarExpansionTokenList("}")
+        token = token_list.get_current_token()
+        token[0] = var_expansion_tokens.VarParseTokenType.VAR_CHAR_STRING
+        self.assertEqual(
+            token_list.get_current_token()[0],
+            var_expansion_tokens.VarParseTokenType.VAR_CHAR_STRING
+        )
+
+    def test_find_next_token_index(self):
+        token_list = var_expansion_parsing.VarExpansionTokenList("${A}${B}")
+        close_brace = var_expansion_tokens.VarParseTokenType.VAR_CLOSE_BRACE
+        if self.use_breakpoint:
+            breakpoint()
+        self.assertEqual(token_list.find_next_token_index(close_brace), 3)
+        self.assertEqual(token_list.find_next_token_index(close_brace), 3)
+        for i in range(4):
+            token_list.consume_token()
+        self.assertEqual(token_list.find_next_token_index(close_brace), 7)
+        self.assertEqual(token_list.find_next_token_index(var_expansion_tokens.VarParseTokenType.VAR_ENV), -1)
+        self.assertEqual(token_list.find_next_token_index(var_expansion_tokens.VarParseTokenType.VAR_ENV), -1)
+
+    def test_peek_token_type_past_the_end(self):
+        token_list = var_expansion_parsing.VarExpansionTokenList("$ENV")
+        if self.use_breakpoint:
+            breakpoint()
+        self.assertEqual(token_list.peek_token_type(1), var_expansion_tokens.VarParseTokenType.VAR_ENV)
+        self.assertIsNone(token_list.peek_token_type(2))
+
+    def test_plain_string_is_a_single_token(self):
+        input = "x" * 10000
+        token_list = var_expansion_parsing.VarExpansionTokenList(input)
+        self.assertEqual(token_list.compact_tokens, [(var_expansion_tokens.VarParseTokenType.VAR_CHAR_STRING, 0, len(input))])
+
+
+class TestVarExpansionAST(common.TestCaseWrapper):
+    def make_token(self, token_type, value = None):
+        return [token_type, str(token_type) if value is None else value]
+
+    def test_nodes_index_parallel_arrays(self):
+        ast = var_expansion_ast.CMakeVarExpansionAST()
+        first_index, first_id = ast.add_child_to_current_node(self.make_token(var_expansion_tokens.VarParseTokenType.VAR_EXPANSION))
+        ast.shift_to_child_by_index(first_index)
+        _, second_id = ast.add_child_to_current_node(self.make_token(var_expansion_tokens.VarParseTokenType.VAR_CHAR_STRING, "A"))
+        if self.use_breakpoint:
+            breakpoint()
+        self.assertEqual(len(ast), 2)
+        self.assertEqual(ast.get_parent(second_id), first_id)
+        self.assertEqual(ast.get_parent(first_id), ast.root)
+        self.assertEqual(ast.depths[second_id], 2)
+        self.assertEqual(ast.get_token(second_id), [var_expansion_tokens.VarParseTokenType.VAR_CHAR_STRING, "A"])
+        self.assertEqual(ast.get_node_by_token_ref(second_id), second_id)
+
+    def test_fixed_tokens_share_their_value(self):
+        ast = var_expansion_ast.CMakeVarExpansionAST()
+        for i in range(5):
+            ast.add_child_to_current_node(self.make_token(var_expansion_tokens.VarParseTokenType.VAR_EXPANSION))
+        self.assertEqual(len(set(ast.value_offsets[1:])), 1)
+        self.assertEqual(len(ast.value_pool), ast.shared_value_count)
+
+    def test_iteration_orders(self):
+        ast = var_expansion_ast.CMakeVarExpansionAST()
+        _, a_id = ast.add_child_to_current_node(self.make_token(var_expansion_tokens.VarParseTokenType.VAR_CHAR_STRING, "a"))
+        ast.add_child_to_node_with_token_ref(a_id, self.make_token(var_expansion_tokens.VarParseTokenType.VAR_CHAR_STRING, "a1"))
+        ast.add_child_to_node_with_token_ref(a_id, self.make_token(var_expansion_tokens.VarParseTokenType.VAR_CHAR_STRING, "a2"))
+        ast.add_child_to_current_node(self.make_token(var_expansion_tokens.VarParseTokenType.VAR_CHAR_STRING, "b"))
+        self.assertEqual([token[1] for token in ast], ["a", "a1", "a2", "b"])
+        self.assertEqual(
+            [token[1] for token in ast.get_bottom_right_to_upper_left_iterator()],
+            ["b", "a2", "a1", "a"]
+        )
+
+    def test_merge_does_not_touch_shared_values(self):
+        ast = var_expansion_ast.CMakeVarExpansionAST()
+        ast.shift_to_child_by_index(
+            ast.add_child_to_current_node(self.make_token(var_expansion_tokens.VarParseTokenType.VAR_OPEN_BRACE))[0]
+        )
+        self.assertTrue(ast.merge_adjacent_tokens(
+            lambda existing_token, new_token: [existing_token[0], existing_token[1] + new_token[1]],
+            self.make_token(var_expansion_tokens.VarParseTokenType.VAR_OPEN_BRACE)
+        ))
+        self.assertEqual(ast.get_token_value(ast.current_node), "{{")
+        self.assertEqual(ast.value_pool[ast.shared_value_offsets[var_expansion_tokens.VarParseTokenType.VAR_OPEN_BRACE]], "{")
+
+    def test_appended_strings_are_joined_when_read(self):
+        ast = var_expansion_ast.CMakeVarExpansionAST()
+        string_type = var_expansion_tokens.VarParseTokenType.VAR_CHAR_STRING
+        self.assertFalse(ast.append_to_current_string(self.make_token(string_type, "a")))
+        ast.shift_to_child_by_index(ast.add_child_to_current_node(self.make_token(string_type, "a"))[0])
+        for value in ("{", "b", "}"):
+            self.assertTrue(ast.append_to_current_string(self.make_token(string_type, value)))
+        self.assertFalse(ast.append_to_current_string(self.make_token(var_expansion_tokens.VarParseTokenType.VAR_OPEN_BRACE)))
+        self.assertEqual(ast.get_token(ast.current_node), [string_type, "a{b}"])
+        self.assertEqual(len(ast), 1)
+
+    def test_unknown_token_ref(self):
+        ast = var_expansion_ast.CMakeVarExpansionAST()
+        ast.add_child_to_current_node(self.make_token(var_expansion_tokens.VarParseTokenType.VAR_CHAR_STRING, "a"))
+        with self.assertRaises(development.exceptions.DevelopmentError):
+            ast.get_node_by_token_ref(42)
+
+
+class TestVarExpansionCache(common.TestCaseWrapper):
+    def setUp(self):
+        super().setUp()
+        self.context = cmake_helper.CMakeScriptContext(
+            list_file="tests/test.cmake",
+            build_dir="build",
+            source_dir="source",
+            project_source_dir="project"
+        )
+        self.cache = language_parsing.VarExpansionCache(max_size = 2)
+
+    def tearDown(self):
+        os.environ.pop("TEST_CACHE_ENV_VAR", None)
+        super().tearDown()
+
+    def resolve(self, input, context = None, no_fail = False):
+        return language_parsing.resolve_vars_cached(
+            input,
+            self.context if context is None else context,
+            no_fail = no_fail,
+            cache = self.cache
+        )
+
+    def test_repeated_expansion_is_a_hit(self):
+        if self.use_breakpoint:
+            breakpoint()
+        first = self.resolve("${CMAKE_CURRENT_LIST_DIR}/include.cmake")
+        second = self.resolve("${CMAKE_CURRENT_LIST_DIR}/include.cmake")
+        self.assertEqual(first, "tests/include.cmake")
+        self.assertEqual(first, second)
+        self.assertEqual(self.cache.get_stats()["hits"], 1)
+        self.assertEqual(self.cache.get_stats()["misses"], 1)
+
+    def test_different_context_is_a_miss(self):
+        other_context = cmake_helper.CMakeScriptContext(
+            list_file="other/test.cmake",
+            build_dir="build",
+            source_dir="source",
+            project_source_dir="project"
+        )
+        self.assertEqual(self.resolve("${CMAKE_CURRENT_LIST_DIR}"), "tests")
+        self.assertEqual(self.resolve("${CMAKE_CURRENT_LIST_DIR}", context = other_context), "other")
+        self.assertEqual(self.cache.get_stats()["hits"], 0)
+
+    def test_changed_env_var_is_a_miss(self):
+        os.environ["TEST_CACHE_ENV_VAR"] = "first"
+        self.assertEqual(self.resolve("$ENV{TEST_CACHE_ENV_VAR}"), "first")
+        os.environ["TEST_CACHE_ENV_VAR"] = "second"
+        self.assertEqual(self.resolve("$ENV{TEST_CACHE_ENV_VAR}"), "second")
+        self.assertEqual(self.cache.get_stats()["hits"], 0)
+
+    def test_hit_records_env_var_on_context(self):
+        os.environ["TEST_CACHE_ENV_VAR"] = "value"
+        self.resolve("$ENV{TEST_CACHE_ENV_VAR}")
+        self.context.dereferenced_env_vars.clear()
+        self.resolve("$ENV{TEST_CACHE_ENV_VAR}")
+        self.assertEqual(self.context.dereferenced_env_vars, {"TEST_CACHE_ENV_VAR": "value"})
+
+    def test_least_recently_used_entry_is_evicted(self):
+        self.resolve("${CMAKE_SOURCE_DIR}")
+        self.resolve("${CMAKE_BUILD_DIR}")
+        self.resolve("${CMAKE_SOURCE_DIR}")
+        self.resolve("${PROJECT_SOURCE_DIR}")
+        self.assertEqual(self.cache.get_stats()["size"], 2)
+        self.resolve("${CMAKE_SOURCE_DIR}")
+        self.assertEqual(self.cache.get_stats()["hits"], 2)
+        self.resolve("${CMAKE_BUILD_DIR}")
+        self.assertEqual(self.cache.get_stats()["hits"], 2)
+
+    #"--bundle -j" generates descriptors from a thread pool, all sharing the
+    #module's cache.
+    def test_concurrent_lookups(self):
+        thread_count = 8
+        rounds = 500
+        barrier = threading.Barrier(thread_count)
+        saved_switch_interval = sys.getswitchinterval()
+
+        #A hit checks the environment variables the expansion read through
+        #the context; yielding there lets other threads evict the entry.
+        class YieldingContext(cmake_helper.CMakeScriptContext):
+            def resolve_env_var(self, varname):
+                time.sleep(0)
+                return super().resolve_env_var(varname)
+
+        def resolve_many(index):
+            context = YieldingContext(
+                list_file="thread{}/test.cmake".format(index),
+                build_dir="build",
+                source_dir="source",
+                project_source_dir="project"
+            )
+            barrier.wait()
+            for i in range(rounds):
+                input = "$ENV{TEST_CACHE_ENV_VAR}/${CMAKE_CURRENT_LIST_DIR}/" + str(i % 3)
+                self.assertEqual(self.resolve(input, context = context), "env/thread{}/{}".format(index, i % 3))
+
+        os.environ["TEST_CACHE_ENV_VAR"] = "env"
+        #Smaller than the threads' 24 keys, so that hits and evictions mix.
+        self.cache = language_parsing.VarExpansionCache(max_size = 20)
+
+        sys.setswitchinterval(1e-6)
+        try:
+            if self.use_breakpoint:
+                breakpoint()
+            with concurrent.futures.ThreadPoolExecutor(max_workers = thread_count) as executor:
+                for future in [executor.submit(resolve_many, i) for i in range(thread_count)]:
+                    future.result()
+        finally:
+            sys.setswitchinterval(saved_switch_interval)
+
+        stats = self.cache.get_stats()
+        self.assertEqual(stats["hits"] + stats["misses"], thread_count * rounds)
+        self.assertLessEqual(stats["size"], stats["max_size"])
+
+    def test_failed_expansion_is_not_cached(self):
+        with self.assertRaises(ValueError):
+            self.resolve("${NOT_A_VAR}")
+        self.assertEqual(self.cache.get_stats()["size"], 0)
+
+    def test_clear(self):
+        self.resolve("${CMAKE_SOURCE_DIR}")
+        self.cache.clear()
+        self.assertEqual(
+            self.cache.get_stats(),
+            {"hits": 0, "misses": 0, "size": 0, "max_size": 2}
+        )